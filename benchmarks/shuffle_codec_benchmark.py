@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Shuffle codec benchmark.
+
+Compares the available shuffle codecs against the original JSON path
+(requests' json= encoding of {'data': pairs}) on intermediate pairs shaped
+like the output of each task.
+
+Usage:
+    python benchmarks/shuffle_codec_benchmark.py [--pairs N] [--repeat R]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.serialization import available_codecs, get_codec
+
+
+def make_pairs(task: int, num_pairs: int, seed: int = 0) -> list:
+    """Generate intermediate pairs shaped like the map output of a task."""
+    rng = np.random.default_rng(seed)
+    zones = rng.integers(1, 266, num_pairs).tolist()
+    
+    if task == 1:
+        # (pickup_zone, tip_percentage)
+        return list(zip(zones, rng.uniform(0, 30, num_pairs).tolist()))
+    if task == 2:
+        # ((pickup_zone, dropoff_zone), revenue_per_mile)
+        dropoffs = rng.integers(1, 266, num_pairs).tolist()
+        return list(zip(zip(zones, dropoffs), rng.uniform(2, 20, num_pairs).tolist()))
+    # (hour, 1)
+    return list(zip(rng.integers(0, 24, num_pairs).tolist(), [1] * num_pairs))
+
+
+def time_best(func, repeat: int):
+    """Return (best_seconds, result) over several runs."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_json_baseline(pairs: list, repeat: int) -> tuple:
+    """Original path: json.dumps({'data': pairs}) and request.json on the receiver."""
+    encode_time, payload = time_best(lambda: json.dumps({'data': pairs}).encode('utf-8'), repeat)
+    decode_time, _ = time_best(lambda: json.loads(payload)['data'], repeat)
+    return encode_time, decode_time, len(payload)
+
+
+def bench_codec(name: str, pairs: list, repeat: int) -> tuple:
+    """Encode/decode timings and payload size for one codec."""
+    codec = get_codec(name)
+    encode_time, payload = time_best(lambda: codec.encode(pairs), repeat)
+    decode_time, decoded = time_best(lambda: codec.decode(payload), repeat)
+    assert decoded == pairs, f"{name} round trip changed the data"
+    return encode_time, decode_time, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark shuffle codecs')
+    parser.add_argument('--pairs', type=int, default=500_000, help='Pairs per task')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is kept)')
+    args = parser.parse_args()
+    
+    print(f"Shuffle codec benchmark: {args.pairs:,} pairs, best of {args.repeat}")
+    
+    for task in (1, 2, 3):
+        pairs = make_pairs(task, args.pairs)
+        
+        print(f"\nTask {task} pairs (e.g. {pairs[0]})")
+        print(f"{'codec':<16}{'encode s':>10}{'decode s':>10}{'MB':>9}{'speedup':>9}{'size':>7}")
+        print(f"{'-'*61}")
+        
+        base_enc, base_dec, base_size = bench_json_baseline(pairs, args.repeat)
+        rows = [('json (current)', base_enc, base_dec, base_size)]
+        for name in available_codecs():
+            rows.append((name, *bench_codec(name, pairs, args.repeat)))
+        
+        for name, enc, dec, size in rows:
+            speedup = (base_enc + base_dec) / (enc + dec)
+            print(f"{name:<16}{enc:>10.3f}{dec:>10.3f}{size / 1e6:>9.2f}{speedup:>8.1f}x{size / base_size:>7.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ NYC Taxi Map-Reduce Analysis - Main Entry Point
 
 Usage:
     python main.py worker <worker_id> [--host HOST] [--port PORT]
-    python main.py coordinator --task <1|2|3> [--config CONFIG]
+    python main.py coordinator --task <1|2|3> [<1|2|3> ...] [--config CONFIG]
     
 Examples:
     # Start a worker
@@ -15,20 +15,28 @@ Examples:
     
     # Run Task 2 (Route Profitability) with custom config
     python main.py coordinator --task 2 --config my_config.yaml
+    
+    # Run all three tasks over a single scan of the data
+    python main.py coordinator --task 1 2 3
 """
 
 import argparse
+import glob
+import heapq
 import logging
 import sys
+import requests
 import yaml
 from pathlib import Path
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from src.core.base import HashPartitioner, RangePartitioner
 from src.core.worker import start_worker
 from src.core.coordinator import Coordinator
-from src.utils.parquet_loader import load_nyc_taxi_data, create_sample_data
+from src.core.job_server import JobServer
+from src.utils.parquet_loader import load_nyc_taxi_data, create_sample_data, plan_parquet_splits
 
 from src.tasks.task1_tip_analysis import TipPercentageMapper, TipPercentageReducer
 from src.tasks.task2_route_profitability import RouteProfitabilityMapper, RouteProfitabilityReducer
@@ -60,80 +68,245 @@ def run_worker(args):
         logger.error("Port is required for worker mode")
         sys.exit(1)
     
-    start_worker(args.worker_id, host, port)
+    start_worker(
+        args.worker_id,
+        host,
+        port,
+        data_dir=args.data_dir,
+        shuffle_threads=args.shuffle_threads,
+        max_concurrent_shuffles=args.max_concurrent_shuffles,
+        columnar_store=args.columnar_store,
+        shuffle_fanout=args.shuffle_fanout,
+        shuffle_chunk_pairs=args.shuffle_chunk_pairs,
+        memory_budget_mb=args.memory_budget_mb,
+        spill_dir=args.spill_dir
+    )
 
 
-def run_coordinator(args):
-    """Run a map-reduce job as coordinator."""
-    # Load configuration
-    config = load_config(args.config)
-    
+# All task reducers are aggregate reducers and act as their own combiners
+TASKS = {
+    1: ("Tip Analysis", TipPercentageMapper, TipPercentageReducer),
+    2: ("Route Profitability", RouteProfitabilityMapper, RouteProfitabilityReducer),
+    3: ("Hourly Traffic", HourlyTrafficMapper, HourlyTrafficReducer)
+}
+
+# execution.partitioner
+PARTITIONERS = {
+    'hash': HashPartitioner,
+    'range': RangePartitioner
+}
+
+
+def create_coordinator(config: dict) -> Coordinator:
+    """Create a coordinator for the cluster described in the configuration."""
     # Get worker addresses
     worker_addresses = [
         f"http://{w['host']}:{w['port']}"
         for w in config['cluster']['workers']
     ]
     
+    # Optional per-worker intermediate memory budgets (spill beyond them)
+    memory_budgets = {
+        f"http://{w['host']}:{w['port']}": w['memory_budget_mb']
+        for w in config['cluster']['workers']
+        if w.get('memory_budget_mb') is not None
+    }
+    
+    # Workers send heartbeats to the coordinator's address (null interval = off)
+    heartbeat_interval = config['execution'].get('heartbeat_interval', 2.0)
+    coordinator_config = config['cluster'].get('coordinator', {})
+    heartbeat_address = None
+    if heartbeat_interval is not None:
+        heartbeat_address = (coordinator_config.get('host', 'localhost'), coordinator_config.get('port', 5000))
+    
     logger.info(f"Coordinator connecting to {len(worker_addresses)} workers")
     
-    # Create coordinator
-    coordinator = Coordinator(
+    shuffle_codec = config['execution'].get('shuffle_codec')
+    if isinstance(shuffle_codec, str):
+        shuffle_codec = [shuffle_codec]
+    
+    compression = config['execution'].get('compression')
+    if isinstance(compression, str):
+        compression = [compression]
+    
+    return Coordinator(
         worker_addresses=worker_addresses,
-        timeout=config['execution'].get('task_timeout', 300)
+        timeout=config['execution'].get('task_timeout', 300),
+        shuffle_codecs=shuffle_codec,
+        compressions=compression,
+        compression_threshold=config['execution'].get('compression_threshold', 4096),
+        shared_memory_shuffle=config['execution'].get('shared_memory_shuffle', True),
+        memory_budgets=memory_budgets,
+        max_retries=config['execution'].get('max_retries', 3),
+        retry_backoff=config['execution'].get('retry_backoff', 1.0),
+        speculative_multiple=config['execution'].get('speculative_multiple'),
+        heartbeat_address=heartbeat_address,
+        heartbeat_interval=heartbeat_interval or 2.0,
+        heartbeat_timeout=config['execution'].get('heartbeat_timeout', 10.0),
+        sort_by_key=config['execution'].get('sort_by_key', False),
+        hot_key_threshold=config['execution'].get('hot_key_threshold')
     )
+
+
+def load_input(dataset_config: dict, split_size, num_workers: int):
+    """
+    Load a dataset, or plan its data-local splits.
     
-    # Load data
-    dataset_config = config['dataset']
+    Args:
+        dataset_config: The 'dataset' section of the configuration
+        split_size: execution.split_size (records, "row_group" or None)
+        num_workers: Number of workers (one split each without split_size)
+        
+    Returns:
+        Tuple of (input_data, input_splits); exactly one of them is None
+    """
     data_path = dataset_config.get('path')
     max_records = dataset_config.get('max_records')
+    data_files = sorted(glob.glob(data_path)) if data_path else []
+    
+    if data_files and dataset_config.get('mode', 'ship') == 'local':
+        # Workers read their own row groups; only descriptors are sent
+        logger.info(f"Planning data-local splits over {len(data_files)} file(s) matching {data_path}")
+        if split_size == 'row_group':
+            return None, plan_parquet_splits(data_files, max_records=max_records)
+        if split_size:
+            return None, plan_parquet_splits(data_files, rows_per_split=split_size, max_records=max_records)
+        return None, plan_parquet_splits(data_files, num_splits=num_workers, max_records=max_records)
     
     if data_path and Path(data_path).exists():
         logger.info(f"Loading data from {data_path}")
-        input_data = load_nyc_taxi_data(
+        return load_nyc_taxi_data(
             data_path,
             max_records=max_records,
-            columns=dataset_config.get('columns')
-        )
-    else:
-        logger.warning(f"Data file {data_path} not found, using sample data")
-        input_data = create_sample_data(num_records=max_records or 1000)
-    
-    # Select task
-    task_map = {
-        1: ("Tip Analysis", TipPercentageMapper, TipPercentageReducer),
-        2: ("Route Profitability", RouteProfitabilityMapper, RouteProfitabilityReducer),
-        3: ("Hourly Traffic", HourlyTrafficMapper, HourlyTrafficReducer)
-    }
+            columns=dataset_config.get('columns'),
+            engine=dataset_config.get('loader', 'arrow')
+        ), None
     
-    task_num = args.task
-    if task_num not in task_map:
-        logger.error(f"Invalid task number: {task_num}. Choose 1, 2, or 3")
-        sys.exit(1)
+    logger.warning(f"Data file {data_path} not found, using sample data")
+    return create_sample_data(num_records=max_records or 1000), None
+
+
+def get_partitioner(config: dict):
+    """Partitioner class named by execution.partitioner ("hash" or "range")."""
+    name = config['execution'].get('partitioner', 'hash')
+    if name not in PARTITIONERS:
+        raise ValueError(f"Unknown partitioner '{name}', expected one of: {', '.join(PARTITIONERS)}")
+    return PARTITIONERS[name]
+
+
+def run_coordinator(args):
+    """Run a map-reduce job as coordinator."""
+    # Load configuration
+    config = load_config(args.config)
+    coordinator = create_coordinator(config)
+    
+    # Load data
+    dataset_config = config['dataset']
+    split_size = config['execution'].get('split_size')
+    input_data, input_splits = load_input(dataset_config, split_size, len(coordinator.worker_addresses))
     
-    task_name, mapper_class, reducer_class = task_map[task_num]
+    # Select tasks
+    task_nums = list(dict.fromkeys(args.task))
+    for task_num in task_nums:
+        if task_num not in TASKS:
+            logger.error(f"Invalid task number: {task_num}. Choose 1, 2, or 3")
+            sys.exit(1)
     
-    logger.info(f"Running Task {task_num}: {task_name}")
-    logger.info(f"Input: {len(input_data)} records")
+    for task_num in task_nums:
+        logger.info(f"Running Task {task_num}: {TASKS[task_num][0]}")
+    if input_splits is not None:
+        logger.info(f"Input: {sum(split['num_rows'] for split in input_splits)} records (data-local)")
+    else:
+        logger.info(f"Input: {len(input_data)} records")
+    
+    # Run the job; several tasks share one scan of the input
+    partitioner_class = get_partitioner(config)
+    try:
+        all_results = coordinator.run_jobs(
+            input_data=input_data,
+            tasks=[(TASKS[task_num][1], TASKS[task_num][2]) for task_num in task_nums],
+            partitioner_class=partitioner_class,
+            input_splits=input_splits,
+            columns=dataset_config.get('columns'),
+            split_size=split_size if isinstance(split_size, int) else None
+        )
+    finally:
+        coordinator.close()
     
-    # Run the job
-    results = coordinator.run_job(
-        input_data=input_data,
-        mapper_class=mapper_class,
-        reducer_class=reducer_class
+    key_ordered = partitioner_class is RangePartitioner or config['execution'].get('sort_by_key', False)
+    for task_num, results in zip(task_nums, all_results):
+        report_results(task_num, TASKS[task_num][0], results, key_ordered)
+
+
+def run_server(args):
+    """Run the coordinator as a job server that keeps workers and datasets warm."""
+    config = load_config(args.config)
+    coordinator = create_coordinator(config)
+    split_size = config['execution'].get('split_size')
+    num_workers = len(coordinator.worker_addresses)
+    
+    port = args.port or config['cluster'].get('coordinator', {}).get('job_port', 5050)
+    server = JobServer(
+        coordinator,
+        tasks={task_num: (mapper_class, reducer_class) for task_num, (_, mapper_class, reducer_class) in TASKS.items()},
+        load_dataset=lambda dataset_config: load_input(dataset_config, split_size, num_workers),
+        datasets={'default': config['dataset']},
+        default_split_size=split_size if isinstance(split_size, int) else None,
+        partitioner_class=get_partitioner(config),
+        host=args.host,
+        port=port
     )
     
+    # Load the configured dataset before the first job arrives
+    server.dataset('default')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Job server stopping")
+    finally:
+        server.stop()
+        coordinator.close()
+
+
+def submit_job(args):
+    """Submit tasks to a running job server and report their results."""
+    payload = {'tasks': args.task, 'dataset': args.dataset}
+    if args.split_size:
+        payload['split_size'] = args.split_size
+    
+    response = requests.post(f"{args.server.rstrip('/')}/jobs", json=payload, timeout=args.timeout)
+    reply = response.json()
+    if response.status_code != 200:
+        logger.error(f"Job failed: {reply.get('message')}")
+        sys.exit(1)
+    
+    logger.info(f"Job finished in {reply['seconds']:.2f}s on the server")
+    for task_id, results in reply['results'].items():
+        # JSON turns tuple keys (e.g. routes) into lists
+        results = [(tuple(key) if isinstance(key, list) else key, value) for key, value in results]
+        report_results(int(task_id), TASKS[int(task_id)][0], results)
+
+
+def report_results(task_num: int, task_name: str, results: list, key_ordered: bool = False):
+    """
+    Print the top results of a task and save all of them to a file.
+    
+    Key ordered results (range partitioning or sort_by_key) are written
+    as they are, without sorting; others are written by value, largest
+    first.
+    """
     # Display results
     logger.info(f"\n{'='*60}")
     logger.info(f"Task {task_num}: {task_name} - Results")
     logger.info(f"{'='*60}")
     
-    # Sort and display top results
-    sorted_results = sorted(results, key=lambda x: x[1], reverse=True)
+    # Display top results
+    top_results = heapq.nlargest(20, results, key=lambda x: x[1])
     
     print(f"\nTop 20 results:")
     print(f"{'-'*60}")
     
-    for i, (key, value) in enumerate(sorted_results[:20], 1):
+    for i, (key, value) in enumerate(top_results, 1):
         print(f"{i:2d}. {key}: {value}")
     
     print(f"{'-'*60}")
@@ -147,7 +320,7 @@ def run_coordinator(args):
         f.write(f"Task {task_num}: {task_name}\n")
         f.write(f"{'='*60}\n\n")
         
-        for key, value in sorted_results:
+        for key, value in (results if key_ordered else sorted(results, key=lambda x: x[1], reverse=True)):
             f.write(f"{key}: {value}\n")
     
     logger.info(f"\nResults saved to {output_file}")
@@ -166,15 +339,62 @@ def main():
     worker_parser.add_argument('worker_id', help='Unique worker identifier')
     worker_parser.add_argument('--host', default='localhost', help='Host to bind to')
     worker_parser.add_argument('--port', type=int, required=True, help='Port to listen on')
+    worker_parser.add_argument(
+        '--data-dir',
+        default=None,
+        help='Directory with local copies of the dataset files (for dataset mode "local")'
+    )
+    worker_parser.add_argument(
+        '--shuffle-threads',
+        type=int,
+        default=4,
+        help='Threads decoding incoming shuffle data'
+    )
+    worker_parser.add_argument(
+        '--max-concurrent-shuffles',
+        type=int,
+        default=16,
+        help='Shuffle uploads read at the same time (others wait)'
+    )
+    worker_parser.add_argument(
+        '--columnar-store',
+        action='store_true',
+        help='Keep shuffled data as NumPy columns instead of per-key lists (less memory)'
+    )
+    worker_parser.add_argument(
+        '--shuffle-fanout',
+        type=int,
+        default=4,
+        help='Shuffle uploads each map task sends in parallel'
+    )
+    worker_parser.add_argument(
+        '--shuffle-chunk-pairs',
+        type=int,
+        default=50000,
+        help='Pairs per streamed shuffle chunk (bounds mapper memory)'
+    )
+    worker_parser.add_argument(
+        '--memory-budget-mb',
+        type=float,
+        default=None,
+        help='Intermediate data kept in memory before spilling to disk (default: unlimited)'
+    )
+    worker_parser.add_argument(
+        '--spill-dir',
+        default=None,
+        help='Directory for spilled intermediate runs (default: system temp dir)'
+    )
     
     # Coordinator mode
     coord_parser = subparsers.add_parser('coordinator', help='Run as coordinator')
     coord_parser.add_argument(
         '--task',
         type=int,
+        nargs='+',
         required=True,
         choices=[1, 2, 3],
-        help='Task to run: 1=Tip Analysis, 2=Route Profitability, 3=Hourly Traffic'
+        help='Task(s) to run: 1=Tip Analysis, 2=Route Profitability, 3=Hourly Traffic; '
+             'several tasks share one scan of the data'
     )
     coord_parser.add_argument(
         '--config',
@@ -182,12 +402,66 @@ def main():
         help='Configuration file path'
     )
     
+    # Job server mode
+    serve_parser = subparsers.add_parser('serve', help='Run the coordinator as a job server')
+    serve_parser.add_argument(
+        '--config',
+        default='config.yaml',
+        help='Configuration file path'
+    )
+    serve_parser.add_argument(
+        '--host',
+        default='',
+        help='Interface to accept jobs on (default: all)'
+    )
+    serve_parser.add_argument(
+        '--port',
+        type=int,
+        help='Port to accept jobs on (default: cluster.coordinator.job_port or 5050)'
+    )
+    
+    # Job submission to a running job server
+    submit_parser = subparsers.add_parser('submit', help='Submit tasks to a job server')
+    submit_parser.add_argument(
+        '--task',
+        type=int,
+        nargs='+',
+        required=True,
+        choices=[1, 2, 3],
+        help='Task(s) to run: 1=Tip Analysis, 2=Route Profitability, 3=Hourly Traffic'
+    )
+    submit_parser.add_argument(
+        '--server',
+        default='http://localhost:5050',
+        help='Job server URL'
+    )
+    submit_parser.add_argument(
+        '--dataset',
+        default='default',
+        help='Name of a dataset registered with the server'
+    )
+    submit_parser.add_argument(
+        '--split-size',
+        type=int,
+        help='Records per map task (default: the server configuration)'
+    )
+    submit_parser.add_argument(
+        '--timeout',
+        type=float,
+        default=3600,
+        help='Seconds to wait for the job'
+    )
+    
     args = parser.parse_args()
     
     if args.mode == 'worker':
         run_worker(args)
     elif args.mode == 'coordinator':
         run_coordinator(args)
+    elif args.mode == 'serve':
+        run_server(args)
+    elif args.mode == 'submit':
+        submit_job(args)
     else:
         parser.print_help()
         sys.exit(1)
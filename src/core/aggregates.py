@@ -0,0 +1,483 @@
+"""
+Mergeable (algebraic) aggregate states.
+
+An aggregate turns raw values into a small partial state, merges partial
+states exactly in any order, and finalizes a state into a result. Partial
+states can therefore be computed on the map side, shipped through the
+shuffle, merged by reducers and merged again by the coordinator without
+ever averaging averages.
+
+States are plain numbers or tuples so every shuffle codec can carry them.
+
+The built-in sum, count, mean, min and max aggregates also declare the
+NumPy ufunc that merges each component of their state. That gives them
+vectorized kernels: ufunc.reduceat merges the states of many groups at
+once over value columns sorted by key, and ufunc.at accumulates into
+dense arrays indexed by key (DenseAccumulator) for bounded integer keys.
+Workers use them for the map-side combine of batch mappers and for
+reduce whenever the data is available as columns.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from functools import reduce as fold
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .base import Reducer, Combiner
+from .intermediate import ValueColumns
+
+
+class Aggregate(ABC):
+    """
+    Abstract base class for mergeable aggregates.
+    """
+    
+    @abstractmethod
+    def create(self, value: Any) -> Any:
+        """
+        Build the state for a single raw value.
+        
+        Args:
+            value: Raw value emitted by a mapper
+            
+        Returns:
+            Partial state
+        """
+        pass
+    
+    @abstractmethod
+    def merge(self, state: Any, other: Any) -> Any:
+        """
+        Merge two partial states.
+        
+        Args:
+            state: Partial state
+            other: Partial state
+            
+        Returns:
+            Merged partial state
+        """
+        pass
+    
+    def finalize(self, state: Any) -> Any:
+        """Turn a partial state into the final result (identity by default)."""
+        return state
+    
+    def accumulate(self, values: Iterable[Any]) -> Any:
+        """Build the state for a non-empty collection of raw values."""
+        return self.merge_all(self.create(value) for value in values)
+    
+    def merge_all(self, states: Iterable[Any]) -> Any:
+        """Merge a non-empty collection of partial states."""
+        return fold(self.merge, states)
+    
+    # NumPy ufunc merging each component of the state, e.g. (np.add, np.add)
+    # for (sum, count) states; aggregates that declare them are vectorized
+    state_ufuncs: Tuple[np.ufunc, ...] = ()
+    
+    @property
+    def vectorized(self) -> bool:
+        """True if the aggregate has NumPy kernels (declares state_ufuncs)."""
+        return bool(self.state_ufuncs)
+    
+    def state_columns(self, values: np.ndarray) -> ValueColumns:
+        """
+        Build the state of every raw value in a column (vectorized create()).
+        
+        Args:
+            values: Raw value column
+            
+        Returns:
+            State column, or one column per component for tuple states
+        """
+        raise NotImplementedError(f"{type(self).__name__} has no vectorized kernels")
+    
+    def accumulate_groups(self, values: np.ndarray, starts: np.ndarray) -> ValueColumns:
+        """
+        Build the states of many groups of raw values at once.
+        
+        Args:
+            values: Raw value column, each group's values adjacent
+            starts: Index of the first value of every (non-empty) group
+            
+        Returns:
+            State column(s) with one entry per group
+        """
+        return self.merge_groups(self.state_columns(values), starts)
+    
+    def merge_groups(self, states: ValueColumns, starts: np.ndarray) -> ValueColumns:
+        """
+        Merge many groups of partial states at once.
+        
+        Args:
+            states: State column(s), each group's states adjacent
+            starts: Index of the first state of every (non-empty) group
+            
+        Returns:
+            Merged state column(s) with one entry per group
+        """
+        if not self.vectorized:
+            raise NotImplementedError(f"{type(self).__name__} has no vectorized kernels")
+        return _from_components([
+            ufunc.reduceat(component, starts)
+            for ufunc, component in zip(self.state_ufuncs, _components(states))
+        ])
+
+
+class SumAggregate(Aggregate):
+    """Sum of values. State: the running sum."""
+    
+    state_ufuncs = (np.add,)
+    
+    def create(self, value: Any) -> Any:
+        return value
+    
+    def merge(self, state: Any, other: Any) -> Any:
+        return state + other
+    
+    def accumulate(self, values: Iterable[Any]) -> Any:
+        return sum(values)
+    
+    def merge_all(self, states: Iterable[Any]) -> Any:
+        return sum(states)
+    
+    def state_columns(self, values: np.ndarray) -> np.ndarray:
+        return values
+
+
+class CountAggregate(Aggregate):
+    """Number of values. State: the running count."""
+    
+    state_ufuncs = (np.add,)
+    
+    def create(self, value: Any) -> int:
+        return 1
+    
+    def merge(self, state: int, other: int) -> int:
+        return state + other
+    
+    def accumulate(self, values: Iterable[Any]) -> int:
+        return sum(1 for _ in values)
+    
+    def merge_all(self, states: Iterable[int]) -> int:
+        return sum(states)
+    
+    def state_columns(self, values: np.ndarray) -> np.ndarray:
+        return np.ones(len(values), dtype=np.int64)
+
+
+class MeanAggregate(Aggregate):
+    """Arithmetic mean. State: (sum, count)."""
+    
+    state_ufuncs = (np.add, np.add)
+    
+    def create(self, value: Any) -> Tuple[float, int]:
+        return (value, 1)
+    
+    def merge(self, state: Tuple[float, int], other: Tuple[float, int]) -> Tuple[float, int]:
+        return (state[0] + other[0], state[1] + other[1])
+    
+    def finalize(self, state: Tuple[float, int]) -> float:
+        return state[0] / state[1]
+    
+    def accumulate(self, values: Iterable[Any]) -> Tuple[float, int]:
+        values = list(values)
+        return (sum(values), len(values))
+    
+    def merge_all(self, states: Iterable[Tuple[float, int]]) -> Tuple[float, int]:
+        total = 0.0
+        count = 0
+        for state in states:
+            total += state[0]
+            count += state[1]
+        return (total, count)
+    
+    def state_columns(self, values: np.ndarray) -> List[np.ndarray]:
+        return [values, np.ones(len(values), dtype=np.int64)]
+
+
+class MinAggregate(Aggregate):
+    """Minimum value. State: the running minimum."""
+    
+    state_ufuncs = (np.minimum,)
+    
+    def create(self, value: Any) -> Any:
+        return value
+    
+    def merge(self, state: Any, other: Any) -> Any:
+        return min(state, other)
+    
+    def accumulate(self, values: Iterable[Any]) -> Any:
+        return min(values)
+    
+    def merge_all(self, states: Iterable[Any]) -> Any:
+        return min(states)
+    
+    def state_columns(self, values: np.ndarray) -> np.ndarray:
+        return values
+
+
+class MaxAggregate(Aggregate):
+    """Maximum value. State: the running maximum."""
+    
+    state_ufuncs = (np.maximum,)
+    
+    def create(self, value: Any) -> Any:
+        return value
+    
+    def merge(self, state: Any, other: Any) -> Any:
+        return max(state, other)
+    
+    def accumulate(self, values: Iterable[Any]) -> Any:
+        return max(values)
+    
+    def merge_all(self, states: Iterable[Any]) -> Any:
+        return max(states)
+    
+    def state_columns(self, values: np.ndarray) -> np.ndarray:
+        return values
+
+
+class VarianceAggregate(Aggregate):
+    """
+    Variance. State: (count, mean, sum of squared deviations).
+    
+    States merge with Chan et al.'s parallel formula, which stays
+    numerically stable when partitions have very different sizes.
+    """
+    
+    def __init__(self, ddof: int = 0):
+        """
+        Args:
+            ddof: Delta degrees of freedom (0 = population, 1 = sample variance)
+        """
+        self.ddof = ddof
+    
+    def create(self, value: Any) -> Tuple[int, float, float]:
+        return (1, float(value), 0.0)
+    
+    def merge(
+        self,
+        state: Tuple[int, float, float],
+        other: Tuple[int, float, float]
+    ) -> Tuple[int, float, float]:
+        count_a, mean_a, m2_a = state
+        count_b, mean_b, m2_b = other
+        count = count_a + count_b
+        if count == 0:
+            return (0, 0.0, 0.0)
+        
+        delta = mean_b - mean_a
+        mean = mean_a + delta * count_b / count
+        m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+        return (count, mean, m2)
+    
+    def finalize(self, state: Tuple[int, float, float]) -> float:
+        count, _, m2 = state
+        if count - self.ddof <= 0:
+            return math.nan
+        return m2 / (count - self.ddof)
+    
+    def accumulate(self, values: Iterable[Any]) -> Tuple[int, float, float]:
+        values = [float(value) for value in values]
+        count = len(values)
+        mean = sum(values) / count
+        m2 = sum((value - mean) ** 2 for value in values)
+        return (count, mean, m2)
+
+
+# Aggregates a reducer can declare by name
+BUILTIN_AGGREGATES = {
+    'sum': SumAggregate,
+    'count': CountAggregate,
+    'mean': MeanAggregate,
+    'min': MinAggregate,
+    'max': MaxAggregate
+}
+
+
+class DenseAccumulator:
+    """
+    Aggregate states for a bounded domain of integer keys, held in arrays.
+    
+    Keys are non-negative integers below the domain bounds, or tuples of
+    them for composite keys (one bound per component, e.g. (266, 266) for
+    zone pairs). Every key owns one cell of flat NumPy arrays, one per
+    state component, and values are merged into their cells with the
+    aggregate's ufuncs. Memory and output size depend only on the domain,
+    not on how many values were added.
+    """
+    
+    def __init__(self, aggregate: Aggregate, domain: Tuple[int, ...]):
+        """
+        Args:
+            aggregate: Aggregate with NumPy kernels (aggregate.vectorized)
+            domain: Exclusive upper bound of every key component
+        """
+        if not aggregate.vectorized:
+            raise ValueError(f"{type(aggregate).__name__} has no vectorized kernels")
+        self.aggregate = aggregate
+        self.domain = tuple(int(bound) for bound in domain)
+        self.size = int(np.prod(self.domain))
+        
+        # Values merged into every cell; zero marks cells without data
+        self.counts = np.zeros(self.size, dtype=np.int64)
+        # One array per state component, created with the first values
+        self.states: Optional[List[np.ndarray]] = None
+        self._key_dtype: Optional[np.dtype] = None
+    
+    def add(self, keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        Merge a batch of raw values into the cells of their keys.
+        
+        Args:
+            keys: Key column, shape (n,) or (n, k) for composite keys
+            values: Raw value column
+            
+        Returns:
+            Boolean mask of the rows whose keys lie outside the domain;
+            those rows are not added
+        """
+        key_columns = keys.reshape(len(keys), -1)
+        if key_columns.shape[1] != len(self.domain):
+            raise ValueError(f"Keys with {key_columns.shape[1]} component(s) do not fit domain {self.domain}")
+        if self._key_dtype is None:
+            self._key_dtype = keys.dtype
+        
+        inside = np.ones(len(keys), dtype=bool)
+        for column, bound in zip(key_columns.T, self.domain):
+            inside &= (column >= 0) & (column < bound)
+            if column.dtype.kind == 'f':
+                inside &= column == np.floor(column)
+        if not inside.any():
+            return ~inside
+        
+        indexes = np.ravel_multi_index(tuple(key_columns[inside].astype(np.int64).T), self.domain)
+        components = _components(self.aggregate.state_columns(values[inside]))
+        if self.states is None:
+            self.states = [_identity_array(ufunc, component.dtype, self.size) for ufunc, component in zip(self.aggregate.state_ufuncs, components)]
+        
+        for i, (ufunc, component) in enumerate(zip(self.aggregate.state_ufuncs, components)):
+            state = self.states[i]
+            if np.result_type(state, component) != state.dtype:
+                # e.g. int sums that meet float values
+                state = self.states[i] = state.astype(np.result_type(state, component))
+            if ufunc is np.add and state.dtype.kind == 'f':
+                state += np.bincount(indexes, weights=component, minlength=self.size)
+            else:
+                ufunc.at(state, indexes, component)
+        self.counts += np.bincount(indexes, minlength=self.size)
+        return ~inside
+    
+    def columns(self) -> Tuple[np.ndarray, ValueColumns]:
+        """
+        Return the cells that received values as key and state columns.
+        
+        Returns:
+            (keys, states): keys of shape (n,), or (n, k) for composite
+            keys, and state column(s) in the layout of merge_groups()
+        """
+        cells = np.flatnonzero(self.counts)
+        keys = np.stack(np.unravel_index(cells, self.domain), axis=1)
+        if len(self.domain) == 1:
+            keys = keys[:, 0]
+        if self._key_dtype is not None:
+            keys = keys.astype(self._key_dtype)
+        if self.states is None:
+            return keys, _from_components([np.empty(0) for _ in self.aggregate.state_ufuncs])
+        return keys, _from_components([state[cells] for state in self.states])
+
+
+def _components(states: ValueColumns) -> List[np.ndarray]:
+    """Return the state column(s) as a list with one array per component."""
+    return [states] if isinstance(states, np.ndarray) else list(states)
+
+
+def _from_components(components: List[np.ndarray]) -> ValueColumns:
+    """Inverse of _components(): a single column stays a plain array."""
+    return components[0] if len(components) == 1 else components
+
+
+def _identity_array(ufunc: np.ufunc, dtype: np.dtype, size: int) -> np.ndarray:
+    """Array of the identity of a merge ufunc (0 for add, the dtype's extreme for min/max)."""
+    if ufunc is np.minimum or ufunc is np.maximum:
+        if dtype.kind == 'f':
+            fill = np.inf if ufunc is np.minimum else -np.inf
+        else:
+            fill = np.iinfo(dtype).max if ufunc is np.minimum else np.iinfo(dtype).min
+        return np.full(size, fill, dtype=dtype)
+    return np.full(size, ufunc.identity, dtype=dtype)
+
+
+class AggregateReducer(Reducer, Combiner):
+    """
+    Reducer defined by a mergeable Aggregate.
+    
+    The reducer doubles as its own combiner: map tasks ship partial states
+    instead of raw values, reducers merge the states of their keys, and the
+    coordinator merges any states for the same key and finalizes them.
+    Subclasses set `aggregate` (an Aggregate, or the name of a built-in
+    one: 'sum', 'count', 'mean', 'min' or 'max') and may override
+    finalize() to format output.
+    """
+    
+    aggregate: Aggregate = None
+    can_combine = True
+    
+    def __init_subclass__(cls, **kwargs):
+        """Resolve an aggregate declared by name."""
+        super().__init_subclass__(**kwargs)
+        if isinstance(cls.aggregate, str):
+            if cls.aggregate not in BUILTIN_AGGREGATES:
+                raise ValueError(
+                    f"Unknown aggregate '{cls.aggregate}' in {cls.__name__}; "
+                    f"choose from {', '.join(BUILTIN_AGGREGATES)}"
+                )
+            cls.aggregate = BUILTIN_AGGREGATES[cls.aggregate]()
+    
+    def reduce(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Aggregate raw values for a key in one step.
+        
+        Args:
+            key: The key to reduce
+            values: Raw values emitted by the mapper
+            
+        Yields:
+            The finalized (output_key, output_value)
+        """
+        if values:
+            yield self.finalize(key, self.aggregate.accumulate(values))
+    
+    def combine(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
+        """Turn one map task's raw values for a key into a partial state."""
+        if values:
+            yield (key, self.aggregate.accumulate(values))
+    
+    def merge_states(self, key: Any, states: Iterable[Any]) -> Tuple[Any, Any]:
+        """
+        Merge partial states for a key.
+        
+        Args:
+            key: The key being reduced
+            states: Partial states from combine() or earlier merges
+            
+        Returns:
+            (key, merged_state)
+        """
+        return (key, self.aggregate.merge_all(states))
+    
+    def finalize(self, key: Any, state: Any) -> Tuple[Any, Any]:
+        """
+        Turn a fully merged state into an output pair.
+        
+        Args:
+            key: The intermediate key
+            state: Merged partial state
+            
+        Returns:
+            (output_key, output_value)
+        """
+        return (key, self.aggregate.finalize(state))
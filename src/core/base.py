@@ -2,8 +2,15 @@
 Base classes for map-reduce operations.
 """
 
+import bisect
+import struct
+import zlib
 from abc import ABC, abstractmethod
-from typing import Any, Iterator, Tuple, List
+from typing import Any, Dict, Iterator, Sequence, Tuple, List, Optional
+
+import numpy as np
+
+from ..utils.columnar import records_to_columns, columns_to_pairs
 
 
 class Mapper(ABC):
@@ -28,6 +35,46 @@ class Mapper(ABC):
         pass
 
 
+class BatchMapper(Mapper):
+    """
+    Abstract base class for columnar map operations.
+    
+    Batch mappers receive a whole batch of records as a dict of NumPy arrays
+    (one array per column) and emit key and value columns, so the map phase
+    runs as NumPy expressions instead of one Python call per record.
+    """
+    
+    # Columns read by map_batch (None = all available columns)
+    columns: Optional[List[str]] = None
+    
+    # Exclusive upper bound of every key component when keys are small
+    # non-negative integers, e.g. (24,) for hours or (266, 266) for zone
+    # pairs. With a vectorized aggregate combiner, map tasks then aggregate
+    # into arrays indexed by key and ship one state per key (None = keys
+    # are unbounded).
+    key_domain: Optional[Tuple[int, ...]] = None
+    
+    @abstractmethod
+    def map_batch(self, batch: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map function to process a batch of records at once.
+        
+        Args:
+            batch: Dict mapping column name to an array with one entry per record
+            
+        Returns:
+            Tuple of (keys, values) arrays of equal length. Keys may be a 2-D
+            array of shape (n, k) to emit composite (tuple) keys.
+        """
+        pass
+    
+    def map(self, key: Any, value: Any) -> Iterator[Tuple[Any, Any]]:
+        """Map a single record by running map_batch on a batch of one."""
+        batch = records_to_columns([(key, value)], self.columns)
+        keys, values = self.map_batch(batch)
+        yield from columns_to_pairs(keys, values)
+
+
 class Reducer(ABC):
     """
     Abstract base class for reduce operations.
@@ -35,6 +82,10 @@ class Reducer(ABC):
     Reducers aggregate values for each key after the shuffle phase.
     """
     
+    # True if reduce() can also run map-side as a combiner, i.e. its output
+    # values are valid inputs to reduce() again (e.g. partial sums)
+    can_combine: bool = False
+    
     @abstractmethod
     def reduce(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
         """
@@ -42,14 +93,39 @@ class Reducer(ABC):
         
         Args:
             key: The key to reduce
-            values: List of all values associated with this key
-            
+            values: List of all values associated with this key; when the
+                job sorts by key, an iterator to be consumed once
+                
         Yields:
             Tuples of (output_key, output_value)
         """
         pass
 
 
+class Combiner(ABC):
+    """
+    Abstract base class for map-side combine operations.
+    
+    Combiners pre-aggregate a mapper's output per key before the shuffle,
+    so fewer pairs are sent over the network. The job's reducer must accept
+    the combined values as input.
+    """
+    
+    @abstractmethod
+    def combine(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Combine all values a single map task emitted for a key.
+        
+        Args:
+            key: The intermediate key
+            values: Values emitted for this key by one map task
+            
+        Yields:
+            Tuples of (intermediate_key, combined_value)
+        """
+        pass
+
+
 class Partitioner(ABC):
     """
     Abstract base class for partitioning logic.
@@ -70,11 +146,270 @@ class Partitioner(ABC):
             Partition index (0 to num_partitions-1)
         """
         pass
+    
+    def get_partitions(self, keys: np.ndarray, num_partitions: int) -> np.ndarray:
+        """
+        Determine the partition for every key in an array.
+        
+        Batch mappers use this to partition a whole key column at once.
+        The default calls get_partition per key; subclasses may vectorize it.
+        
+        Args:
+            keys: Key column, shape (n,) or (n, k) for composite keys
+            num_partitions: Total number of partitions (workers)
+            
+        Returns:
+            int64 array of partition indexes, one per key
+        """
+        key_list = keys.tolist()
+        if keys.ndim == 2:
+            key_list = map(tuple, key_list)
+        return np.fromiter(
+            (self.get_partition(key, num_partitions) for key in key_list),
+            dtype=np.int64,
+            count=len(keys)
+        )
 
 
 class HashPartitioner(Partitioner):
-    """Default hash-based partitioner."""
+    """
+    Default hash-based partitioner.
+    
+    Uses stable_hash() rather than the built-in hash(), which is salted per
+    process for strings, so every worker sends a key to the same reducer.
+    """
+    
+    def get_partition(self, key: Any, num_partitions: int) -> int:
+        """Use a process-stable hash to distribute keys across partitions."""
+        return stable_hash(key) % num_partitions
+    
+    def get_partitions(self, keys: np.ndarray, num_partitions: int) -> np.ndarray:
+        """Vectorized get_partition for a whole key column."""
+        return (stable_hash_array(keys) % np.uint64(num_partitions)).astype(np.int64)
+
+
+class RangePartitioner(Partitioner):
+    """
+    Partitioner that sends contiguous key ranges to consecutive partitions.
+    
+    Partition i receives the keys k with split_points[i-1] <= k <
+    split_points[i], so when every reducer emits its keys in order, the
+    outputs of partitions 0, 1, ... concatenate into globally ordered
+    results. Split points are quantiles of a key sample (from_sample()),
+    which gives partitions similar numbers of keys. Keys must be mutually
+    orderable.
+    
+    Unlike HashPartitioner the split points are state, so the coordinator
+    ships instances rather than the class.
+    """
+    
+    def __init__(self, split_points: Optional[Sequence[Any]] = None):
+        """
+        Args:
+            split_points: Ascending lower bounds of partitions 1, 2, ...
+                (None = everything in partition 0)
+        """
+        self.split_points = list(split_points or [])
+    
+    @classmethod
+    def from_sample(cls, keys: Sequence[Any], num_partitions: int) -> 'RangePartitioner':
+        """
+        Choose split points that cut a key sample into equal parts.
+        
+        Args:
+            keys: Sampled intermediate keys (duplicates allowed)
+            num_partitions: Number of partitions the split points are for
+            
+        Returns:
+            RangePartitioner with up to num_partitions - 1 split points
+        """
+        sample = sorted(keys)
+        split_points = []
+        for i in range(1, num_partitions):
+            if not sample:
+                break
+            point = sample[len(sample) * i // num_partitions]
+            # A heavy key spanning several quantiles yields one split point
+            if not split_points or point > split_points[-1]:
+                split_points.append(point)
+        return cls(split_points)
+    
+    def get_partition(self, key: Any, num_partitions: int) -> int:
+        """Return the index of the key range that contains the key."""
+        return min(bisect.bisect_right(self.split_points, key), num_partitions - 1)
+    
+    def get_partitions(self, keys: np.ndarray, num_partitions: int) -> np.ndarray:
+        """
+        Vectorized get_partition for a whole key column.
+        
+        Sorts the keys together with the split points (lexicographically
+        for composite keys); a key's partition is the number of split
+        points sorted before it.
+        """
+        if not self.split_points or not len(keys) or keys.dtype.kind not in 'iufb':
+            return super().get_partitions(keys, num_partitions)
+        
+        points = np.array(self.split_points).reshape(len(self.split_points), -1)
+        key_columns = keys.reshape(len(keys), -1)
+        combined = np.concatenate([points, key_columns])
+        # Split points sort before equal keys (bisect_right)
+        is_key = np.concatenate([np.zeros(len(points), dtype=np.int8), np.ones(len(keys), dtype=np.int8)])
+        order = np.lexsort((is_key,) + tuple(combined.T[::-1]))
+        
+        points_before = np.cumsum(is_key[order] == 0)
+        partitions = np.empty(len(combined), dtype=np.int64)
+        partitions[order] = points_before
+        return np.minimum(partitions[len(points):], num_partitions - 1)
+
+
+class HotKeyPartitioner(Partitioner):
+    """
+    Partitioner that spreads the pairs of a few hot keys over several partitions.
+    
+    Other keys are partitioned by the wrapped partitioner. The pairs of a
+    hot key go round-robin to its own partition and the next ones, so no
+    single reducer receives all of them. Every receiving reducer then
+    emits a partial result for the key, which the coordinator merges; this
+    is only correct for aggregate reducers and reducers that can combine.
+    
+    The round-robin position is per instance. Each map task unpickles its
+    own and starts at its task index (start_at()), so re-running a task
+    over the same input sends every pair to the same partition again, and
+    map tasks that combine a hot key into one state still spread it.
+    """
+    
+    def __init__(self, partitioner: Partitioner, hot_keys: Dict[Any, int]):
+        """
+        Args:
+            partitioner: Partitioner for all other keys (and the first
+                partition of each hot key)
+            hot_keys: Number of partitions to spread each hot key over
+        """
+        self.partitioner = partitioner
+        self.hot_keys = dict(hot_keys)
+        self._next = {key: 0 for key in self.hot_keys}
+    
+    def start_at(self, turn: int):
+        """Make every hot key's next pair take the given turn."""
+        self._next = {key: turn for key in self.hot_keys}
     
     def get_partition(self, key: Any, num_partitions: int) -> int:
-        """Use hash function to distribute keys across partitions."""
-        return hash(str(key)) % num_partitions
+        """Return the key's partition, taking turns for hot keys."""
+        partition = self.partitioner.get_partition(key, num_partitions)
+        ways = self.hot_keys.get(key)
+        if not ways:
+            return partition
+        turn = self._next[key]
+        self._next[key] = turn + 1
+        return (partition + turn % ways) % num_partitions
+    
+    def get_partitions(self, keys: np.ndarray, num_partitions: int) -> np.ndarray:
+        """Vectorized get_partition: the wrapped partitioner's, then hot keys take turns."""
+        partitions = self.partitioner.get_partitions(keys, num_partitions)
+        for key, ways in self.hot_keys.items():
+            if keys.ndim == 2:
+                if not isinstance(key, tuple) or len(key) != keys.shape[1]:
+                    continue
+                mask = (keys == np.array(key, dtype=keys.dtype)).all(axis=1)
+            else:
+                mask = keys == key
+            count = int(np.count_nonzero(mask))
+            if not count:
+                continue
+            turns = (self._next[key] + np.arange(count)) % ways
+            partitions[mask] = (partitions[mask] + turns) % num_partitions
+            self._next[key] += count
+        return partitions
+
+
+_MASK64 = (1 << 64) - 1
+_TUPLE_SEED = 0x9E3779B97F4A7C15
+_TUPLE_PRIME = 0x100000001B3
+
+
+def _fmix64(value: int) -> int:
+    """MurmurHash3 64-bit finalizer: scrambles all input bits into the output."""
+    value ^= value >> 33
+    value = (value * 0xFF51AFD7ED558CCD) & _MASK64
+    value ^= value >> 33
+    value = (value * 0xC4CEB9FE1A85EC53) & _MASK64
+    value ^= value >> 33
+    return value
+
+
+def _fmix64_array(values: np.ndarray) -> np.ndarray:
+    """Vectorized _fmix64 over a uint64 array (multiplication wraps mod 2**64)."""
+    values = values ^ (values >> np.uint64(33))
+    values = values * np.uint64(0xFF51AFD7ED558CCD)
+    values = values ^ (values >> np.uint64(33))
+    values = values * np.uint64(0xC4CEB9FE1A85EC53)
+    values = values ^ (values >> np.uint64(33))
+    return values
+
+
+def stable_hash(key: Any) -> int:
+    """
+    64-bit hash of a key that is the same in every process and on every machine.
+    
+    Integers (and integral floats, which compare equal to them) are mixed
+    with the MurmurHash3 finalizer, strings and bytes use CRC32 of their
+    encoding, and tuples combine the hashes of their elements.
+    
+    Args:
+        key: Intermediate key (int, float, str, bytes or tuple of those)
+        
+    Returns:
+        Unsigned 64-bit hash
+    """
+    if isinstance(key, (float, np.floating)):
+        if float(key).is_integer():
+            key = int(key)
+        else:
+            return _fmix64(struct.unpack('<Q', struct.pack('<d', float(key)))[0])
+    if isinstance(key, (int, np.integer)):
+        return _fmix64(int(key) & _MASK64)
+    if isinstance(key, str):
+        return _fmix64(zlib.crc32(key.encode('utf-8')))
+    if isinstance(key, bytes):
+        return _fmix64(zlib.crc32(key))
+    if isinstance(key, tuple):
+        value = _TUPLE_SEED
+        for item in key:
+            value = _fmix64(((value * _TUPLE_PRIME) & _MASK64) ^ stable_hash(item))
+        return value
+    return _fmix64(zlib.crc32(repr(key).encode('utf-8')))
+
+
+def stable_hash_array(keys: np.ndarray) -> np.ndarray:
+    """
+    Vectorized stable_hash() for a key column.
+    
+    Integer columns (and 2-D integer arrays of composite keys) are hashed
+    entirely in NumPy; other dtypes fall back to stable_hash() per key.
+    
+    Args:
+        keys: Key column, shape (n,) or (n, k) for composite keys
+        
+    Returns:
+        uint64 array of hashes, one per key
+    """
+    keys = np.asarray(keys)
+    
+    # Integral floats hash like ints; outside the int64 range the cast
+    # would overflow, so those columns take the per-key path below
+    if keys.dtype.kind == 'f' and np.all(np.mod(keys, 1) == 0) and np.all(np.abs(keys) < 2.0 ** 63):
+        keys = keys.astype(np.int64)
+    
+    if keys.dtype.kind in 'iub':
+        if keys.ndim == 1:
+            return _fmix64_array(keys.astype(np.uint64))
+        
+        values = np.full(len(keys), _TUPLE_SEED, dtype=np.uint64)
+        for column in keys.T:
+            values = _fmix64_array((values * np.uint64(_TUPLE_PRIME)) ^ _fmix64_array(column.astype(np.uint64)))
+        return values
+    
+    key_list = keys.tolist()
+    if keys.ndim == 2:
+        key_list = map(tuple, key_list)
+    return np.fromiter((stable_hash(key) for key in key_list), dtype=np.uint64, count=len(keys))
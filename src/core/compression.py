@@ -0,0 +1,201 @@
+"""
+Payload compression for map inputs, shuffle chunks and results.
+
+Bodies are compressed after serialization and marked with the
+X-Payload-Compression header. A custom header is used instead of
+Content-Encoding so HTTP clients don't decode bodies behind our back.
+zstd and lz4 are optional packages; gzip is always available.
+"""
+
+import gzip
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional; workers without it don't advertise zstd
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional; workers without it don't advertise lz4
+    lz4_frame = None
+
+
+# Header naming the compression of a request or response body
+COMPRESSION_HEADER = 'X-Payload-Compression'
+
+# Compression preference used when the config does not specify one
+DEFAULT_COMPRESSION_PREFERENCE = ['zstd', 'lz4', 'gzip']
+
+# Bodies smaller than this many bytes are sent uncompressed by default
+DEFAULT_COMPRESSION_THRESHOLD = 4096
+
+
+class Compressor(ABC):
+    """
+    Abstract base class for payload compressors.
+    """
+    
+    # Short name used in negotiation and in the X-Payload-Compression header
+    name: str = ''
+    
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Compress a payload."""
+        pass
+    
+    @abstractmethod
+    def decompress(self, data: bytes) -> bytes:
+        """Decompress a payload produced by compress()."""
+        pass
+
+
+class ZstdCompressor(Compressor):
+    """Zstandard. Best ratio per CPU second; requires the zstandard package."""
+    
+    name = 'zstd'
+    
+    def __init__(self, level: int = 3):
+        self.level = level
+    
+    def compress(self, data: bytes) -> bytes:
+        # Compressor objects are not thread-safe, so make one per call
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return zstandard.ZstdDecompressor().decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    """LZ4 frames. Very fast, lower ratio; requires the lz4 package."""
+    
+    name = 'lz4'
+    
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+class GzipCompressor(Compressor):
+    """gzip from the standard library. Slowest, but always available."""
+    
+    name = 'gzip'
+    
+    def __init__(self, level: int = 6):
+        self.level = level
+    
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+
+_COMPRESSORS: Dict[str, Compressor] = {GzipCompressor.name: GzipCompressor()}
+if zstandard is not None:
+    _COMPRESSORS[ZstdCompressor.name] = ZstdCompressor()
+if lz4_frame is not None:
+    _COMPRESSORS[Lz4Compressor.name] = Lz4Compressor()
+
+
+def available_compressions() -> List[str]:
+    """Return the names of compressors usable in this process."""
+    return sorted(_COMPRESSORS)
+
+
+def get_compressor(name: str) -> Compressor:
+    """
+    Look up a compressor by name.
+    
+    Args:
+        name: Compressor name (e.g. 'zstd', 'gzip')
+        
+    Returns:
+        The compressor instance
+        
+    Raises:
+        ValueError: If the compressor is unknown or not installed
+    """
+    if name not in _COMPRESSORS:
+        raise ValueError(f"Unknown or unavailable compression: {name}")
+    return _COMPRESSORS[name]
+
+
+def negotiate_compression(preferred: Iterable[str], supported: Iterable[Iterable[str]]) -> Optional[str]:
+    """
+    Pick the first preferred compression that every participant supports.
+    
+    Args:
+        preferred: Compression names in order of preference ('none' or an
+            empty list disables compression)
+        supported: For each participant, the compression names it supports
+        
+    Returns:
+        Name of the chosen compression, or None to send bodies uncompressed
+    """
+    common = set(available_compressions())
+    for names in supported:
+        common &= set(names)
+    
+    for name in preferred:
+        if name == 'none':
+            return None
+        if name in common:
+            return name
+    return None
+
+
+def compress_payload(
+    data: bytes,
+    compression: Optional[str],
+    threshold: int = DEFAULT_COMPRESSION_THRESHOLD
+) -> Tuple[bytes, Optional[str], float]:
+    """
+    Compress a body if compression is enabled and it is large enough.
+    
+    Args:
+        data: Serialized body
+        compression: Negotiated compression name (None = off)
+        threshold: Bodies smaller than this many bytes are left as they are
+        
+    Returns:
+        (body, compression applied or None, CPU seconds spent compressing)
+    """
+    if compression is None or len(data) < threshold:
+        return data, None, 0.0
+    
+    start_time = time.thread_time()
+    body = get_compressor(compression).compress(data)
+    return body, compression, time.thread_time() - start_time
+
+
+def decompress_payload(body: bytes, compression: Optional[str]) -> bytes:
+    """
+    Undo compress_payload().
+    
+    Args:
+        body: Body as received
+        compression: Value of the X-Payload-Compression header (None = plain)
+        
+    Returns:
+        The serialized body
+    """
+    if not compression:
+        return body
+    return get_compressor(compression).decompress(body)
+
+
+def new_transfer_stats() -> Dict[str, float]:
+    """Return empty counters for one kind of transfer."""
+    return {'raw_bytes': 0, 'wire_bytes': 0, 'compress_time': 0.0}
+
+
+def record_transfer(stats: Dict[str, float], raw_bytes: int, wire_bytes: int, compress_time: float):
+    """Add one transfer to counters made by new_transfer_stats()."""
+    stats['raw_bytes'] += raw_bytes
+    stats['wire_bytes'] += wire_bytes
+    stats['compress_time'] += compress_time
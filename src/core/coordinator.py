@@ -2,18 +2,47 @@
 Coordinator (master) node for managing map-reduce jobs.
 """
 
+import heapq
+import json
 import pickle
 import logging
+import math
+import queue
+import random
+import statistics
+import threading
 import time
-from typing import List, Type, Any
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple, Type, Any
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
 
-from .base import Mapper, Reducer, Partitioner, HashPartitioner
+from .base import Mapper, Reducer, Combiner, Partitioner, HashPartitioner, HotKeyPartitioner, RangePartitioner
+from .aggregates import AggregateReducer
+from .serialization import DEFAULT_CODEC_PREFERENCE, get_codec, negotiate_codec
+from .compression import (
+    COMPRESSION_HEADER,
+    DEFAULT_COMPRESSION_PREFERENCE,
+    DEFAULT_COMPRESSION_THRESHOLD,
+    compress_payload,
+    decompress_payload,
+    negotiate_compression,
+    new_transfer_stats,
+    record_transfer
+)
+from .membership import DEFAULT_HEARTBEAT_INTERVAL, DEFAULT_HEARTBEAT_TIMEOUT, ClusterMembership, HeartbeatServer
 
 
 logger = logging.getLogger(__name__)
 
+# Records (and keys) sampled over the whole input before a job that needs
+# range partition split points or hot keys
+KEY_SAMPLE_SIZE = 10000
+
+# Most frequent keys each sampled map task reports per task when looking
+# for hot keys
+HOT_KEY_SKETCH_SIZE = 32
+
 
 class Coordinator:
     """
@@ -27,20 +56,167 @@ class Coordinator:
     - Collect and aggregate final results
     """
     
-    def __init__(self, worker_addresses: List[str], timeout: int = 60):
+    def __init__(
+        self,
+        worker_addresses: List[str],
+        timeout: int = 60,
+        shuffle_codecs: Optional[List[str]] = None,
+        compressions: Optional[List[str]] = None,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        shared_memory_shuffle: bool = True,
+        memory_budgets: Optional[Dict[str, Optional[float]]] = None,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        speculative_multiple: Optional[float] = None,
+        heartbeat_address: Optional[Tuple[str, int]] = None,
+        heartbeat_interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = DEFAULT_HEARTBEAT_TIMEOUT,
+        sort_by_key: bool = False,
+        hot_key_threshold: Optional[float] = None
+    ):
         """
         Initialize the coordinator.
         
         Args:
             worker_addresses: List of worker URLs (e.g., ["http://localhost:5001", ...])
             timeout: Timeout for worker operations in seconds
+            shuffle_codecs: Shuffle codec names in order of preference
+                (None = DEFAULT_CODEC_PREFERENCE)
+            compressions: Payload compressions in order of preference
+                (None = DEFAULT_COMPRESSION_PREFERENCE, ['none'] = off)
+            compression_threshold: Bodies smaller than this many bytes are
+                sent uncompressed
+            shared_memory_shuffle: Let workers on the same host exchange
+                shuffle chunks through shared memory instead of HTTP
+            memory_budgets: Intermediate memory budget in MB per worker
+                address; workers spill to disk beyond it (missing = the
+                worker's own --memory-budget-mb)
+            max_retries: Times a failed map or reduce task is retried
+            retry_backoff: Seconds before the first retry; doubled for each
+                further retry
+            speculative_multiple: Start a backup attempt of a map task that
+                has run this many times longer than the median task
+                (None = no speculative execution)
+            heartbeat_address: (host, port) workers send heartbeats to; the
+                coordinator listens on that port (None = no heartbeats)
+            heartbeat_interval: Seconds between worker heartbeats
+            heartbeat_timeout: Seconds without a heartbeat after which a
+                worker is dropped from the job
+            sort_by_key: Sort-based reduce: workers read their intermediate
+                data in key order and stream each key's values to the
+                reducer, and results come back in key order
+            hot_key_threshold: Spread a key over several reducers when a
+                sample of the map output puts it above this fraction of
+                one reducer's fair share of a task's pairs; the partial
+                results are merged on the coordinator. Only aggregate
+                reducers and reducers that can combine are split (None =
+                off)
         """
         self.worker_addresses = worker_addresses
         self.timeout = timeout
         self.num_workers = len(worker_addresses)
+        self.shuffle_codecs = shuffle_codecs or DEFAULT_CODEC_PREFERENCE
+        self.compressions = compressions if compressions is not None else DEFAULT_COMPRESSION_PREFERENCE
+        self.compression_threshold = compression_threshold
+        self.shared_memory_shuffle = shared_memory_shuffle
+        self.memory_budgets = memory_budgets or {}
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.speculative_multiple = speculative_multiple
+        self.sort_by_key = sort_by_key
+        self.hot_key_threshold = hot_key_threshold
+        self._range_partitioned = False
+        self._hot_keys: List[Dict[Any, int]] = []
+        
+        # Codecs and compressions supported by each worker, filled in by the health check
+        self.worker_codecs: Dict[str, List[str]] = {}
+        self.worker_compressions: Dict[str, List[str]] = {}
+        self.worker_hosts: Dict[str, Optional[str]] = {}
+        
+        # Bytes before/after compression and CPU time, per phase of the last job
+        self.transfer_stats: Dict[str, Dict[str, float]] = {}
+        
+        # Pairs reduced and reduce time per reducer of the last job
+        self.reduce_stats: Dict[str, Dict[str, float]] = {}
+        
+        # Failure handling state of the current job: workers still taking
+        # part, the worker owning each partition, committed map attempts
+        # (attempt id -> (task item, {partition: owner})) and tasks to re-execute
+        self.live_workers: List[str] = list(worker_addresses)
+        self.partition_owners: List[str] = list(worker_addresses)
+        self._committed: Dict[str, Tuple[dict, Dict[int, str]]] = {}
+        self._recovery: List[dict] = []
+        self._job_seq = 0
+        self._attempt_seq = 0
+        self._job_lock = threading.Lock()
+        
+        # Live membership table fed by worker heartbeats
+        self.membership: Optional[ClusterMembership] = None
+        self.heartbeat_interval = heartbeat_interval
+        self._heartbeat_server: Optional[HeartbeatServer] = None
+        self._stopped = threading.Event()
+        self._request_executor = ThreadPoolExecutor(4 * self.num_workers, thread_name_prefix='coordinator-request')
         
         logger.info(f"Coordinator initialized with {self.num_workers} workers")
         self._check_worker_health()
+        
+        if heartbeat_address is not None:
+            host, port = heartbeat_address
+            self.membership = ClusterMembership(timeout=heartbeat_timeout)
+            self._heartbeat_server = HeartbeatServer(self.membership, port=port)
+            self._heartbeat_server.start()
+            self.heartbeat_url = f"http://{host}:{self._heartbeat_server.port}/heartbeat"
+            threading.Thread(target=self._watch_heartbeats, name='heartbeat-monitor', daemon=True).start()
+    
+    def close(self):
+        """Stop receiving heartbeats and release request threads."""
+        self._stopped.set()
+        if self._heartbeat_server is not None:
+            self._heartbeat_server.stop()
+        self._request_executor.shutdown(wait=False)
+    
+    def _watch_heartbeats(self):
+        """Drop workers from the job as soon as their heartbeats stop."""
+        while not self._stopped.wait(self.heartbeat_interval / 2):
+            for worker_addr in self.membership.expired():
+                if worker_addr in self.live_workers:
+                    self._mark_dead(worker_addr, TimeoutError(f"no heartbeat for {self.membership.timeout:.0f}s"))
+                self.membership.forget(worker_addr)
+    
+    def _is_responsive(self, worker_addr: str) -> bool:
+        """
+        Whether a worker's heartbeats are on time.
+        
+        Workers that missed a couple of heartbeats are not given new work
+        until they either report again or are declared dead.
+        """
+        if self.membership is None:
+            return True
+        age = self.membership.age(worker_addr)
+        return age is None or age <= 2 * self.heartbeat_interval
+    
+    def _post(self, watched: Iterable[str], url: str, **kwargs) -> requests.Response:
+        """
+        POST that gives up as soon as one of the watched workers is dropped.
+        
+        Without heartbeats this is a plain requests.post(). With them, a
+        request to a worker that went silent fails within a heartbeat
+        timeout instead of waiting for the request timeout.
+        
+        Raises:
+            ConnectionError: If a watched worker was dropped from the job
+        """
+        if self.membership is None:
+            return requests.post(url, **kwargs)
+        
+        future = self._request_executor.submit(requests.post, url, **kwargs)
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except FutureTimeout:
+                dropped = [addr for addr in watched if addr not in self.live_workers]
+                if dropped:
+                    raise ConnectionError(f"Worker {dropped[0]} stopped sending heartbeats")
     
     def _check_worker_health(self):
         """Check if all workers are healthy and responsive."""
@@ -55,7 +231,10 @@ class Coordinator:
             for future in as_completed(futures):
                 addr = futures[future]
                 try:
-                    future.result()
+                    health = future.result()
+                    self.worker_codecs[addr] = health.get('codecs', ['json'])
+                    self.worker_compressions[addr] = health.get('compressions', [])
+                    self.worker_hosts[addr] = health.get('host_id')
                     logger.info(f"Worker {addr} is healthy")
                 except Exception as e:
                     logger.error(f"Worker {addr} health check failed: {e}")
@@ -69,234 +248,1061 @@ class Coordinator:
     
     def run_job(
         self,
-        input_data: List[tuple],
+        input_data: Optional[List[tuple]],
         mapper_class: Type[Mapper],
         reducer_class: Type[Reducer],
-        partitioner_class: Type[Partitioner] = HashPartitioner
+        partitioner_class: Type[Partitioner] = HashPartitioner,
+        shuffle_codec: Optional[str] = None,
+        combiner_class: Optional[Type[Combiner]] = None,
+        input_splits: Optional[List[dict]] = None,
+        columns: Optional[List[str]] = None,
+        split_size: Optional[int] = None
     ) -> List[tuple]:
         """
         Execute a complete map-reduce job.
         
+        Input is either shipped to the workers (input_data) or read by the
+        workers themselves from Parquet (input_splits). Either way it is cut
+        into map tasks that idle workers pull from a shared queue, so faster
+        workers end up processing more of the data.
+        
         Args:
-            input_data: List of (key, value) tuples to process
+            input_data: List of (key, value) tuples to process, or None when
+                input_splits is given
             mapper_class: Class implementing Mapper interface
             reducer_class: Class implementing Reducer interface
-            partitioner_class: Class implementing Partitioner interface
-            
+            partitioner_class: Class implementing Partitioner interface; for
+                RangePartitioner (or a subclass) split points are sampled
+                per task and results come back in key order
+            shuffle_codec: Codec for shuffle and result transfer (None = negotiate)
+            combiner_class: Class implementing Combiner interface (None = use
+                the reducer as combiner if it declares can_combine)
+            input_splits: Split descriptors from plan_parquet_splits(); each
+                worker reads its splits from its own copy of the files
+            columns: Columns workers read for non-batch mappers (None = all)
+            split_size: Records per map task for input_data (None = one
+                task per worker); input_splits are used as planned
+                
         Returns:
             List of (key, value) tuples representing final results
         """
-        logger.info(f"Starting map-reduce job with {len(input_data)} input records")
+        return self.run_jobs(
+            input_data,
+            [(mapper_class, reducer_class)],
+            partitioner_class=partitioner_class,
+            shuffle_codec=shuffle_codec,
+            combiner_classes=[combiner_class],
+            input_splits=input_splits,
+            columns=columns,
+            split_size=split_size
+        )[0]
+    
+    def run_jobs(
+        self,
+        input_data: Optional[List[tuple]],
+        tasks: List[Tuple[Type[Mapper], Type[Reducer]]],
+        partitioner_class: Type[Partitioner] = HashPartitioner,
+        shuffle_codec: Optional[str] = None,
+        combiner_classes: Optional[List[Optional[Type[Combiner]]]] = None,
+        input_splits: Optional[List[dict]] = None,
+        columns: Optional[List[str]] = None,
+        split_size: Optional[int] = None
+    ) -> List[List[tuple]]:
+        """
+        Execute several map-reduce tasks over one scan of the same input.
+        
+        Each map task reads its split once and runs every task's mapper on
+        it. The output of each task is shuffled and reduced separately, so
+        the tasks finish in about the time of the slowest one instead of
+        the sum of all.
+        
+        Args:
+            input_data: List of (key, value) tuples to process, or None when
+                input_splits is given
+            tasks: (mapper_class, reducer_class) of every task
+            partitioner_class: Class implementing Partitioner interface; for
+                RangePartitioner (or a subclass) split points are sampled
+                per task and results come back in key order
+            shuffle_codec: Codec for shuffle and result transfer (None = negotiate)
+            combiner_classes: Combiner class per task (None entries, or None
+                for all, use the reducer if it declares can_combine)
+            input_splits: Split descriptors from plan_parquet_splits(); each
+                worker reads its splits from its own copy of the files
+            columns: Columns workers read for non-batch mappers (None = all)
+            split_size: Records per map task for input_data (None = one
+                task per worker); input_splits are used as planned
+                
+        Returns:
+            Final (key, value) results of every task, in the order of tasks
+        """
+        if input_splits is not None:
+            num_records = sum(split['num_rows'] for split in input_splits)
+            logger.info(f"Starting map-reduce job with {num_records} input records in {len(input_splits)} data-local splits")
+        else:
+            logger.info(f"Starting map-reduce job with {len(input_data)} input records")
+        if len(tasks) > 1:
+            logger.info(f"Running {len(tasks)} tasks over one scan: {', '.join(mapper.__name__ for mapper, _ in tasks)}")
+        
+        # Pick a wire format every worker understands
+        preference = [shuffle_codec] if shuffle_codec else self.shuffle_codecs
+        codec_name = negotiate_codec(preference, self.worker_codecs.values())
+        logger.info(f"Shuffle codec: {codec_name}")
+        compression = negotiate_compression(self.compressions, self.worker_compressions.values())
+        logger.info(f"Payload compression: {compression or 'none'} (threshold {self.compression_threshold:,} bytes)")
+        self.transfer_stats = {
+            phase: new_transfer_stats()
+            for phase in ('map_input', 'shuffle', 'results')
+        }
         
-        # Reset all workers
-        self._reset_workers()
+        # Reset all workers; those that answer take part in the job
+        self._reset_workers(len(tasks))
+        self._job_seq += 1
+        self.partition_owners = list(self.live_workers)
+        self._committed = {}
+        self._recovery = []
         
-        # Distribute input data across workers
-        data_splits = self._split_data(input_data)
+        # Cut the input into map tasks (records or split descriptors)
+        if input_splits is not None:
+            map_tasks = [
+                {'input_splits': [split], 'columns': columns, 'num_records': split['num_rows']}
+                for split in input_splits
+            ]
+        else:
+            map_tasks = [
+                {'input_data': split, 'num_records': len(split)}
+                for split in self._split_data(input_data, split_size)
+            ]
         
-        # Serialize mapper, reducer, and partitioner
-        mapper_hex = pickle.dumps(mapper_class).hex()
-        reducer_hex = pickle.dumps(reducer_class).hex()
-        partitioner_hex = pickle.dumps(partitioner_class).hex()
+        # Serialize mappers, reducers, and partitioners
+        mapper_hexes = [pickle.dumps(mapper_class).hex() for mapper_class, _ in tasks]
+        reducer_hexes = [pickle.dumps(reducer_class).hex() for _, reducer_class in tasks]
+        
+        # Range partitioning needs split points for every task's keys, and
+        # hot key splitting the keys' frequencies: both come from mapping
+        # a sample of the input first
+        range_partitioned = isinstance(partitioner_class, type) and issubclass(partitioner_class, RangePartitioner)
+        partitioners = [partitioner_class] * len(tasks)
+        self._hot_keys = [{} for _ in tasks]
+        if range_partitioned or self.hot_key_threshold is not None:
+            samples, sketches = self._sample_map_output(
+                map_tasks,
+                mapper_hexes,
+                KEY_SAMPLE_SIZE if range_partitioned else 0,
+                HOT_KEY_SKETCH_SIZE if self.hot_key_threshold is not None else 0
+            )
+            if range_partitioned:
+                partitioners = [partitioner_class.from_sample(keys, len(self.partition_owners)) for keys in samples]
+            if self.hot_key_threshold is not None:
+                for task, (_, reducer_class) in enumerate(tasks):
+                    self._hot_keys[task] = self._find_hot_keys(sketches[task], reducer_class)
+                    if self._hot_keys[task]:
+                        partitioner = partitioners[task]
+                        partitioner = partitioner() if isinstance(partitioner, type) else partitioner
+                        partitioners[task] = HotKeyPartitioner(partitioner, self._hot_keys[task])
+        partitioner_hexes = [pickle.dumps(partitioner).hex() for partitioner in partitioners]
+        self._range_partitioned = range_partitioned
+        
+        combiner_classes = combiner_classes or [None] * len(tasks)
+        combiner_hexes = []
+        for (_, reducer_class), combiner_class in zip(tasks, combiner_classes):
+            combiner_class = self._pick_combiner(reducer_class, combiner_class)
+            combiner_hexes.append(pickle.dumps(combiner_class).hex() if combiner_class else None)
         
         # Map phase
         logger.info("Executing map phase...")
-        self._execute_map_phase(data_splits, mapper_hex, partitioner_hex)
+        map_stats = self._execute_map_phase(
+            map_tasks,
+            mapper_hexes,
+            partitioner_hexes,
+            codec_name,
+            combiner_hexes,
+            compression
+        )
         
         # Reduce phase
         logger.info("Executing reduce phase...")
-        self._execute_reduce_phase(reducer_hex)
+        self._execute_reduce_phase(reducer_hexes)
         
         # Collect results
         logger.info("Collecting results...")
-        results = self._collect_results()
+        results = [
+            self._collect_results(codec_name, reducer_class, compression, task=task)
+            for task, (_, reducer_class) in enumerate(tasks)
+        ]
         
-        logger.info(f"Job completed. Generated {len(results)} output records")
+        logger.info(f"Job completed. Generated {sum(len(task_results) for task_results in results)} output records")
+        self._log_map_stats(map_tasks, map_stats)
+        self._log_reduce_balance()
+        self._log_transfer_stats()
+        self._log_membership()
         return results
     
-    def _reset_workers(self):
-        """Reset all workers to clean state."""
+    def _sample_map_output(
+        self,
+        map_tasks: List[dict],
+        mapper_hexes: List[str],
+        sample_size: int,
+        top_keys: int
+    ) -> Tuple[List[List[Any]], List[Dict[str, Any]]]:
+        """
+        Map a sample of the input to see every task's keys before the job.
+        
+        A few map tasks spread over the input are mapped on the workers,
+        one per live worker (only a random sample of the records of shipped
+        map tasks). Nothing is shuffled.
+        
+        Args:
+            map_tasks: The job's map task inputs
+            mapper_hexes: Pickled mapper class of every task
+            sample_size: Keys to sample per task, for range split points
+            top_keys: Most frequent keys every sampled map task reports per
+                task, for finding hot keys
+                
+        Returns:
+            (keys, sketches): sampled keys of every task, and per task the
+            number of keys mapped ('total') and the counts of the most
+            frequent ones ('heavy', key -> count summed over the samples)
+        """
+        sample_start_time = time.time()
+        step = max(1, len(map_tasks) // len(self.live_workers))
+        picked = map_tasks[::step][:len(self.live_workers)]
+        max_keys = sample_size // len(picked)
+        max_records = max(max_keys, KEY_SAMPLE_SIZE // len(picked))
+        
+        def sample(worker_addr: str, task: dict) -> dict:
+            payload = {'mappers': mapper_hexes, 'max_keys': max_keys, 'top_keys': top_keys}
+            if 'input_splits' in task:
+                payload.update(input_splits=task['input_splits'], columns=task.get('columns'))
+            else:
+                records = task['input_data']
+                payload['input_data'] = random.sample(records, min(len(records), max_records))
+            response = self._post([worker_addr], f"{worker_addr}/sample_keys", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        
+        futures = [
+            self._request_executor.submit(sample, self.live_workers[i % len(self.live_workers)], task)
+            for i, task in enumerate(picked)
+        ]
+        samples: List[List[Any]] = [[] for _ in mapper_hexes]
+        sketches: List[Dict[str, Any]] = [{'total': 0, 'heavy': {}} for _ in mapper_hexes]
+        for future in futures:
+            result = future.result()
+            # JSON turns composite keys into lists
+            for task_keys, keys in zip(samples, result['keys']):
+                task_keys.extend(tuple(key) if isinstance(key, list) else key for key in keys)
+            for sketch, task_sketch in zip(sketches, result['sketches']):
+                sketch['total'] += task_sketch['total']
+                for key, count in task_sketch['heavy']:
+                    key = tuple(key) if isinstance(key, list) else key
+                    sketch['heavy'][key] = sketch['heavy'].get(key, 0) + count
+        
+        logger.info(f"Sampled map output of {len(picked)} map tasks in {time.time() - sample_start_time:.2f}s: {sum(sketch['total'] for sketch in sketches):,} keys mapped, {sum(len(keys) for keys in samples):,} kept for split points")
+        return samples, sketches
+    
+    def _find_hot_keys(self, sketch: Dict[str, Any], reducer_class: Type[Reducer]) -> Dict[Any, int]:
+        """
+        Pick the keys of a task to spread over several reducers.
+        
+        A key is hot when its share of the sampled pairs is above
+        hot_key_threshold times the fair share of one reducer
+        (1 / partitions). It is spread over as many reducers as it takes to
+        bring each part under that limit.
+        
+        Args:
+            sketch: The task's sketch from _sample_map_output()
+            reducer_class: The task's reducer; only aggregate reducers and
+                reducers that can combine may emit partial results
+                
+        Returns:
+            Number of reducers for every hot key
+        """
+        num_partitions = len(self.partition_owners)
+        if num_partitions < 2 or not sketch['total']:
+            return {}
+        limit = self.hot_key_threshold * sketch['total'] / num_partitions
+        hot_keys = {
+            key: min(num_partitions, math.ceil(count / limit))
+            for key, count in sketch['heavy'].items()
+            if count > limit
+        }
+        if not hot_keys:
+            return {}
+        
+        shares = ", ".join(f"{key} ({sketch['heavy'][key] / sketch['total']:.1%})" for key in hot_keys)
+        if not (issubclass(reducer_class, AggregateReducer) or reducer_class.can_combine):
+            logger.warning(f"Hot keys {shares} of {reducer_class.__name__} stay on one reducer: its results cannot be merged")
+            return {}
+        logger.info(f"Splitting hot keys of {reducer_class.__name__} over several reducers: {shares}")
+        return hot_keys
+    
+    @staticmethod
+    def _pick_combiner(reducer_class: Type[Reducer], combiner_class: Optional[Type[Combiner]]) -> Optional[Type[Combiner]]:
+        """
+        Choose the map-side combiner of a task.
+        
+        Raises:
+            ValueError: If an aggregate reducer is given a different combiner
+        """
+        if issubclass(reducer_class, AggregateReducer):
+            # Aggregate reducers expect partial states, which only they produce
+            if combiner_class not in (None, reducer_class):
+                raise ValueError(f"{reducer_class.__name__} is its own combiner; got {combiner_class.__name__}")
+            combiner_class = reducer_class
+        elif combiner_class is None and reducer_class.can_combine:
+            combiner_class = reducer_class
+        if combiner_class:
+            logger.info(f"Map-side combiner: {combiner_class.__name__}")
+        return combiner_class
+    
+    def _reset_workers(self, num_tasks: int = 1):
+        """
+        Reset all workers to clean state and hand out memory budgets.
+        
+        With heartbeats enabled, workers are also told where to send them.
+        Workers that fail to reset are left out of the job.
+        
+        Args:
+            num_tasks: Tasks the job runs over one scan of the input
+            
+        Raises:
+            RuntimeError: If no worker could be reset
+        """
+        def reset_payload(addr: str) -> dict:
+            payload = {'num_tasks': num_tasks}
+            if addr in self.memory_budgets:
+                payload['memory_budget_mb'] = self.memory_budgets[addr]
+            if self.membership is not None:
+                payload['heartbeat'] = {'url': self.heartbeat_url, 'address': addr, 'interval': self.heartbeat_interval}
+            return payload
+        
         with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            futures = [
-                executor.submit(requests.post, f"{addr}/reset", timeout=10)
+            futures = {
+                executor.submit(requests.post, f"{addr}/reset", json=reset_payload(addr), timeout=10): addr
                 for addr in self.worker_addresses
-            ]
+            }
             
+            failed = set()
             for future in as_completed(futures):
-                future.result()  # Ensure all resets complete
+                try:
+                    future.result().raise_for_status()
+                except Exception as e:
+                    logger.error(f"Worker {futures[future]} could not be reset, leaving it out of this job: {e}")
+                    failed.add(futures[future])
+        
+        self.live_workers = [addr for addr in self.worker_addresses if addr not in failed]
+        if not self.live_workers:
+            raise RuntimeError("No worker could be reset")
+        
+        if self.membership is not None:
+            for addr in self.worker_addresses:
+                if addr in failed:
+                    self.membership.forget(addr)
+                else:
+                    self.membership.expect(addr)
     
-    def _split_data(self, input_data: List[tuple]) -> List[List[tuple]]:
+    def _split_data(self, input_data: List[tuple], split_size: Optional[int] = None) -> List[List[tuple]]:
         """
-        Split input data across workers.
+        Split input data into map tasks.
         
         Args:
             input_data: Complete input dataset
+            split_size: Records per split (None = one split per worker)
             
         Returns:
-            List of data chunks, one per worker
+            List of data chunks, one per map task
         """
-        chunk_size = len(input_data) // self.num_workers
-        splits = []
+        if split_size is None:
+            split_size = max(1, -(-len(input_data) // self.num_workers))
         
-        logger.info(f"Splitting {len(input_data):,} records across {self.num_workers} workers...")
+        splits = [
+            input_data[start:start + split_size]
+            for start in range(0, len(input_data), split_size)
+        ] or [[]]
         
-        for i in range(self.num_workers):
-            start = i * chunk_size
-            end = start + chunk_size if i < self.num_workers - 1 else len(input_data)
-            split_data = input_data[start:end]
-            splits.append(split_data)
-            logger.info(f"  Worker {i+1}: records {start:,}-{end:,} ({len(split_data):,} records)")
-        
-        logger.info(f"Dataset split complete: {self.num_workers} partitions created")
+        logger.info(f"Split {len(input_data):,} records into {len(splits)} splits of up to {split_size:,} records")
         return splits
     
-    def _execute_map_phase(self, data_splits: List[List[tuple]], mapper_hex: str, partitioner_hex: str):
-        """Execute map phase on all workers."""
+    def _execute_map_phase(
+        self,
+        map_tasks: List[dict],
+        mapper_hexes: List[str],
+        partitioner_hexes: List[str],
+        codec_name: str,
+        combiner_hexes: Optional[List[Optional[str]]] = None,
+        compression: Optional[str] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Execute the map phase with a pull-based work queue.
+        
+        Every worker runs a loop that takes the next map task from a shared
+        queue as soon as its previous task is done. Failed tasks are retried
+        (see _run_map_tasks).
+        
+        Args:
+            map_tasks: Map task inputs ('input_data' or 'input_splits' payloads
+                plus a 'num_records' count)
+            mapper_hexes: Pickled mapper class of every task
+            partitioner_hexes: Pickled partitioner (class or instance) of
+                every task
+            codec_name: Negotiated shuffle codec
+            combiner_hexes: Pickled combiner class (or None) of every task
+            compression: Negotiated payload compression (None = off)
+            
+        Returns:
+            Per-worker stats: {worker_addr: {'splits', 'records', 'map_time',
+            'shuffle_bytes', 'shuffle_time', 'peers'}}, where 'peers' holds
+            the bytes and upload seconds sent to each peer
+        """
         map_start_time = time.time()
         
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            futures = []
+        common_payload = {
+            'mappers': mapper_hexes,
+            'partitioners': partitioner_hexes,
+            'combiners': combiner_hexes or [None] * len(mapper_hexes),
+            'shuffle_codec': codec_name,
+            'compression': compression,
+            'compression_threshold': self.compression_threshold
+        }
+        stats = {
+            addr: {'splits': 0, 'records': 0, 'map_time': 0.0, 'shuffle_bytes': 0, 'shuffle_time': 0.0, 'peers': {}}
+            for addr in self.worker_addresses
+        }
+        # Kept for re-executing tasks whose output is lost after the map phase
+        self._map_context = (common_payload, stats)
+        
+        self._run_map_tasks(
+            [{'task_id': task_id, 'task': task, 'partitions': None, 'failures': 0} for task_id, task in enumerate(map_tasks)],
+            common_payload,
+            stats
+        )
+        
+        map_total_time = time.time() - map_start_time
+        shuffle_bytes = sum(worker_stats['shuffle_bytes'] for worker_stats in stats.values())
+        logger.info(f"All workers completed map phase in {map_total_time:.2f}s ({shuffle_bytes / 1e6:.1f} MB shuffled)")
+        return stats
+    
+    def _run_map_tasks(self, items: List[dict], common_payload: dict, stats: Dict[str, Dict[str, Any]]):
+        """
+        Run map tasks on the live workers until every task has committed.
+        
+        A failed attempt is queued again after an exponential backoff, up to
+        max_retries times. After a failure the live workers are health
+        checked; dead ones stop pulling tasks, their partitions move to live
+        workers, and the tasks whose output they held are queued again for
+        just those partitions.
+        
+        When the queue is empty, an idle worker starts a backup attempt of
+        the slowest running task once it has run speculative_multiple times
+        longer than the median task. The first attempt to finish commits;
+        the output of the other is dropped by the receivers.
+        
+        Args:
+            items: Task items {'task_id', 'task', 'partitions', 'failures'};
+                'partitions' limits the shuffle output (None = all)
+            common_payload: Map payload fields shared by all tasks
+            stats: Per-worker stats to update, see _execute_map_phase()
             
-            for i, (worker_addr, data_split) in enumerate(zip(self.worker_addresses, data_splits)):
-                payload = {
-                    'mapper': mapper_hex,
-                    'partitioner': partitioner_hex,
-                    'input_data': data_split,
-                    'worker_addresses': self.worker_addresses
-                }
-                
-                logger.info(f"Worker {i+1}: Starting map phase with {len(data_split):,} records")
-                
-                future = executor.submit(
-                    requests.post,
-                    f"{worker_addr}/execute_map",
-                    json=payload,
-                    timeout=self.timeout
+        Raises:
+            RuntimeError: If a task failed more than max_retries times or no
+                live worker is left
+        """
+        task_queue: queue.Queue = queue.Queue()
+        state = {'remaining': 0, 'completed': 0, 'total': 0}
+        running: Dict[int, dict] = {}
+        durations: List[float] = []
+        state_lock = threading.Lock()
+        finished = threading.Event()
+        errors: List[Exception] = []
+        
+        def track(item: dict):
+            """Count a new task item; the caller holds state_lock."""
+            item.update(done=False, running=0, backups=0)
+            state['remaining'] += 1
+            state['total'] += 1
+        
+        def submit(item: dict, delay: float = 0.0):
+            """Queue a task item, after a delay for retries."""
+            if item['failures'] == 0:
+                with state_lock:
+                    track(item)
+            if delay:
+                timer = threading.Timer(delay, task_queue.put, args=(item,))
+                timer.daemon = True
+                timer.start()
+            else:
+                task_queue.put(item)
+        
+        def fail(error: Exception):
+            """Stop the phase with an error."""
+            errors.append(error)
+            finished.set()
+        
+        def pick_straggler() -> Optional[dict]:
+            """Return a running task that deserves a backup attempt, if any."""
+            if self.speculative_multiple is None or not durations:
+                return None
+            threshold = self.speculative_multiple * statistics.median(durations)
+            now = time.time()
+            with state_lock:
+                candidates = [
+                    item for item in running.values()
+                    if not item['done'] and item['backups'] == 0 and now - item['started'] > threshold
+                ]
+                if not candidates:
+                    return None
+                item = min(candidates, key=lambda candidate: candidate['started'])
+                item['backups'] += 1
+            logger.warning(f"Map task {item['task_id']} is straggling ({now - item['started']:.1f}s, median {statistics.median(durations):.1f}s); starting a backup attempt")
+            return item
+        
+        def run_attempt(worker_addr: str, item: dict):
+            """Run one attempt of a task and handle its outcome."""
+            start_time = time.time()
+            with state_lock:
+                item['running'] += 1
+                item.setdefault('started', start_time)
+                running[id(item)] = item
+            
+            try:
+                committed = self._run_map_attempt(worker_addr, item, common_payload, stats)
+                error = None
+            except Exception as e:
+                committed, error = False, e
+            
+            with state_lock:
+                item['running'] -= 1
+                if item['running'] == 0:
+                    running.pop(id(item), None)
+                if committed:
+                    durations.append(time.time() - start_time)
+                    state['remaining'] -= 1
+                    state['completed'] += 1
+                    progress = f"{state['completed']}/{state['total']}"
+                # Another attempt of the task may still succeed
+                retry = error is not None and not item['done'] and item['running'] == 0
+            
+            if committed:
+                logger.info(f"Map progress: {progress} tasks completed")
+            
+            # An attempt that lost to a backup can end after the phase (or the
+            # job) is over; it must not touch worker membership or take
+            # recovery work that belongs to whatever runs now
+            if finished.is_set():
+                return
+            
+            if error is not None:
+                logger.warning(f"Map task {item['task_id']} failed on {worker_addr} (failure {item['failures'] + 1}): {error}")
+                self._check_live_workers()
+                if retry:
+                    item['failures'] += 1
+                    if item['failures'] > self.max_retries:
+                        fail(RuntimeError(f"Map task {item['task_id']} failed {item['failures']} times: {error}"))
+                    else:
+                        # The next attempt starts afresh and may get its own backup
+                        item['backups'] = 0
+                        item.pop('started', None)
+                        submit(item, self.retry_backoff * 2 ** (item['failures'] - 1))
+            
+            if not self.live_workers:
+                fail(RuntimeError("No live workers left"))
+            
+            # Checked and taken under the lock that ends the phase, so recovery
+            # items are never handed to a phase that has already finished
+            with state_lock:
+                if finished.is_set():
+                    return
+                recovery = self._take_recovery()
+                for recovery_item in recovery:
+                    track(recovery_item)
+                if state['remaining'] == 0:
+                    finished.set()
+            for recovery_item in recovery:
+                task_queue.put(recovery_item)
+        
+        def run_worker(worker_addr: str):
+            """Pull map tasks for one worker until all tasks are done."""
+            while not finished.is_set() and worker_addr in self.live_workers:
+                if not self._is_responsive(worker_addr):
+                    # Behind on heartbeats: leave the tasks to other workers
+                    finished.wait(0.1)
+                    continue
+                try:
+                    item = task_queue.get(timeout=0.1)
+                except queue.Empty:
+                    item = pick_straggler()
+                    if item is None:
+                        continue
+                try:
+                    run_attempt(worker_addr, item)
+                except BaseException as e:
+                    fail(e)
+        
+        for item in items:
+            submit(item)
+        if not items:
+            return
+        
+        # Plain daemon threads: the phase ends when every task has committed,
+        # without waiting for attempts that lost to a backup
+        threads = [
+            threading.Thread(target=run_worker, args=(addr,), name=f'map-{addr}', daemon=True)
+            for addr in list(self.live_workers)
+        ]
+        for thread in threads:
+            thread.start()
+        while not finished.wait(0.1):
+            if not any(thread.is_alive() for thread in threads):
+                fail(RuntimeError("All map workers stopped"))
+        
+        if errors:
+            logger.error(f"Map phase failed: {errors[0]}")
+            raise errors[0]
+    
+    def _run_map_attempt(self, worker_addr: str, item: dict, common_payload: dict, stats: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Run one attempt of a map task on a worker and commit it.
+        
+        Args:
+            worker_addr: Worker to run the attempt on
+            item: Task item, see _run_map_tasks()
+            common_payload: Map payload fields shared by all tasks
+            stats: Per-worker stats to update
+            
+        Returns:
+            True if the attempt committed, False if another attempt of the
+            task had already finished
+        """
+        task_id, task = item['task_id'], item['task']
+        with self._job_lock:
+            self._attempt_seq += 1
+            attempt = f"{self._job_seq}:{task_id}.{self._attempt_seq}"
+            owners = list(self.partition_owners)
+        
+        payload = {
+            **common_payload,
+            'worker_addresses': owners,
+            'local_partitions': [p for p, owner in enumerate(owners) if owner == worker_addr],
+            'attempt': attempt,
+            'map_task': task_id,
+            'partitions': item['partitions'],
+            **{k: v for k, v in task.items() if k != 'num_records'}
+        }
+        if self.shared_memory_shuffle:
+            # Host of each partition's owner, so co-located workers can use shared memory
+            payload['worker_hosts'] = [self.worker_hosts.get(owner) for owner in owners]
+        
+        logger.debug(f"{worker_addr}: Starting map task {task_id} (attempt {attempt}) with {task['num_records']:,} records")
+        
+        raw_body = json.dumps(payload).encode('utf-8')
+        body, applied, compress_time = compress_payload(raw_body, common_payload['compression'], self.compression_threshold)
+        headers = {'Content-Type': 'application/json'}
+        if applied:
+            headers[COMPRESSION_HEADER] = applied
+        
+        # Fails fast if the mapper or one of the receivers of its output dies
+        response = self._post(
+            [worker_addr, *owners],
+            f"{worker_addr}/execute_map",
+            data=body,
+            headers=headers,
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        result_data = response.json()
+        
+        if not self._commit_attempt(item, attempt, owners):
+            logger.info(f"{worker_addr}: Map task {task_id} attempt {attempt} finished after another attempt; its output is dropped")
+            return False
+        
+        with self._job_lock:
+            record_transfer(self.transfer_stats['map_input'], len(raw_body), len(body), compress_time)
+            for peer_stats in result_data.get('shuffle_peers', {}).values():
+                record_transfer(
+                    self.transfer_stats['shuffle'],
+                    peer_stats.get('raw_bytes', peer_stats['bytes']),
+                    peer_stats['bytes'],
+                    peer_stats.get('compress_time', 0.0)
                 )
-                futures.append(future)
+        
+        worker_stats = stats[worker_addr]
+        worker_stats['splits'] += 1
+        worker_stats['records'] += task['num_records']
+        worker_stats['map_time'] += result_data.get('map_time', 0)
+        worker_stats['shuffle_bytes'] += result_data.get('shuffle_bytes', 0)
+        worker_stats['shuffle_time'] += result_data.get('shuffle_time', 0)
+        for peer, peer_stats in result_data.get('shuffle_peers', {}).items():
+            link = worker_stats['peers'].setdefault(
+                peer,
+                {'bytes': 0, 'seconds': 0.0, 'transport': peer_stats.get('transport', 'http')}
+            )
+            link['bytes'] += peer_stats['bytes']
+            link['seconds'] += peer_stats['seconds']
+        
+        worker_id = result_data.get('worker_id', 'unknown')
+        intermediate_count = result_data.get('intermediate_count', 0)
+        combined_count = result_data.get('combined_count', intermediate_count)
+        map_time = result_data.get('map_time', 0)
+        
+        logger.info(f"Worker {worker_id}: Completed map task {task_id} in {map_time:.2f}s → {intermediate_count:,} intermediate pairs ({combined_count:,} shuffled)")
+        return True
+    
+    def _commit_attempt(self, item: dict, attempt: str, owners: List[str]) -> bool:
+        """
+        Accept a finished map attempt and tell its receivers to keep its output.
+        
+        Only the first attempt of a task to finish is accepted. Output sent
+        to a worker that has died since is queued for re-execution right away.
+        
+        Args:
+            item: Task item of the attempt
+            attempt: Attempt id
+            owners: Partition owners the attempt sent its output to
             
-            # Wait for all map tasks to complete
-            completed_count = 0
+        Returns:
+            False if another attempt of the task was accepted before
+        """
+        partitions = item['partitions'] if item['partitions'] is not None else range(len(owners))
+        used = {p: owners[p] for p in partitions}
+        
+        with self._job_lock:
+            if item.get('done'):
+                return False
+            item['done'] = True
+            self._committed[attempt] = (item, used)
+            lost = [p for p, owner in used.items() if owner not in self.live_workers]
+            if lost:
+                self._recovery.append({'task_id': item['task_id'], 'task': item['task'], 'partitions': lost, 'failures': 0})
+        
+        # Lets receivers fold the output into their store now; the reduce
+        # request repeats the full list, so a lost commit is harmless
+        for owner in set(used.values()) - set(used[p] for p in lost):
+            try:
+                requests.post(f"{owner}/commit", json={'attempts': [attempt]}, timeout=10)
+            except requests.RequestException as e:
+                logger.warning(f"Could not commit attempt {attempt} on {owner}: {e}")
+        return True
+    
+    def _check_live_workers(self):
+        """Health check the live workers and drop those that do not answer."""
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            futures = {
+                executor.submit(self._health_check, addr): addr
+                for addr in list(self.live_workers)
+            }
             for future in as_completed(futures):
                 try:
-                    response = future.result()
-                    response.raise_for_status()
-                    result_data = response.json()
-                    completed_count += 1
-                    
-                    worker_id = result_data.get('worker_id', 'unknown')
-                    intermediate_count = result_data.get('intermediate_count', 0)
-                    map_time = result_data.get('map_time', 0)
-                    
-                    logger.info(f"Worker {worker_id}: Completed map phase in {map_time:.2f}s → {intermediate_count:,} intermediate pairs")
-                    logger.info(f"Map progress: {completed_count}/{self.num_workers} workers completed")
+                    future.result()
                 except Exception as e:
-                    logger.error(f"Map task failed: {e}")
-                    raise
+                    self._mark_dead(futures[future], e)
+    
+    def _mark_dead(self, worker_addr: str, reason: Exception):
+        """
+        Remove a worker from the job and reassign its partitions.
         
-        map_total_time = time.time() - map_start_time
-        logger.info(f"All workers completed map phase in {map_total_time:.2f}s")
+        Committed map output that was sent to the worker is lost with it, so
+        the tasks that produced it are queued again for those partitions.
+        
+        Args:
+            worker_addr: Worker that stopped responding
+            reason: The error that showed it
+        """
+        with self._job_lock:
+            if worker_addr not in self.live_workers:
+                return
+            self.live_workers.remove(worker_addr)
+            logger.error(f"Worker {worker_addr} is not responsive, removing it from the job: {reason}")
+            if not self.live_workers:
+                return
+            
+            for partition_id, owner in enumerate(self.partition_owners):
+                if owner == worker_addr:
+                    # Least loaded live worker takes over the partition
+                    new_owner = min(self.live_workers, key=self.partition_owners.count)
+                    self.partition_owners[partition_id] = new_owner
+                    logger.warning(f"Partition {partition_id} reassigned to {new_owner}")
+            
+            for item, used in self._committed.values():
+                lost = [p for p, owner in used.items() if owner == worker_addr]
+                if lost:
+                    self._recovery.append({'task_id': item['task_id'], 'task': item['task'], 'partitions': lost, 'failures': 0})
+    
+    def _take_recovery(self) -> List[dict]:
+        """Return and clear the task items queued for re-execution."""
+        with self._job_lock:
+            items, self._recovery = self._recovery, []
+        if items:
+            logger.warning(f"Re-executing {len(items)} map task(s) whose output was lost")
+        return items
     
-    def _execute_reduce_phase(self, reducer_hex: str):
-        """Execute reduce phase on all workers."""
+    def _reducers(self) -> List[str]:
+        """Return the live workers that own at least one partition."""
+        return list(dict.fromkeys(self.partition_owners))
+    
+    def _log_map_stats(self, map_tasks: List[dict], stats: Dict[str, Dict[str, float]]):
+        """Report the split size and how many splits each worker processed."""
+        split_sizes = [task['num_records'] for task in map_tasks]
+        logger.info(f"Map splits: {len(map_tasks)} tasks of {min(split_sizes):,}-{max(split_sizes):,} records")
+        
+        for i, addr in enumerate(self.worker_addresses):
+            worker_stats = stats[addr]
+            logger.info(f"  Worker {i+1} ({addr}): {worker_stats['splits']} splits, {worker_stats['records']:,} records, {worker_stats['map_time']:.2f}s busy")
+            
+            if worker_stats['peers']:
+                slowest_peer, slowest = max(worker_stats['peers'].items(), key=lambda item: item[1]['seconds'])
+                logger.info(f"    shuffle: {worker_stats['shuffle_bytes'] / 1e6:.1f} MB in {worker_stats['shuffle_time']:.2f}s, slowest link → {slowest_peer} via {slowest['transport']} ({slowest['bytes'] / 1e6:.1f} MB, {slowest['seconds']:.2f}s)")
+    
+    def _log_reduce_balance(self):
+        """Report how evenly the reduce work was spread over the reducers."""
+        if not self.reduce_stats:
+            return
+        pairs = [stats['input_pairs'] for stats in self.reduce_stats.values()]
+        mean_pairs = statistics.mean(pairs)
+        imbalance = max(pairs) / mean_pairs if mean_pairs else 1.0
+        logger.info(f"Reduce load: {len(pairs)} reducers, {min(pairs):,}-{max(pairs):,} pairs, max/mean {imbalance:.2f}")
+        
+        for addr, stats in self.reduce_stats.items():
+            share = stats['input_pairs'] / sum(pairs) if sum(pairs) else 0.0
+            logger.info(f"  Reducer {addr}: {stats['input_pairs']:,} pairs ({share:.1%}) in {stats['reduce_time']:.2f}s")
+        
+        hot_keys = sum(len(task_hot_keys) for task_hot_keys in self._hot_keys)
+        if hot_keys:
+            logger.info(f"  {hot_keys} hot keys were split over several reducers")
+    
+    def _execute_reduce_phase(self, reducer_hexes: List[str]):
+        """
+        Execute reduce phase on all workers that own partitions.
+        
+        Each worker reduces every task of the job with its reducer from
+        reducer_hexes.
+        
+        A failed reduce is retried with exponential backoff. If the worker
+        died, its partitions are rebuilt on their new owners by re-executing
+        the map tasks that fed them, and those owners reduce again.
+        """
         reduce_start_time = time.time()
+        pending = self._reducers()
+        self.reduce_stats = {}
+        failures: Dict[str, int] = {}
         
-        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
-            futures = []
+        while pending:
+            payload = {
+                'reducers': reducer_hexes,
+                'committed_attempts': list(self._committed),
+                # Range partitions concatenate in order only if sorted inside
+                'sort_by_key': self.sort_by_key or self._range_partitioned
+            }
             
-            for i, worker_addr in enumerate(self.worker_addresses):
-                payload = {'reducer': reducer_hex}
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = {}
+                for worker_addr in pending:
+                    logger.info(f"{worker_addr}: Starting reduce phase")
+                    future = executor.submit(
+                        self._post,
+                        [worker_addr],
+                        f"{worker_addr}/execute_reduce",
+                        json=payload,
+                        timeout=self.timeout
+                    )
+                    futures[future] = worker_addr
                 
-                logger.info(f"Worker {i+1}: Starting reduce phase")
-                
-                future = executor.submit(
-                    requests.post,
-                    f"{worker_addr}/execute_reduce",
-                    json=payload,
-                    timeout=self.timeout
-                )
-                futures.append(future)
-            
-            # Wait for all reduce tasks to complete
-            completed_count = 0
-            for future in as_completed(futures):
-                try:
-                    response = future.result()
-                    response.raise_for_status()
-                    result_data = response.json()
-                    completed_count += 1
+                # Wait for all reduce tasks to complete
+                failed = []
+                for future in as_completed(futures):
+                    worker_addr = futures[future]
+                    try:
+                        response = future.result()
+                        response.raise_for_status()
+                        result_data = response.json()
+                    except Exception as e:
+                        logger.warning(f"Reduce task failed on {worker_addr}: {e}")
+                        failed.append(worker_addr)
+                        continue
                     
                     worker_id = result_data.get('worker_id', 'unknown')
                     input_pairs = result_data.get('input_pairs', 0)
                     output_count = result_data.get('output_count', 0)
                     reduce_time = result_data.get('reduce_time', 0)
+                    spills = result_data.get('spills', 0)
                     
                     logger.info(f"Worker {worker_id}: Reduced {input_pairs:,} pairs → {output_count} unique keys in {reduce_time:.2f}s")
-                    logger.info(f"Reduce progress: {completed_count}/{self.num_workers} workers completed")
-                except Exception as e:
-                    logger.error(f"Reduce task failed: {e}")
-                    raise
+                    self.reduce_stats[worker_addr] = {'input_pairs': input_pairs, 'reduce_time': reduce_time}
+                    if spills:
+                        spilled_mb = result_data.get('spilled_bytes', 0) / 1024 / 1024
+                        logger.info(f"Worker {worker_id}: Merged {spills} spill runs ({spilled_mb:.1f} MB)")
+            
+            pending = failed
+            if not failed:
+                break
+            
+            self._check_live_workers()
+            if not self.live_workers:
+                raise RuntimeError("No live workers left")
+            pending = [addr for addr in pending if addr in self.live_workers]
+            
+            for worker_addr in pending:
+                failures[worker_addr] = failures.get(worker_addr, 0) + 1
+                if failures[worker_addr] > self.max_retries:
+                    raise RuntimeError(f"Reduce task on {worker_addr} failed {failures[worker_addr]} times")
+            if pending:
+                time.sleep(self.retry_backoff * 2 ** (max(failures[addr] for addr in pending) - 1))
+            
+            # Rebuild the partitions of dead workers on their new owners
+            recovery = self._take_recovery()
+            if recovery:
+                self._run_map_tasks(recovery, *self._map_context)
+                rebuilt = {self.partition_owners[p] for item in recovery for p in item['partitions']}
+                pending = list(dict.fromkeys(pending + sorted(rebuilt)))
         
         reduce_total_time = time.time() - reduce_start_time
         logger.info(f"All workers completed reduce phase in {reduce_total_time:.2f}s")
     
-    def _collect_results(self) -> List[tuple]:
-        """Collect final results from all workers and merge duplicates."""
-        all_results = []
+    def _collect_results(
+        self,
+        codec_name: str,
+        reducer_class: Type[Reducer],
+        compression: Optional[str] = None,
+        task: int = 0
+    ) -> List[tuple]:
+        """
+        Collect the final results of one task from all workers and merge duplicates.
+        
+        With sort_by_key every worker returns its results in key order and
+        they are merged into one key-ordered list. Range partitioned results
+        are already globally ordered across partitions and are only
+        concatenated in partition order.
+        """
+        worker_results = {}
+        codec = get_codec(codec_name)
         
         with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
             futures = {
-                executor.submit(requests.get, f"{addr}/get_results", timeout=30): addr
-                for addr in self.worker_addresses
+                executor.submit(
+                    requests.get,
+                    f"{addr}/get_results",
+                    params={
+                        'task': task,
+                        'codec': codec_name,
+                        'compression': compression or '',
+                        'compression_threshold': self.compression_threshold
+                    },
+                    timeout=30
+                ): addr
+                for addr in self._reducers()
             }
             
             for future in as_completed(futures):
                 try:
                     response = future.result()
                     response.raise_for_status()
-                    worker_data = response.json()
-                    results = worker_data['results']
-                    worker_id = worker_data.get('worker_id', 'unknown')
+                    payload = decompress_payload(response.content, response.headers.get(COMPRESSION_HEADER))
+                    results = codec.decode(payload)
+                    record_transfer(
+                        self.transfer_stats['results'],
+                        int(response.headers.get('X-Raw-Bytes', len(payload))),
+                        len(response.content),
+                        float(response.headers.get('X-Compress-Time', 0.0))
+                    )
+                    worker_id = response.headers.get('X-Worker-Id', 'unknown')
                     
                     logger.info(f"Collected from Worker {worker_id}: {len(results)} results")
-                    all_results.extend(results)
+                    worker_results[futures[future]] = results
                 except Exception as e:
                     logger.error(f"Failed to collect results: {e}")
                     raise
         
-        # Final merge: combine duplicate keys from different workers
-        merged = {}
+        owners = self.partition_owners
+        if self._range_partitioned and not self._hot_keys[task] and len(set(owners)) == len(owners):
+            all_results = [result for addr in owners for result in worker_results[addr]]
+        elif self.sort_by_key or self._range_partitioned:
+            # A worker that took over partitions holds several key ranges,
+            # and the parts of a split hot key are in several of them
+            all_results = list(heapq.merge(*worker_results.values(), key=itemgetter(0)))
+        else:
+            all_results = [result for results in worker_results.values() for result in results]
+        
+        logger.info(f"Merging results: {len(all_results)} raw results from all workers")
+        final_results = self._merge_results(all_results, reducer_class, self._hot_keys[task])
+        
+        logger.info(f"Final results: {len(final_results)} unique keys")
+        return final_results
+    
+    def _log_transfer_stats(self):
+        """Report bytes before/after compression and compression CPU time per phase."""
+        for phase, stats in self.transfer_stats.items():
+            if not stats['raw_bytes']:
+                continue
+            ratio = stats['raw_bytes'] / stats['wire_bytes'] if stats['wire_bytes'] else 1.0
+            logger.info(f"Transfer {phase}: {stats['raw_bytes'] / 1e6:.2f} MB → {stats['wire_bytes'] / 1e6:.2f} MB on the wire ({ratio:.1f}x, {stats['compress_time']:.2f}s compressing)")
+    
+    def _log_membership(self):
+        """Report the membership table built from worker heartbeats."""
+        if self.membership is None:
+            return
+        for addr, member in sorted(self.membership.snapshot().items()):
+            memory = f"{member['memory_mb']:.0f} MB" if member.get('memory_mb') is not None else "n/a"
+            load = f"{member['load']:.2f}" if member.get('load') is not None else "n/a"
+            status = "" if addr in self.live_workers else " (dropped from this job)"
+            logger.info(f"Member {addr}{status}: last heartbeat {member['age']:.1f}s ago, load {load}, memory {memory}, queue depth {member.get('queue_depth', 0)}")
+    
+    def _merge_results(
+        self,
+        all_results: List[tuple],
+        reducer_class: Type[Reducer],
+        hot_keys: Optional[Dict[Any, int]] = None
+    ) -> List[tuple]:
+        """
+        Combine the results of all workers into the final output.
+        
+        With a stable partitioner every key is owned by exactly one reducer,
+        so this is a plain concatenation (plus finalizing aggregate states).
+        Keys reported by several workers are still merged: aggregate states
+        exactly, and outputs of reducers that can combine by re-reducing.
+        This is the second merge step of hot keys spread over several
+        reducers.
+        
+        Args:
+            all_results: (key, value) results from all workers
+            reducer_class: The job's reducer class
+            hot_keys: Keys that were spread over several reducers on purpose
+            
+        Returns:
+            Final list of (key, value) results
+        """
+        reducer = reducer_class()
+        aggregate = isinstance(reducer, AggregateReducer)
+        
+        unique_keys = len({key for key, _ in all_results})
+        if unique_keys == len(all_results):
+            if aggregate:
+                return [reducer.finalize(key, state) for key, state in all_results]
+            return list(all_results)
+        
+        merged: Dict[Any, List[Any]] = {}
         for key, value in all_results:
             if key not in merged:
                 merged[key] = []
             merged[key].append(value)
         
-        # Merge duplicate keys intelligently:
-        # - For counts (large integers): SUM (e.g., trip counts in Task 3)
-        # - For percentages/averages (small floats): AVERAGE (e.g., tip%, $/mile in Task 1/2)
-        logger.info(f"Merging results: {len(all_results)} raw results from all workers")
+        hot_keys = hot_keys or {}
+        unexpected = sum(len(values) - 1 for key, values in merged.items() if key not in hot_keys)
+        if unexpected:
+            logger.warning(f"{unexpected} results share a key with another worker's output; merging")
+        split = sum(1 for key in hot_keys if len(merged.get(key, ())) > 1)
+        if split:
+            logger.info(f"Merging the partial results of {split} split hot keys")
         
-        final_results = []
-        for key, values in merged.items():
-            if len(values) == 1:
-                # No duplicates, use as-is
-                final_results.append((key, values[0]))
-            else:
-                # Multiple values from different workers - need to merge
-                if values and isinstance(values[0], (int, float)):
-                    # Heuristic: if values look like counts (integers > 100), sum them
-                    # Otherwise (percentages, averages), take average
-                    if all(isinstance(v, int) or (isinstance(v, float) and v > 100) for v in values):
-                        # Looks like counts - SUM (Task 3: hourly trip counts)
-                        merged_value = sum(values)
-                        final_results.append((key, int(merged_value)))
-                    else:
-                        # Looks like averages/percentages - AVERAGE (Task 1/2: tip%, $/mile)
-                        avg_value = sum(values) / len(values)
-                        final_results.append((key, round(avg_value, 2)))
-                else:
-                    # For non-numeric, take first (shouldn't happen)
-                    final_results.append((key, values[0]))
+        if aggregate:
+            return [
+                reducer.finalize(*reducer.merge_states(key, states))
+                for key, states in merged.items()
+            ]
         
-        logger.info(f"Final results: {len(final_results)} unique keys")
-        return final_results
+        if reducer.can_combine:
+            return [
+                pair
+                for key, values in merged.items()
+                for pair in (reducer.reduce(key, values) if len(values) > 1 else [(key, values[0])])
+            ]
+        
+        return list(all_results)
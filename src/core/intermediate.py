@@ -0,0 +1,640 @@
+"""
+Intermediate (shuffled) data held by a worker between map and reduce.
+
+Shuffle uploads from several mappers arrive concurrently. The store spreads
+keys over lock-striped shards so concurrent appends rarely wait on each
+other, and can keep data as NumPy columns per upload instead of a Python
+list per key.
+
+With a memory budget, data beyond the budget is spilled to local disk as
+runs sorted by key, and reading the store becomes a streaming k-way merge
+of those runs. Keys must then be mutually orderable (ints, strings,
+tuples of those).
+
+Data tagged with a map task attempt is held back until the coordinator
+commits that attempt, so the partial output of a failed attempt can be
+dropped when the task is re-executed. Held-back data counts toward the
+memory budget and is spilled to runs of its own attempt.
+
+For sort-based reduce, sorted_items() reads the store in key order and
+streams each key's values instead of handing out one list per key.
+"""
+
+import heapq
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from ..utils.columnar import group_keys
+
+
+# Value columns: one array, or one array per component of tuple values
+ValueColumns = Union[np.ndarray, Sequence[np.ndarray]]
+
+# Groups per pickled block in a spill run
+RUN_BLOCK_SIZE = 1024
+
+# Values converted to Python objects at a time when streaming a column
+VALUE_BLOCK_SIZE = 4096
+
+
+class _Stripe:
+    """One shard of the row store: a lock and the key -> values dict it guards."""
+    
+    __slots__ = ('lock', 'data')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: Dict[Any, List[Any]] = {}
+
+
+class IntermediateStore:
+    """
+    Thread-safe store of intermediate (key, value) pairs, grouped by key.
+    
+    Row mode keeps a list of values per key, spread over num_stripes
+    independently locked dicts. Columnar mode appends each upload as key and
+    value arrays and only groups them (with np.unique) when reduce asks for
+    the data, which takes far less memory than one Python list per key.
+    
+    When the estimated in-memory size exceeds memory_budget_bytes, the
+    held data is written to spill_dir as a run of (key, values) groups
+    sorted by key, and memory is freed.
+    """
+    
+    def __init__(
+        self,
+        num_stripes: int = 16,
+        columnar: bool = False,
+        memory_budget_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None
+    ):
+        """
+        Args:
+            num_stripes: Number of independently locked shards (row mode)
+            columnar: Keep uploads as NumPy columns instead of per-key lists
+            memory_budget_bytes: Spill to disk above this estimated size
+                (None = never spill)
+            spill_dir: Directory for spill runs (None = system temp dir)
+        """
+        self.num_stripes = num_stripes
+        self.columnar = columnar
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir
+        self._stripes = [_Stripe() for _ in range(num_stripes)]
+        self._batches: List[Tuple[np.ndarray, ValueColumns]] = []
+        self._batches_lock = threading.Lock()
+        
+        # Spill bookkeeping
+        self._memory_bytes = 0
+        self._memory_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._run_dir: Optional[str] = None
+        self._runs: List[str] = []
+        self._run_count = 0
+        self._spilled_pairs = 0
+        self.spilled_bytes = 0
+        
+        # Batches and spilled (path, pairs) runs of map task attempts that
+        # are not committed yet
+        self._pending: Dict[str, List[tuple]] = {}
+        self._pending_runs: Dict[str, List[Tuple[str, int]]] = {}
+        self._committed: set = set()
+        self._pending_lock = threading.Lock()
+    
+    def add_pairs(self, pairs: List[Tuple[Any, Any]], attempt: Optional[str] = None):
+        """
+        Append (key, value) pairs.
+        
+        Pairs are bucketed by stripe without holding any lock, then each
+        stripe is locked once for its whole bucket.
+        
+        Args:
+            pairs: Decoded shuffle pairs
+            attempt: Map task attempt that produced the pairs; they are held
+                back until commit() (None = add right away)
+        """
+        if attempt is not None and self._hold(attempt, (pairs,)):
+            if pairs and self.memory_budget_bytes is not None:
+                self._account(len(pairs) * _estimate_pair_size(pairs[0]))
+            return
+        
+        if self.columnar:
+            self.add_columns(*pairs_to_columns(pairs))
+            return
+        
+        buckets: List[List[Tuple[Any, Any]]] = [[] for _ in range(self.num_stripes)]
+        for pair in pairs:
+            buckets[hash(pair[0]) % self.num_stripes].append(pair)
+        
+        for stripe, bucket in zip(self._stripes, buckets):
+            if not bucket:
+                continue
+            with stripe.lock:
+                data = stripe.data
+                for key, value in bucket:
+                    if key not in data:
+                        data[key] = []
+                    data[key].append(value)
+        
+        if pairs and self.memory_budget_bytes is not None:
+            self._account(len(pairs) * _estimate_pair_size(pairs[0]))
+    
+    def add_columns(self, keys: np.ndarray, values: ValueColumns, attempt: Optional[str] = None):
+        """
+        Append a batch of pairs given as columns.
+        
+        Args:
+            keys: Key array, shape (n,) or (n, k) for composite keys
+            values: Value array of shape (n,), or a sequence of arrays with
+                one entry per pair for each component of tuple values
+            attempt: Map task attempt that produced the pairs (see add_pairs)
+        """
+        if attempt is not None and self._hold(attempt, (keys, values)):
+            if len(keys) and self.memory_budget_bytes is not None:
+                self._account(_columns_size(keys, values))
+            return
+        
+        if not self.columnar:
+            self.add_pairs(columns_to_pair_list(keys, values))
+            return
+        
+        if len(keys):
+            with self._batches_lock:
+                self._batches.append((keys, values))
+            
+            if self.memory_budget_bytes is not None:
+                self._account(_columns_size(keys, values))
+    
+    def items(self) -> Iterator[Tuple[Any, List[Any]]]:
+        """
+        Iterate over (key, values) groups.
+        
+        Not safe to call while pairs are still being added. After a spill,
+        groups come in key order from a k-way merge of the on-disk runs
+        and the data still in memory.
+        
+        Yields:
+            (key, list of values) with native Python keys and values
+        """
+        if not self._runs:
+            yield from self._memory_items()
+            return
+        
+        in_memory = sorted(self._memory_items(), key=itemgetter(0))
+        sources = [_read_run(path) for path in self._runs] + [iter(in_memory)]
+        yield from _merge_sorted_groups(sources)
+    
+    def sorted_items(self) -> Iterator[Tuple[Any, Iterator[Any]]]:
+        """
+        Iterate over (key, values) groups in key order, streaming the values.
+        
+        Columnar data is sorted with one argsort (lexsort for composite
+        keys) and each key's values are converted to Python objects a block
+        at a time, so a hot key never becomes one big list. Spill runs are
+        merged without joining the value lists of a key. Consume each key's
+        values before advancing to the next key. Keys must be mutually
+        orderable.
+        
+        Yields:
+            (key, iterator over the key's values)
+        """
+        if self._runs:
+            in_memory = sorted(self._memory_items(), key=itemgetter(0))
+            sources = [_read_run(path) for path in self._runs] + [iter(in_memory)]
+            for key, groups in groupby(heapq.merge(*sources, key=itemgetter(0)), key=itemgetter(0)):
+                yield key, (value for _, values in groups for value in values)
+            return
+        
+        if not self.columnar:
+            groups = [group for stripe in self._stripes for group in stripe.data.items()]
+            for key, values in sorted(groups, key=itemgetter(0)):
+                yield key, iter(values)
+            return
+        
+        if not self._batches:
+            return
+        keys, values = _concat_batches(self._batches)
+        order, starts = group_keys(keys)
+        values = values[order] if isinstance(values, np.ndarray) else [component[order] for component in values]
+        ends = np.append(starts[1:], len(keys)).tolist()
+        for key, start, end in zip(_to_native(keys[order[starts]]), starts.tolist(), ends):
+            yield key, _iter_values(values, start, end)
+    
+    def reduce_groups(
+        self,
+        kernel: Callable[[ValueColumns, np.ndarray], ValueColumns],
+        ordered: bool = False
+    ) -> Optional[List[Tuple[Any, Any]]]:
+        """
+        Reduce every group with one vectorized kernel call.
+        
+        The values are laid out as columns with each key's values adjacent,
+        and kernel(values, starts) returns one result per group (e.g.
+        Aggregate.merge_groups). Not safe to call while pairs are still
+        being added.
+        
+        Args:
+            kernel: Reduces value column(s) given the index where each group
+                starts; returns result column(s) with one entry per group
+            ordered: Return the groups in key order (columnar mode always
+                does)
+                
+        Returns:
+            (key, result) pairs with native Python keys and results, or None
+            if the data was spilled or its keys cannot be sorted; use
+            items() then
+        """
+        if self._runs:
+            return None
+        
+        if self.columnar:
+            if not self._batches:
+                return []
+            keys, values = _concat_batches(self._batches)
+            try:
+                order, starts = group_keys(keys)
+            except TypeError:
+                return None
+            values = values[order] if isinstance(values, np.ndarray) else [component[order] for component in values]
+            return list(zip(_to_native(keys[order[starts]]), _values_to_native(kernel(values, starts))))
+        
+        # Row mode already holds the values grouped by key
+        groups = [group for stripe in self._stripes for group in stripe.data.items()]
+        if ordered:
+            groups.sort(key=itemgetter(0))
+        group_keys_list = []
+        sizes = []
+        flat_values = []
+        for key, values in groups:
+            group_keys_list.append(key)
+            sizes.append(len(values))
+            flat_values.extend(values)
+        if not group_keys_list:
+            return []
+        
+        starts = np.cumsum([0] + sizes[:-1])
+        return list(zip(group_keys_list, _values_to_native(kernel(_values_to_columns(flat_values), starts))))
+    
+    def commit(self, attempts: Iterable[str]):
+        """
+        Add the held-back data of committed map task attempts to the store.
+        
+        Data of these attempts that arrives later is added right away.
+        Committing an attempt twice is harmless.
+        
+        Args:
+            attempts: Attempt ids accepted by the coordinator
+        """
+        batches, runs = [], []
+        with self._pending_lock:
+            for attempt in attempts:
+                self._committed.add(attempt)
+                batches.extend(self._pending.pop(attempt, []))
+                runs.extend(self._pending_runs.pop(attempt, []))
+        
+        if runs:
+            with self._spill_lock:
+                self._runs.extend(path for path, _ in runs)
+                self._spilled_pairs += sum(num_pairs for _, num_pairs in runs)
+        
+        # Re-added below, where they are counted again
+        self._release(batches)
+        for batch in batches:
+            if len(batch) == 1:
+                self.add_pairs(*batch)
+            else:
+                self.add_columns(*batch)
+    
+    def discard_pending(self) -> int:
+        """
+        Drop the data of all attempts that were not committed.
+        
+        Returns:
+            Number of pairs dropped
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            pending_runs, self._pending_runs = self._pending_runs, {}
+        
+        batches = [batch for attempt_batches in pending.values() for batch in attempt_batches]
+        self._release(batches)
+        dropped = sum(len(batch[0]) for batch in batches)
+        for runs in pending_runs.values():
+            for path, num_pairs in runs:
+                os.remove(path)
+                dropped += num_pairs
+        return dropped
+    
+    def num_pairs(self) -> int:
+        """Return the total number of stored pairs (in memory and spilled)."""
+        if self.columnar:
+            in_memory = sum(len(keys) for keys, _ in self._batches)
+        else:
+            in_memory = sum(len(values) for stripe in self._stripes for values in stripe.data.values())
+        return in_memory + self._spilled_pairs
+    
+    @property
+    def num_spills(self) -> int:
+        """Number of runs written to disk."""
+        return len(self._runs)
+    
+    def spill(self):
+        """
+        Write everything held in memory to disk as one sorted run.
+        
+        Held-back data of uncommitted attempts is written to a separate run
+        per attempt, which joins the others when the attempt is committed.
+        Adds from other threads carry on into the emptied memory store
+        while the runs are written.
+        """
+        with self._spill_lock:
+            # Take the data out of the store, holding every lock briefly
+            if self.columnar:
+                with self._batches_lock:
+                    batches, self._batches = self._batches, []
+                groups = list(_group_batches(batches))
+            else:
+                snapshot = {}
+                for stripe in self._stripes:
+                    with stripe.lock:
+                        snapshot.update(stripe.data)
+                        stripe.data = {}
+                groups = sorted(snapshot.items(), key=itemgetter(0))
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            with self._memory_lock:
+                self._memory_bytes = 0
+            
+            if groups:
+                self._runs.append(self._write_run(groups))
+                self._spilled_pairs += sum(len(values) for _, values in groups)
+            
+            for attempt, batches in pending.items():
+                pairs = [
+                    pair for batch in batches
+                    for pair in (batch[0] if len(batch) == 1 else columns_to_pair_list(*batch))
+                ]
+                grouped: Dict[Any, List[Any]] = {}
+                for key, value in pairs:
+                    if key not in grouped:
+                        grouped[key] = []
+                    grouped[key].append(value)
+                path = self._write_run(sorted(grouped.items(), key=itemgetter(0)))
+                
+                with self._pending_lock:
+                    committed = attempt in self._committed
+                    if not committed:
+                        self._pending_runs.setdefault(attempt, []).append((path, len(pairs)))
+                if committed:
+                    # Committed while the run was written
+                    self._runs.append(path)
+                    self._spilled_pairs += len(pairs)
+    
+    def clear(self):
+        """Drop all stored pairs and delete spill runs."""
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.data.clear()
+        with self._batches_lock:
+            self._batches.clear()
+        with self._spill_lock:
+            if self._run_dir is not None:
+                shutil.rmtree(self._run_dir, ignore_errors=True)
+            self._run_dir = None
+            self._runs = []
+            self._run_count = 0
+            self._spilled_pairs = 0
+            self.spilled_bytes = 0
+        with self._memory_lock:
+            self._memory_bytes = 0
+        with self._pending_lock:
+            self._pending = {}
+            self._pending_runs = {}
+            self._committed = set()
+    
+    def _hold(self, attempt: str, batch: tuple) -> bool:
+        """Hold back a batch of an uncommitted attempt; False if already committed."""
+        with self._pending_lock:
+            if attempt in self._committed:
+                return False
+            self._pending.setdefault(attempt, []).append(batch)
+            return True
+    
+    def _write_run(self, groups: List[Tuple[Any, List[Any]]]) -> str:
+        """Write key-sorted groups as a new run in the spill directory; return its path."""
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix='mapreduce-spill-', dir=self.spill_dir)
+        path = os.path.join(self._run_dir, f'run-{self._run_count:05d}.bin')
+        self._run_count += 1
+        self.spilled_bytes += _write_run(path, groups)
+        return path
+    
+    def _memory_items(self) -> Iterator[Tuple[Any, List[Any]]]:
+        """Iterate over the groups held in memory (in no particular order)."""
+        if not self.columnar:
+            for stripe in self._stripes:
+                yield from stripe.data.items()
+            return
+        
+        yield from _group_batches(self._batches)
+    
+    def _account(self, num_bytes: int):
+        """Add to the in-memory size estimate and spill if over budget."""
+        with self._memory_lock:
+            self._memory_bytes += num_bytes
+            over_budget = self._memory_bytes > self.memory_budget_bytes
+        
+        # Only one thread spills; the others keep adding meanwhile
+        if over_budget and not self._spill_lock.locked():
+            self.spill()
+    
+    def _release(self, batches: List[tuple]):
+        """Subtract held-back batches that left memory from the size estimate."""
+        if self.memory_budget_bytes is None or not batches:
+            return
+        num_bytes = sum(_batch_size(batch) for batch in batches)
+        with self._memory_lock:
+            # A spill in between may already have reset the estimate
+            self._memory_bytes = max(0, self._memory_bytes - num_bytes)
+
+
+def pairs_to_columns(pairs: List[Tuple[Any, Any]]) -> Tuple[np.ndarray, ValueColumns]:
+    """
+    Convert (key, value) pairs into key and value columns.
+    
+    Tuple keys become a 2-D array; tuple values become one array per
+    component so each keeps its own dtype (e.g. float sums, int counts).
+    
+    Args:
+        pairs: List of (key, value) tuples
+        
+    Returns:
+        (keys, values) as accepted by IntermediateStore.add_columns()
+    """
+    if not pairs:
+        return np.empty(0), np.empty(0)
+    
+    keys, values = zip(*pairs)
+    return np.array(keys), _values_to_columns(values)
+
+
+def columns_to_pair_list(keys: np.ndarray, values: ValueColumns) -> List[Tuple[Any, Any]]:
+    """Convert key and value columns back into native (key, value) pairs."""
+    key_list = _to_native(keys)
+    return list(zip(key_list, _values_to_native(values)))
+
+
+def _group_batches(batches: List[Tuple[np.ndarray, ValueColumns]]) -> Iterator[Tuple[Any, List[Any]]]:
+    """Group columnar batches by key with one sort over all of them."""
+    if not batches:
+        return
+    
+    keys, values = _concat_batches(batches)
+    try:
+        unique_keys, inverse = np.unique(keys, axis=0 if keys.ndim == 2 else None, return_inverse=True)
+    except TypeError:
+        # Unorderable object keys: fall back to grouping in a dict
+        grouped: Dict[Any, List[Any]] = {}
+        for key, value in columns_to_pair_list(keys, values):
+            if key not in grouped:
+                grouped[key] = []
+            grouped[key].append(value)
+        yield from grouped.items()
+        return
+    
+    inverse = inverse.reshape(-1)
+    order = np.argsort(inverse, kind='stable')
+    if isinstance(values, np.ndarray):
+        sorted_values = _values_to_native(values[order])
+    else:
+        sorted_values = _values_to_native([component[order] for component in values])
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(unique_keys))).tolist()
+    
+    start = 0
+    for key, end in zip(_to_native(unique_keys), bounds):
+        yield key, sorted_values[start:end]
+        start = end
+
+
+def _concat_batches(batches: List[Tuple[np.ndarray, ValueColumns]]) -> Tuple[np.ndarray, ValueColumns]:
+    """Concatenate columnar batches into one key column and value column(s)."""
+    keys = np.concatenate([batch_keys for batch_keys, _ in batches])
+    if isinstance(batches[0][1], np.ndarray):
+        return keys, np.concatenate([batch_values for _, batch_values in batches])
+    return keys, [
+        np.concatenate([batch_values[i] for _, batch_values in batches])
+        for i in range(len(batches[0][1]))
+    ]
+
+
+def _write_run(path: str, groups: Iterable[Tuple[Any, List[Any]]]) -> int:
+    """
+    Write sorted (key, values) groups as a run of pickled blocks.
+    
+    Returns:
+        Size of the run file in bytes
+    """
+    with open(path, 'wb') as f:
+        block = []
+        for group in groups:
+            block.append(group)
+            if len(block) >= RUN_BLOCK_SIZE:
+                pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return f.tell()
+
+
+def _read_run(path: str) -> Iterator[Tuple[Any, List[Any]]]:
+    """Stream the groups of a run written by _write_run(), one block at a time."""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+
+def _merge_sorted_groups(sources: List[Iterator[Tuple[Any, List[Any]]]]) -> Iterator[Tuple[Any, List[Any]]]:
+    """K-way merge of key-sorted group streams, joining the values of equal keys."""
+    current_key = None
+    current_values: Optional[List[Any]] = None
+    
+    for key, values in heapq.merge(*sources, key=itemgetter(0)):
+        if current_values is not None and key == current_key:
+            current_values.extend(values)
+            continue
+        if current_values is not None:
+            yield current_key, current_values
+        current_key, current_values = key, list(values)
+    
+    if current_values is not None:
+        yield current_key, current_values
+
+
+def _columns_size(keys: np.ndarray, values: ValueColumns) -> int:
+    """Size in bytes of a batch of key and value columns."""
+    value_bytes = values.nbytes if isinstance(values, np.ndarray) else sum(v.nbytes for v in values)
+    return keys.nbytes + value_bytes
+
+
+def _batch_size(batch: tuple) -> int:
+    """Estimated in-memory size of a held-back (pairs,) or (keys, values) batch."""
+    if len(batch) == 1:
+        pairs = batch[0]
+        return len(pairs) * _estimate_pair_size(pairs[0]) if pairs else 0
+    return _columns_size(*batch)
+
+
+def _estimate_pair_size(pair: Tuple[Any, Any]) -> int:
+    """Rough in-memory size of a stored pair: its key and value objects plus a list slot."""
+    key, value = pair
+    size = sys.getsizeof(value) + 8
+    if isinstance(value, tuple):
+        size += sum(sys.getsizeof(item) for item in value)
+    # Keys are shared by all values of a group; count them once per pair anyway
+    size += sys.getsizeof(key)
+    return size
+
+
+def _to_native(keys: np.ndarray) -> List[Any]:
+    """Convert a key column to Python scalars, or tuples for a 2-D column."""
+    key_list = keys.tolist()
+    if keys.ndim == 2:
+        key_list = list(map(tuple, key_list))
+    return key_list
+
+
+def _iter_values(values: ValueColumns, start: int, end: int) -> Iterator[Any]:
+    """Stream values[start:end] as Python objects, VALUE_BLOCK_SIZE at a time."""
+    for block_start in range(start, end, VALUE_BLOCK_SIZE):
+        block_end = min(block_start + VALUE_BLOCK_SIZE, end)
+        if isinstance(values, np.ndarray):
+            yield from values[block_start:block_end].tolist()
+        else:
+            yield from _values_to_native([component[block_start:block_end] for component in values])
+
+
+def _values_to_columns(values: Sequence[Any]) -> ValueColumns:
+    """Convert a non-empty sequence of values to a column, or one per tuple component."""
+    if isinstance(values[0], tuple):
+        return [np.array(component) for component in zip(*values)]
+    return np.array(values)
+
+
+def _values_to_native(values: ValueColumns) -> List[Any]:
+    """Convert a value column (or per-component columns) to Python values."""
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(zip(*(component.tolist() for component in values)))
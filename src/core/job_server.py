@@ -0,0 +1,246 @@
+"""
+Long-running coordinator that accepts jobs over HTTP.
+
+Running `main.py coordinator` pays for imports, loading and converting the
+dataset and checking every worker before any work is done. The job server
+does that once: it keeps a Coordinator (and with it the worker health
+checks and heartbeats) and every dataset it has loaded, and runs each
+submitted job on them, so a repeated analysis costs only its compute.
+
+Jobs run one at a time; concurrent submissions wait for the running job.
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from .base import HashPartitioner, Mapper, Partitioner, Reducer
+from .coordinator import Coordinator
+
+
+logger = logging.getLogger(__name__)
+
+
+# Loads a dataset config into (input_data, input_splits), one of them None
+DatasetLoader = Callable[[dict], Tuple[Optional[List[tuple]], Optional[List[dict]]]]
+
+
+class JobServer:
+    """
+    Runs map-reduce jobs submitted over HTTP on a warm coordinator.
+    
+    Endpoints:
+        GET  /health    - server status, workers and registered datasets
+        GET  /datasets  - registered datasets and their sizes
+        POST /datasets  - register (and load) a dataset:
+                          {'name', 'path', 'mode', 'max_records', ...}
+        POST /jobs      - run tasks over a dataset and return their results:
+                          {'tasks': [task ids], 'dataset': name,
+                           'split_size': records per map task}
+    """
+    
+    def __init__(
+        self,
+        coordinator: Coordinator,
+        tasks: Dict[Any, Tuple[Type[Mapper], Type[Reducer]]],
+        load_dataset: DatasetLoader,
+        datasets: Optional[Dict[str, dict]] = None,
+        default_split_size: Optional[int] = None,
+        partitioner_class: Type[Partitioner] = HashPartitioner,
+        host: str = '',
+        port: int = 0
+    ):
+        """
+        Args:
+            coordinator: Coordinator connected to the workers
+            tasks: (mapper_class, reducer_class) by task id
+            load_dataset: Turns a dataset config into job input
+            datasets: Dataset configs by name, loaded on first use
+            default_split_size: Records per map task when a job does not
+                say (None = one split per worker)
+            partitioner_class: Partitioner of every job
+            host: Interface to bind to ('' = all)
+            port: Port to listen on (0 = any free port)
+        """
+        self.coordinator = coordinator
+        self.tasks = {str(task_id): task for task_id, task in tasks.items()}
+        self.load_dataset = load_dataset
+        self.default_split_size = default_split_size
+        self.partitioner_class = partitioner_class
+        self._dataset_configs: Dict[str, dict] = dict(datasets or {})
+        self._datasets: Dict[str, Tuple[Optional[List[tuple]], Optional[List[dict]]]] = {}
+        self._datasets_lock = threading.Lock()
+        self._job_lock = threading.Lock()
+        self.jobs_run = 0
+        
+        self._server = ThreadingHTTPServer((host, port), _JobHandler)
+        self._server.job_server = self
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+    
+    def serve_forever(self):
+        """Handle requests until stop() is called (blocks)."""
+        logger.info(f"Job server accepting jobs on port {self.port}")
+        self._server.serve_forever(poll_interval=0.2)
+    
+    def start(self):
+        """Handle requests on a background thread."""
+        threading.Thread(target=self.serve_forever, name='job-server', daemon=True).start()
+    
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def register_dataset(self, name: str, config: dict) -> dict:
+        """
+        Register a dataset and load it right away.
+        
+        Registering a name again replaces the dataset.
+        
+        Returns:
+            Description of the loaded dataset, see describe_datasets()
+        """
+        with self._datasets_lock:
+            self._dataset_configs[name] = config
+            self._datasets.pop(name, None)
+        self.dataset(name)
+        return self.describe_datasets()[name]
+    
+    def dataset(self, name: str) -> Tuple[Optional[List[tuple]], Optional[List[dict]]]:
+        """
+        Return a dataset's (input_data, input_splits), loading it on first use.
+        
+        Raises:
+            KeyError: If no dataset of that name is registered
+        """
+        with self._datasets_lock:
+            if name not in self._datasets:
+                if name not in self._dataset_configs:
+                    raise KeyError(f"Unknown dataset: {name}")
+                load_start_time = time.time()
+                self._datasets[name] = self.load_dataset(self._dataset_configs[name])
+                logger.info(f"Dataset '{name}' loaded in {time.time() - load_start_time:.2f}s")
+            return self._datasets[name]
+    
+    def describe_datasets(self) -> Dict[str, dict]:
+        """Return {name: {'path', 'mode', 'loaded', 'records'}} for every dataset."""
+        with self._datasets_lock:
+            description = {}
+            for name, config in self._dataset_configs.items():
+                info = {'path': config.get('path'), 'mode': config.get('mode', 'ship'), 'loaded': name in self._datasets}
+                if name in self._datasets:
+                    input_data, input_splits = self._datasets[name]
+                    info['records'] = (
+                        sum(split['num_rows'] for split in input_splits)
+                        if input_splits is not None else len(input_data)
+                    )
+                description[name] = info
+            return description
+    
+    def run(self, task_ids: List[Any], dataset: str = 'default', split_size: Optional[int] = None) -> Dict[str, List[tuple]]:
+        """
+        Run tasks over one scan of a dataset.
+        
+        Args:
+            task_ids: Ids of the tasks to run
+            dataset: Name of a registered dataset
+            split_size: Records per map task for shipped records (None =
+                the server default); data-local datasets keep the splits
+                planned when they were loaded
+                
+        Returns:
+            Results by task id
+            
+        Raises:
+            KeyError: If a task or the dataset is unknown
+        """
+        task_ids = list(dict.fromkeys(str(task_id) for task_id in task_ids))
+        if not task_ids:
+            raise KeyError("No tasks given")
+        unknown = [task_id for task_id in task_ids if task_id not in self.tasks]
+        if unknown:
+            raise KeyError(f"Unknown tasks: {', '.join(unknown)}")
+        input_data, input_splits = self.dataset(dataset)
+        
+        with self._job_lock:
+            logger.info(f"Running tasks {', '.join(task_ids)} on dataset '{dataset}'")
+            results = self.coordinator.run_jobs(
+                input_data,
+                [self.tasks[task_id] for task_id in task_ids],
+                partitioner_class=self.partitioner_class,
+                input_splits=input_splits,
+                columns=self._dataset_configs[dataset].get('columns'),
+                split_size=split_size or self.default_split_size
+            )
+            self.jobs_run += 1
+        return dict(zip(task_ids, results))
+
+
+class _JobHandler(BaseHTTPRequestHandler):
+    """HTTP front end of a JobServer (self.server.job_server)."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        job_server = self.server.job_server
+        if self.path == '/health':
+            self._reply(200, {
+                'status': 'healthy',
+                'workers': job_server.coordinator.worker_addresses,
+                'tasks': sorted(job_server.tasks),
+                'datasets': sorted(job_server.describe_datasets()),
+                'jobs_run': job_server.jobs_run
+            })
+        elif self.path == '/datasets':
+            self._reply(200, job_server.describe_datasets())
+        else:
+            self._reply(404, {'status': 'error', 'message': f"No such endpoint: {self.path}"})
+    
+    def do_POST(self):
+        job_server = self.server.job_server
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError as e:
+            self._reply(400, {'status': 'error', 'message': f"Invalid JSON: {e}"})
+            return
+        
+        try:
+            if self.path == '/datasets':
+                config = {key: value for key, value in request.items() if key != 'name'}
+                self._reply(200, {'status': 'success', 'dataset': job_server.register_dataset(request['name'], config)})
+            elif self.path == '/jobs':
+                job_start_time = time.time()
+                results = job_server.run(
+                    request['tasks'],
+                    dataset=request.get('dataset', 'default'),
+                    split_size=request.get('split_size')
+                )
+                self._reply(200, {
+                    'status': 'success',
+                    'seconds': time.time() - job_start_time,
+                    'results': results
+                })
+            else:
+                self._reply(404, {'status': 'error', 'message': f"No such endpoint: {self.path}"})
+        except KeyError as e:
+            # Unknown task or dataset, or a missing request field
+            self._reply(400, {'status': 'error', 'message': str(e.args[0])})
+        except Exception as e:
+            logger.error(f"Job failed: {e}")
+            self._reply(500, {'status': 'error', 'message': str(e)})
+    
+    def _reply(self, status: int, payload: dict):
+        """Send a JSON response."""
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
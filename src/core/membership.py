@@ -0,0 +1,166 @@
+"""
+Cluster membership from worker heartbeats.
+
+Workers post a heartbeat to the coordinator every few seconds with their
+load, memory use, queue depth and the map attempts they are running. The
+coordinator keeps the latest report per worker in a membership table and
+treats a worker whose heartbeats stop as dead, long before a request to
+it would time out.
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds between heartbeats, and without one before a worker counts as dead
+DEFAULT_HEARTBEAT_INTERVAL = 2.0
+DEFAULT_HEARTBEAT_TIMEOUT = 10.0
+
+
+class ClusterMembership:
+    """
+    Live membership table: the last heartbeat of every worker.
+    
+    Thread-safe; heartbeats are recorded from the server's request threads
+    while the scheduler reads the table.
+    """
+    
+    def __init__(self, timeout: float = DEFAULT_HEARTBEAT_TIMEOUT):
+        """
+        Args:
+            timeout: Seconds without a heartbeat after which a worker is dead
+        """
+        self.timeout = timeout
+        self._members: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def expect(self, address: str):
+        """
+        Start the heartbeat clock for a worker that was just (re)configured.
+        
+        A worker that never sends a heartbeat is declared dead one timeout
+        after this call.
+        """
+        with self._lock:
+            member = self._members.setdefault(address, {'report': {}})
+            member['last_seen'] = time.time()
+    
+    def record(self, address: str, report: Dict[str, Any]):
+        """Store a heartbeat report of a worker."""
+        with self._lock:
+            self._members[address] = {'last_seen': time.time(), 'report': report}
+    
+    def forget(self, address: str):
+        """Stop tracking a worker (e.g. one that was removed from the job)."""
+        with self._lock:
+            self._members.pop(address, None)
+    
+    def is_alive(self, address: str) -> bool:
+        """
+        Return whether a worker's heartbeats are current.
+        
+        Workers that are not tracked count as alive, so the table only
+        ever speeds up failure detection.
+        """
+        with self._lock:
+            member = self._members.get(address)
+        return member is None or time.time() - member['last_seen'] <= self.timeout
+    
+    def age(self, address: str) -> Optional[float]:
+        """Return seconds since a worker's last heartbeat (None if untracked)."""
+        with self._lock:
+            member = self._members.get(address)
+        return None if member is None else time.time() - member['last_seen']
+    
+    def expired(self) -> List[str]:
+        """Return the tracked workers whose heartbeats have stopped."""
+        now = time.time()
+        with self._lock:
+            return [
+                address for address, member in self._members.items()
+                if now - member['last_seen'] > self.timeout
+            ]
+    
+    def report(self, address: str) -> Dict[str, Any]:
+        """Return the latest heartbeat report of a worker (empty if none)."""
+        with self._lock:
+            member = self._members.get(address)
+            return dict(member['report']) if member else {}
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return {address: {'age', **report}} for every tracked worker."""
+        now = time.time()
+        with self._lock:
+            return {
+                address: {'age': now - member['last_seen'], **member['report']}
+                for address, member in self._members.items()
+            }
+
+
+class _HeartbeatHandler(BaseHTTPRequestHandler):
+    """Records POST /heartbeat reports in the server's membership table."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status = 404
+        if self.path == '/heartbeat':
+            try:
+                report = json.loads(body)
+                self.server.membership.record(report['address'], report)
+                status = 200
+            except (ValueError, KeyError):
+                status = 400
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+
+class HeartbeatServer:
+    """
+    Small HTTP server in the coordinator process that receives heartbeats.
+    
+    Workers post JSON reports to /heartbeat; each report names the address
+    the coordinator knows the worker by.
+    """
+    
+    def __init__(self, membership: ClusterMembership, host: str = '', port: int = 0):
+        """
+        Args:
+            membership: Table to record heartbeats in
+            host: Interface to bind to ('' = all)
+            port: Port to listen on (0 = any free port)
+        """
+        self.membership = membership
+        self._server = ThreadingHTTPServer((host, port), _HeartbeatHandler)
+        self._server.membership = membership
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Serve heartbeats on a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={'poll_interval': 0.2},
+            name='heartbeat-server',
+            daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Receiving worker heartbeats on port {self.port}")
+    
+    def stop(self):
+        """Stop serving and close the socket."""
+        self._server.shutdown()
+        self._server.server_close()
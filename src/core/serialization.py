@@ -0,0 +1,227 @@
+"""
+Wire formats (codecs) for shuffling intermediate key-value pairs.
+
+Each codec turns a list of (key, value) pairs into bytes and back. Tuple
+keys and values survive a round trip as tuples, so tasks can use native
+composite keys such as (pickup_zone, dropoff_zone).
+"""
+
+import json
+import pickle
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from .intermediate import ValueColumns, pairs_to_columns
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; workers without it don't advertise it
+    msgpack = None
+
+
+# Codec preference used when the config does not specify one
+DEFAULT_CODEC_PREFERENCE = ['msgpack', 'pickle', 'arrow', 'json']
+
+
+class ShuffleCodec(ABC):
+    """
+    Abstract base class for shuffle wire formats.
+    """
+    
+    # Short name used in negotiation and in the X-Shuffle-Codec header
+    name: str = ''
+    
+    @abstractmethod
+    def encode(self, pairs: List[Tuple[Any, Any]]) -> bytes:
+        """
+        Serialize key-value pairs.
+        
+        Args:
+            pairs: List of (key, value) tuples
+            
+        Returns:
+            Encoded payload
+        """
+        pass
+    
+    @abstractmethod
+    def decode(self, payload: bytes) -> List[Tuple[Any, Any]]:
+        """
+        Deserialize key-value pairs produced by encode().
+        
+        Args:
+            payload: Encoded payload
+            
+        Returns:
+            List of (key, value) tuples
+        """
+        pass
+    
+    def decode_columns(self, payload: bytes) -> Tuple[np.ndarray, ValueColumns]:
+        """
+        Deserialize straight into key and value columns.
+        
+        Args:
+            payload: Encoded payload
+            
+        Returns:
+            (keys, values) as accepted by IntermediateStore.add_columns()
+        """
+        return pairs_to_columns(self.decode(payload))
+
+
+class JsonCodec(ShuffleCodec):
+    """Original JSON format: {"data": [[key, value], ...]}."""
+    
+    name = 'json'
+    
+    def encode(self, pairs: List[Tuple[Any, Any]]) -> bytes:
+        return json.dumps({'data': pairs}).encode('utf-8')
+    
+    def decode(self, payload: bytes) -> List[Tuple[Any, Any]]:
+        data = json.loads(payload)['data']
+        # JSON has no tuples: turn list keys/values back into tuples
+        return [(_to_tuple(key), _to_tuple(value)) for key, value in data]
+
+
+class PickleCodec(ShuffleCodec):
+    """Python pickle (highest protocol). Fast for lists of small tuples."""
+    
+    name = 'pickle'
+    
+    def encode(self, pairs: List[Tuple[Any, Any]]) -> bytes:
+        return pickle.dumps(pairs, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def decode(self, payload: bytes) -> List[Tuple[Any, Any]]:
+        return pickle.loads(payload)
+
+
+class MsgpackCodec(ShuffleCodec):
+    """MessagePack. Compact and language-neutral; requires the msgpack package."""
+    
+    name = 'msgpack'
+    
+    def encode(self, pairs: List[Tuple[Any, Any]]) -> bytes:
+        return msgpack.packb(pairs, use_bin_type=True)
+    
+    def decode(self, payload: bytes) -> List[Tuple[Any, Any]]:
+        # use_list=False decodes every array as a tuple, restoring tuple keys
+        return list(msgpack.unpackb(payload, use_list=False, strict_map_key=False))
+
+
+class ArrowCodec(ShuffleCodec):
+    """
+    Arrow IPC stream with one column per key component and a value column.
+    
+    Keys must be scalars of one type, or tuples of scalars of equal length.
+    """
+    
+    name = 'arrow'
+    
+    def encode(self, pairs: List[Tuple[Any, Any]]) -> bytes:
+        keys = [key for key, _ in pairs]
+        values = [value for _, value in pairs]
+        
+        if keys and isinstance(keys[0], tuple):
+            columns = {f'key_{i}': pa.array(part) for i, part in enumerate(zip(*keys))}
+        else:
+            columns = {'key': pa.array(keys)}
+        columns['value'] = pa.array(values)
+        table = pa.table(columns)
+        
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    
+    def decode(self, payload: bytes) -> List[Tuple[Any, Any]]:
+        table = pa.ipc.open_stream(payload).read_all()
+        
+        if 'key' in table.column_names:
+            keys = table.column('key').to_pylist()
+        else:
+            key_columns = [name for name in table.column_names if name.startswith('key_')]
+            keys = list(zip(*(table.column(name).to_pylist() for name in key_columns)))
+        
+        value_column = table.column('value')
+        values = value_column.to_pylist()
+        if pa.types.is_list(value_column.type):
+            values = [_to_tuple(value) for value in values]
+        
+        return list(zip(keys, values))
+    
+    def decode_columns(self, payload: bytes) -> Tuple[np.ndarray, ValueColumns]:
+        table = pa.ipc.open_stream(payload).read_all()
+        
+        if 'key' in table.column_names:
+            keys = table.column('key').to_numpy()
+        else:
+            key_columns = [name for name in table.column_names if name.startswith('key_')]
+            keys = np.column_stack([table.column(name).to_numpy() for name in key_columns])
+        
+        value_column = table.column('value')
+        if pa.types.is_list(value_column.type):
+            return keys, [np.array(component) for component in zip(*value_column.to_pylist())]
+        return keys, value_column.to_numpy()
+
+
+_CODECS: Dict[str, ShuffleCodec] = {
+    codec.name: codec
+    for codec in (JsonCodec(), PickleCodec(), ArrowCodec())
+}
+if msgpack is not None:
+    _CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+
+def available_codecs() -> List[str]:
+    """Return the names of codecs usable in this process."""
+    return sorted(_CODECS)
+
+
+def get_codec(name: str) -> ShuffleCodec:
+    """
+    Look up a codec by name.
+    
+    Args:
+        name: Codec name (e.g. 'pickle', 'arrow')
+        
+    Returns:
+        The codec instance
+        
+    Raises:
+        ValueError: If the codec is unknown or not installed
+    """
+    if name not in _CODECS:
+        raise ValueError(f"Unknown or unavailable shuffle codec: {name}")
+    return _CODECS[name]
+
+
+def negotiate_codec(preferred: Iterable[str], supported: Iterable[Iterable[str]]) -> str:
+    """
+    Pick the first preferred codec that every participant supports.
+    
+    Args:
+        preferred: Codec names in order of preference
+        supported: For each participant, the codec names it supports
+        
+    Returns:
+        Name of the chosen codec ('json' if nothing else is common)
+    """
+    common = set(available_codecs())
+    for names in supported:
+        common &= set(names)
+    
+    for name in preferred:
+        if name in common:
+            return name
+    return JsonCodec.name
+
+
+def _to_tuple(value: Any) -> Any:
+    """Recursively convert lists to tuples so they can be used as dict keys."""
+    if isinstance(value, list):
+        return tuple(_to_tuple(item) for item in value)
+    return value
@@ -0,0 +1,442 @@
+"""
+Sending map output to the workers that own each partition.
+
+Partitions owned by the sending worker never leave the process, and
+peers on the same host receive chunks through shared memory; only
+chunks for other hosts travel over HTTP.
+"""
+
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from multiprocessing import shared_memory
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .compression import COMPRESSION_HEADER, DEFAULT_COMPRESSION_THRESHOLD, compress_payload
+from .serialization import ShuffleCodec
+
+
+logger = logging.getLogger(__name__)
+
+
+# Header naming the shared memory segment ("name:size") holding a chunk
+SHARED_MEMORY_HEADER = 'X-Shuffle-Shm'
+
+# Header naming the map task attempt that produced a chunk
+ATTEMPT_HEADER = 'X-Shuffle-Attempt'
+
+# Header naming the task of a multi-task job a chunk belongs to (absent = 0)
+TASK_HEADER = 'X-Shuffle-Task'
+
+
+class ShuffleSender:
+    """
+    Streams partitions to their target workers in fixed-size chunks.
+
+    Each peer gets a persistent requests.Session, so connections are reused
+    across chunks and map tasks. A map task opens a ShuffleStream and adds
+    pairs while it is still mapping; full chunks are queued per peer and
+    uploaded by one thread per peer. Queues are bounded, so a slow receiver
+    blocks the mapper (backpressure) instead of letting buffers grow, and
+    mapper memory is bounded by the chunk size rather than the input size.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        max_parallel: int = 4,
+        timeout: int = 30,
+        chunk_pairs: int = 50000,
+        max_in_flight: int = 2
+    ):
+        """
+        Args:
+            worker_id: Id of the sending worker (for logging)
+            max_parallel: Maximum number of uploads in flight (fan-out)
+            timeout: Timeout for a single chunk upload in seconds
+            chunk_pairs: Pairs per chunk
+            max_in_flight: Chunks queued per peer before the mapper blocks
+        """
+        self.worker_id = worker_id
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self.chunk_pairs = chunk_pairs
+        self.max_in_flight = max_in_flight
+        self._upload_slots = threading.BoundedSemaphore(max_parallel)
+        self._sessions: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
+
+    def open_stream(
+        self,
+        worker_addresses: List[str],
+        codec: ShuffleCodec,
+        compression: Optional[str] = None,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        local_partitions: Collection[int] = (),
+        local_sink: Optional[Callable[[List[Tuple[Any, Any]], int], None]] = None,
+        shared_memory_partitions: Collection[int] = (),
+        attempt: Optional[str] = None
+    ) -> 'ShuffleStream':
+        """
+        Start streaming one map task's output.
+
+        Args:
+            worker_addresses: Worker URLs, indexed by partition id
+            codec: Wire format for the uploads
+            compression: Negotiated chunk compression (None = off)
+            compression_threshold: Chunks smaller than this many encoded
+                bytes are sent uncompressed
+            local_partitions: Partitions owned by the sending worker itself
+            local_sink: Called with those partitions' pairs and their task
+                instead of uploading them
+            shared_memory_partitions: Partitions whose workers run on this
+                host; their chunks are passed through shared memory
+            attempt: Map task attempt id sent with every chunk, so receivers
+                can drop the output of attempts that did not commit
+
+        Returns:
+            A ShuffleStream; call close() when the map task is done
+        """
+        return ShuffleStream(
+            self,
+            worker_addresses,
+            codec,
+            compression=compression,
+            compression_threshold=compression_threshold,
+            local_partitions=local_partitions,
+            local_sink=local_sink,
+            shared_memory_partitions=shared_memory_partitions,
+            attempt=attempt
+        )
+
+    def close(self):
+        """Close all peer sessions."""
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _send_chunk(
+        self,
+        target_worker: str,
+        pairs: List[Tuple[Any, Any]],
+        codec: ShuffleCodec,
+        compression: Optional[str],
+        compression_threshold: int,
+        shared_memory: bool = False,
+        attempt: Optional[str] = None,
+        task: int = 0
+    ) -> Tuple[int, int, float]:
+        """
+        Encode and compress one chunk and post it to its worker.
+
+        With shared_memory the chunk is written to a shared memory segment
+        (uncompressed) and only the segment name is posted.
+
+        Returns:
+            (encoded bytes, bytes sent over HTTP, CPU seconds spent compressing)
+        """
+        payload = codec.encode(pairs)
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'X-Shuffle-Codec': codec.name
+        }
+        if attempt is not None:
+            headers[ATTEMPT_HEADER] = attempt
+        if task:
+            headers[TASK_HEADER] = str(task)
+
+        segment = None
+        if shared_memory:
+            segment = write_shared_payload(payload)
+            headers[SHARED_MEMORY_HEADER] = f'{segment.name}:{len(payload)}'
+            body, compress_time = b'', 0.0
+        else:
+            body, applied, compress_time = compress_payload(payload, compression, compression_threshold)
+            if applied:
+                headers[COMPRESSION_HEADER] = applied
+
+        try:
+            with self._upload_slots:
+                response = self._session(target_worker).post(
+                    f"{target_worker}/shuffle",
+                    data=body,
+                    headers=headers,
+                    timeout=self.timeout
+                )
+            response.raise_for_status()
+        finally:
+            # The receiver has copied the chunk once it has responded
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+
+        return len(payload), len(body), compress_time
+
+    def _session(self, target_worker: str) -> requests.Session:
+        """Return the persistent session for a peer, creating it on first use."""
+        with self._sessions_lock:
+            session = self._sessions.get(target_worker)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_parallel)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[target_worker] = session
+            return session
+
+
+class ShuffleStream:
+    """
+    One map task's shuffle output in flight.
+
+    A map task of a multi-task job adds the output of all its tasks to one
+    stream; chunks never mix tasks, and each carries its task number.
+
+    Not thread-safe: a single map task adds pairs from one thread.
+    """
+
+    # Queue item that tells a peer's upload thread to stop
+    _DONE = None
+
+    def __init__(
+        self,
+        sender: ShuffleSender,
+        worker_addresses: List[str],
+        codec: ShuffleCodec,
+        compression: Optional[str] = None,
+        compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        local_partitions: Collection[int] = (),
+        local_sink: Optional[Callable[[List[Tuple[Any, Any]], int], None]] = None,
+        shared_memory_partitions: Collection[int] = (),
+        attempt: Optional[str] = None
+    ):
+        self.sender = sender
+        self.worker_addresses = worker_addresses
+        self.codec = codec
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.local_partitions = set(local_partitions) if local_sink is not None else set()
+        self.local_sink = local_sink
+        self.shared_memory_partitions = set(shared_memory_partitions)
+        self.attempt = attempt
+
+        self.blocked_time = 0.0  # seconds the mapper waited on full queues
+        self._buffers: Dict[Tuple[int, int], List[Tuple[Any, Any]]] = {}
+        self._queues: Dict[int, queue.Queue] = {}
+        self._threads: Dict[int, threading.Thread] = {}
+        self._stats: Dict[int, Dict[str, float]] = {}
+        self._errors: List[Exception] = []
+
+    def add(self, partition_id: int, pairs: List[Tuple[Any, Any]], task: int = 0):
+        """
+        Add pairs for a partition, uploading every full chunk.
+
+        Blocks while the partition's peer has max_in_flight chunks queued.
+
+        Args:
+            partition_id: Target partition
+            pairs: (key, value) pairs for that partition
+            task: Task of a multi-task job the pairs belong to
+
+        Raises:
+            Exception: The first upload error, if any upload failed
+        """
+        if self._errors:
+            raise self._errors[0]
+        if not pairs:
+            return
+
+        if partition_id in self.local_partitions:
+            # Our own partition: straight into the local store, no encoding
+            start_time = time.time()
+            self.local_sink(pairs, task)
+            stats = self._peer_stats(partition_id)
+            stats['pairs'] += len(pairs)
+            stats['chunks'] += 1
+            stats['seconds'] += time.time() - start_time
+            return
+
+        chunk_pairs = self.sender.chunk_pairs
+        buffer = self._buffers.setdefault((task, partition_id), [])
+        buffer.extend(pairs)
+        while len(buffer) >= chunk_pairs:
+            self._enqueue(partition_id, buffer[:chunk_pairs], task)
+            del buffer[:chunk_pairs]
+
+    def close(self) -> Dict[str, Dict[str, float]]:
+        """
+        Flush partly filled chunks and wait for all uploads.
+
+        Returns:
+            Per-peer stats: {worker_addr: {'transport', 'pairs', 'bytes',
+            'raw_bytes', 'compress_time', 'chunks', 'seconds'}}, where
+            'transport' is 'local', 'shm' or 'http', 'bytes' counts bytes
+            sent over HTTP and 'raw_bytes' the encoded size; a worker that
+            owns several partitions gets their sums
+
+        Raises:
+            Exception: The first upload error, if any upload failed
+        """
+        for (task, partition_id), buffer in self._buffers.items():
+            if buffer:
+                self._enqueue(partition_id, buffer, task)
+        self._buffers.clear()
+
+        self._finish()
+        if self._errors:
+            raise self._errors[0]
+
+        peer_stats: Dict[str, Dict[str, Any]] = {}
+        for partition_id, stats in self._stats.items():
+            target_worker = self.worker_addresses[partition_id]
+            if target_worker not in peer_stats:
+                peer_stats[target_worker] = dict(stats)
+                continue
+            for name, value in stats.items():
+                if name != 'transport':
+                    peer_stats[target_worker][name] += value
+        return peer_stats
+
+    def abort(self):
+        """Stop all upload threads without flushing buffered pairs."""
+        self._buffers.clear()
+        self._finish()
+
+    def _enqueue(self, partition_id: int, chunk: List[Tuple[Any, Any]], task: int = 0):
+        """Queue a chunk for its peer, starting the peer's upload thread on first use."""
+        if partition_id not in self._queues:
+            self._queues[partition_id] = queue.Queue(maxsize=self.sender.max_in_flight)
+            self._peer_stats(partition_id)
+            thread = threading.Thread(
+                target=self._upload_loop,
+                args=(partition_id,),
+                name=f'{self.sender.worker_id}-shuffle-{partition_id}',
+                daemon=True
+            )
+            self._threads[partition_id] = thread
+            thread.start()
+
+        wait_start = time.time()
+        self._queues[partition_id].put((task, chunk))
+        self.blocked_time += time.time() - wait_start
+
+    def _peer_stats(self, partition_id: int) -> Dict[str, Any]:
+        """Return the stats of a partition's peer, creating them on first use."""
+        if partition_id not in self._stats:
+            if partition_id in self.local_partitions:
+                transport = 'local'
+            elif partition_id in self.shared_memory_partitions:
+                transport = 'shm'
+            else:
+                transport = 'http'
+            self._stats[partition_id] = {
+                'transport': transport,
+                'pairs': 0,
+                'bytes': 0,
+                'raw_bytes': 0,
+                'compress_time': 0.0,
+                'chunks': 0,
+                'seconds': 0.0
+            }
+        return self._stats[partition_id]
+
+    def _finish(self):
+        """Signal every upload thread to stop and wait for them."""
+        for partition_id, chunk_queue in self._queues.items():
+            chunk_queue.put(self._DONE)
+        for thread in self._threads.values():
+            thread.join()
+
+    def _upload_loop(self, partition_id: int):
+        """Upload a peer's chunks in order until told to stop."""
+        target_worker = self.worker_addresses[partition_id]
+        chunk_queue = self._queues[partition_id]
+        stats = self._stats[partition_id]
+
+        while True:
+            item = chunk_queue.get()
+            if item is self._DONE:
+                return
+            if self._errors:
+                continue  # keep draining so the mapper never blocks forever
+            task, chunk = item
+
+            start_time = time.time()
+            try:
+                raw_bytes, wire_bytes, compress_time = self.sender._send_chunk(
+                    target_worker,
+                    chunk,
+                    self.codec,
+                    self.compression,
+                    self.compression_threshold,
+                    shared_memory=partition_id in self.shared_memory_partitions,
+                    attempt=self.attempt,
+                    task=task
+                )
+            except Exception as e:
+                logger.error(f"Failed to send data to {target_worker}: {e}")
+                self._errors.append(e)
+                continue
+            stats['seconds'] += time.time() - start_time
+            stats['bytes'] += wire_bytes
+            stats['raw_bytes'] += raw_bytes
+            stats['compress_time'] += compress_time
+            stats['pairs'] += len(chunk)
+            stats['chunks'] += 1
+
+
+def host_id() -> str:
+    """Identify this machine, so workers can tell which peers share it."""
+    return f"{socket.gethostname()}-{uuid.getnode():012x}"
+
+
+def write_shared_payload(payload: bytes) -> shared_memory.SharedMemory:
+    """
+    Copy a payload into a new shared memory segment.
+
+    The caller owns the segment and must close() and unlink() it.
+
+    Args:
+        payload: Encoded chunk
+
+    Returns:
+        The segment holding the payload
+    """
+    segment = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+    segment.buf[:len(payload)] = payload
+    return segment
+
+
+def read_shared_payload(header: str) -> bytes:
+    """
+    Copy a payload out of a shared memory segment written by a peer.
+
+    Args:
+        header: Value of the X-Shuffle-Shm header ("name:size")
+
+    Returns:
+        The encoded chunk
+    """
+    name, _, size = header.rpartition(':')
+    try:
+        segment = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached segments with the resource
+        # tracker, which would unlink the sender's segment at our exit
+        segment = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, 'shared_memory')
+
+    try:
+        return bytes(segment.buf[:int(size)])
+    finally:
+        segment.close()
@@ -1,16 +1,45 @@
 """
 Worker node implementation for distributed map-reduce.
+
+The HTTP side runs on aiohttp: connections and request bodies are handled
+by the event loop, and CPU-bound work (map tasks, decoding shuffles,
+reduce) runs on small, bounded thread pools. Many peers can upload
+shuffle data at once without a thread per request.
 """
 
+import asyncio
+import json
 import os
 import pickle
 import logging
 import time
-from flask import Flask, request, jsonify
-from typing import Any, Dict, List
-import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+import aiohttp
+import numpy as np
+import pyarrow as pa
+from aiohttp import web
+
+try:
+    import psutil
+except ImportError:  # optional; heartbeats then read memory from /proc where possible
+    psutil = None
 
-from .base import Mapper, Reducer, Partitioner, HashPartitioner
+from .base import Mapper, BatchMapper, Reducer, Combiner, Partitioner, HashPartitioner, HotKeyPartitioner
+from .aggregates import AggregateReducer, DenseAccumulator
+from .compression import (
+    COMPRESSION_HEADER,
+    DEFAULT_COMPRESSION_THRESHOLD,
+    available_compressions,
+    compress_payload,
+    decompress_payload
+)
+from .intermediate import IntermediateStore, columns_to_pair_list
+from .serialization import JsonCodec, available_codecs, get_codec
+from .shuffle import ATTEMPT_HEADER, SHARED_MEMORY_HEADER, TASK_HEADER, ShuffleSender, host_id, read_shared_payload
+from ..utils.columnar import records_to_columns, arrow_to_columns, columns_to_pairs, group_keys
+from ..utils.parquet_loader import read_parquet_split, table_to_records
 
 
 logger = logging.getLogger(__name__)
@@ -20,11 +49,28 @@ class Worker:
     """
     Worker node that executes map and reduce tasks.
     
-    Each worker runs a Flask server to receive tasks from the coordinator
+    Each worker runs an aiohttp server to receive tasks from the coordinator
     and communicate with other workers during the shuffle phase.
     """
     
-    def __init__(self, worker_id: str, host: str, port: int):
+    def __init__(
+        self,
+        worker_id: str,
+        host: str,
+        port: int,
+        data_dir: Optional[str] = None,
+        task_threads: int = 2,
+        shuffle_threads: int = 4,
+        max_concurrent_shuffles: int = 16,
+        max_body_mb: int = 1024,
+        store_stripes: int = 16,
+        columnar_store: bool = False,
+        shuffle_fanout: int = 4,
+        shuffle_chunk_pairs: int = 50000,
+        shuffle_max_in_flight: int = 2,
+        memory_budget_mb: Optional[float] = None,
+        spill_dir: Optional[str] = None
+    ):
         """
         Initialize a worker node.
         
@@ -32,184 +78,857 @@ class Worker:
             worker_id: Unique identifier for this worker
             host: Host address to bind to
             port: Port number to listen on
+            data_dir: Directory with local copies of dataset files, used for
+                input split descriptors whose path does not exist here
+            task_threads: Threads running map and reduce tasks
+            shuffle_threads: Threads decoding and grouping shuffle uploads
+            max_concurrent_shuffles: Shuffle uploads read at the same time;
+                further uploads wait on the event loop
+            max_body_mb: Largest accepted request body in MB
+            store_stripes: Lock stripes of the intermediate store
+            columnar_store: Keep shuffled data as NumPy columns (less memory)
+            shuffle_fanout: Shuffle uploads a map task sends in parallel
+            shuffle_chunk_pairs: Pairs per streamed shuffle chunk
+            shuffle_max_in_flight: Chunks queued per peer before mapping
+                pauses (backpressure)
+            memory_budget_mb: Intermediate data kept in memory before it is
+                spilled to disk (None = never spill); the coordinator can
+                override it per job on /reset
+            spill_dir: Directory for spill runs (None = system temp dir)
         """
         self.worker_id = worker_id
         self.host = host
         self.port = port
+        self.data_dir = data_dir
+        self.host_id = host_id()
+        self.max_body_bytes = max_body_mb * 1024 * 1024
+        
+        # Separate pools so a map task that shuffles to this same worker
+        # can never starve the handler that receives the data
+        self._task_executor = ThreadPoolExecutor(task_threads, thread_name_prefix=f'{worker_id}-task')
+        self._shuffle_executor = ThreadPoolExecutor(shuffle_threads, thread_name_prefix=f'{worker_id}-shuffle')
+        self._shuffle_slots = asyncio.Semaphore(max_concurrent_shuffles)
+        self.shuffle_sender = ShuffleSender(
+            worker_id,
+            max_parallel=shuffle_fanout,
+            chunk_pairs=shuffle_chunk_pairs,
+            max_in_flight=shuffle_max_in_flight
+        )
         
-        # Flask app for HTTP endpoints
-        self.app = Flask(__name__)
+        # aiohttp app for HTTP endpoints
+        self.app = web.Application(client_max_size=self.max_body_bytes)
         self._register_routes()
+        self.app.on_cleanup.append(self._stop_heartbeats)
         
-        # Storage for intermediate and final results
-        self.intermediate_data: Dict[Any, List[Any]] = {}
-        self.final_results: List[tuple] = []
+        # What heartbeats report: requests being worked on and running attempts
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._tasks_in_flight = 0
+        self._shuffles_in_flight = 0
+        self._running_attempts: Dict[str, float] = {}
+        
+        # Storage for intermediate and final results, one per task of the
+        # current job (a job of several tasks shares one scan of the input)
+        self.memory_budget_mb = memory_budget_mb
+        self.store_stripes = store_stripes
+        self.columnar_store = columnar_store
+        self.spill_dir = spill_dir
+        self.stores: List[IntermediateStore] = [self._new_store(memory_budget_mb)]
+        self.final_results: List[List[tuple]] = [[]]
         
         logger.info(f"Worker {worker_id} initialized at {host}:{port}")
     
     def _register_routes(self):
-        """Register Flask routes for worker endpoints."""
-        
-        @self.app.route('/health', methods=['GET'])
-        def health():
-            """Health check endpoint."""
-            return jsonify({
-                'status': 'healthy',
-                'worker_id': self.worker_id
-            })
-        
-        @self.app.route('/execute_map', methods=['POST'])
-        def execute_map():
-            """Execute map task on assigned data."""
+        """Register aiohttp routes for worker endpoints."""
+        self.app.router.add_get('/health', self._health)
+        self.app.router.add_post('/execute_map', self._execute_map)
+        self.app.router.add_post('/sample_keys', self._sample_keys)
+        self.app.router.add_post('/shuffle', self._shuffle)
+        self.app.router.add_post('/commit', self._commit)
+        self.app.router.add_post('/execute_reduce', self._execute_reduce)
+        self.app.router.add_get('/get_results', self._get_results)
+        self.app.router.add_post('/reset', self._reset)
+    
+    async def _health(self, request: web.Request) -> web.Response:
+        """Health check endpoint."""
+        return web.json_response({
+            'status': 'healthy',
+            'worker_id': self.worker_id,
+            'codecs': available_codecs(),
+            'compressions': available_compressions(),
+            'host_id': self.host_id
+        })
+    
+    async def _execute_map(self, request: web.Request) -> web.Response:
+        """Execute map task on assigned data."""
+        self._tasks_in_flight += 1
+        try:
+            body = await self._read_body(request)
+            data = await self._run_in(self._task_executor, self._load_json, body, request.headers.get(COMPRESSION_HEADER))
+            attempt = data.get('attempt') or f'map-{id(data)}'
+            self._running_attempts[attempt] = time.time()
             try:
-                map_start_time = time.time()
-                
-                data = request.json
-                mapper_class = pickle.loads(bytes.fromhex(data['mapper']))
-                partitioner_class = pickle.loads(bytes.fromhex(data['partitioner']))
-                input_data = data['input_data']
-                worker_addresses = data['worker_addresses']
-                
-                logger.info(f"[Worker {self.worker_id}] MAP: Processing {len(input_data):,} records...")
-                
-                # Instantiate mapper and partitioner
-                mapper = mapper_class()
-                partitioner = partitioner_class()
-                
-                # Clear previous intermediate data
-                self.intermediate_data.clear()
-                
-                # Execute map phase
-                partitioned_data = {i: [] for i in range(len(worker_addresses))}
-                total_intermediate = 0
-                
-                for key, value in input_data:
-                    for emitted_key, emitted_value in mapper.map(key, value):
-                        partition = partitioner.get_partition(emitted_key, len(worker_addresses))
-                        partitioned_data[partition].append((emitted_key, emitted_value))
-                        total_intermediate += 1
-                
-                map_time = time.time() - map_start_time
-                logger.info(f"[Worker {self.worker_id}] MAP: Generated {total_intermediate:,} intermediate pairs in {map_time:.2f}s")
-                
-                # Send partitioned data to appropriate workers (shuffle)
-                logger.info(f"[Worker {self.worker_id}] SHUFFLE: Sending to {len(worker_addresses)} workers...")
-                shuffle_start_time = time.time()
-                
-                for partition_id, partition_data in partitioned_data.items():
-                    target_worker = worker_addresses[partition_id]
-                    
-                    if len(partition_data) > 0:
-                        logger.info(f"[Worker {self.worker_id}] SHUFFLE: → Worker {partition_id+1}: {len(partition_data):,} pairs")
-                    
-                    try:
-                        response = requests.post(
-                            f"{target_worker}/shuffle",
-                            json={'data': partition_data},
-                            timeout=30
-                        )
-                        response.raise_for_status()
-                    except Exception as e:
-                        logger.error(f"Failed to send data to {target_worker}: {e}")
-                        raise
-                
-                shuffle_time = time.time() - shuffle_start_time
-                total_time = time.time() - map_start_time
-                logger.info(f"[Worker {self.worker_id}] SHUFFLE: Completed in {shuffle_time:.2f}s")
-                logger.info(f"[Worker {self.worker_id}] MAP+SHUFFLE: Total time {total_time:.2f}s")
-                
-                return jsonify({
-                    'status': 'success',
-                    'worker_id': self.worker_id,
-                    'intermediate_count': total_intermediate,
-                    'map_time': total_time
-                })
-                
-            except Exception as e:
-                logger.error(f"Map execution failed: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 500
+                result = await self._run_in(self._task_executor, self.run_map_task, data)
+            finally:
+                del self._running_attempts[attempt]
+            return web.json_response(result)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Map execution failed: {e}")
+            return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+        finally:
+            self._tasks_in_flight -= 1
+    
+    async def _sample_keys(self, request: web.Request) -> web.Response:
+        """Map part of the input and return key samples and frequency sketches of every task."""
+        try:
+            body = await self._read_body(request)
+            data = await self._run_in(self._task_executor, self._load_json, body, request.headers.get(COMPRESSION_HEADER))
+            sample = await self._run_in(self._task_executor, self.sample_keys, data)
+            return web.json_response({'status': 'success', **sample})
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Key sampling failed: {e}")
+            return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+    
+    async def _shuffle(self, request: web.Request) -> web.Response:
+        """Receive shuffled data from other workers."""
+        self._shuffles_in_flight += 1
+        try:
+            async with self._shuffle_slots:
+                # Requests without a codec header use the original JSON format
+                codec_name = request.headers.get('X-Shuffle-Codec', JsonCodec.name)
+                payload = await self._read_body(request)
+                shared_memory = request.headers.get(SHARED_MEMORY_HEADER)
+                if shared_memory:
+                    # A peer on this host left the chunk in shared memory
+                    payload = await self._run_in(self._shuffle_executor, read_shared_payload, shared_memory)
+                await self._run_in(
+                    self._shuffle_executor,
+                    self.receive_shuffle,
+                    codec_name,
+                    payload,
+                    request.headers.get(COMPRESSION_HEADER),
+                    request.headers.get(ATTEMPT_HEADER),
+                    int(request.headers.get(TASK_HEADER, 0))
+                )
+            return web.json_response({'status': 'success'})
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Shuffle failed: {e}")
+            return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+        finally:
+            self._shuffles_in_flight -= 1
+    
+    async def _commit(self, request: web.Request) -> web.Response:
+        """Accept the shuffle output of map task attempts the coordinator committed."""
+        try:
+            data = await request.json()
+            for store in self.stores:
+                await self._run_in(self._shuffle_executor, store.commit, data['attempts'])
+            return web.json_response({'status': 'success'})
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Commit failed: {e}")
+            return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+    
+    async def _execute_reduce(self, request: web.Request) -> web.Response:
+        """Execute reduce task on intermediate data."""
+        self._tasks_in_flight += 1
+        try:
+            body = await self._read_body(request)
+            data = await self._run_in(self._task_executor, self._load_json, body, request.headers.get(COMPRESSION_HEADER))
+            result = await self._run_in(self._task_executor, self.run_reduce_task, data)
+            return web.json_response(result)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Reduce execution failed: {e}")
+            return web.json_response({'status': 'error', 'message': str(e)}, status=500)
+        finally:
+            self._tasks_in_flight -= 1
+    
+    async def _get_results(self, request: web.Request) -> web.Response:
+        """Return the final results of one task (query parameter 'task', default 0) to the coordinator."""
+        final_results = self.final_results[int(request.query.get('task', 0))]
+        codec_name = request.query.get('codec')
+        if codec_name:
+            payload = await self._run_in(self._task_executor, get_codec(codec_name).encode, final_results)
+            body, applied, compress_time = await self._run_in(
+                self._task_executor,
+                compress_payload,
+                payload,
+                request.query.get('compression') or None,
+                int(request.query.get('compression_threshold', DEFAULT_COMPRESSION_THRESHOLD))
+            )
+            
+            headers = {
+                'X-Worker-Id': self.worker_id,
+                'X-Raw-Bytes': str(len(payload)),
+                'X-Compress-Time': f'{compress_time:.6f}'
+            }
+            if applied:
+                headers[COMPRESSION_HEADER] = applied
+            return web.Response(body=body, content_type='application/octet-stream', headers=headers)
         
-        @self.app.route('/shuffle', methods=['POST'])
-        def shuffle():
-            """Receive shuffled data from other workers."""
-            try:
-                data = request.json['data']
-                
-                # Group data by key
-                for key, value in data:
-                    if key not in self.intermediate_data:
-                        self.intermediate_data[key] = []
-                    self.intermediate_data[key].append(value)
-                
-                return jsonify({'status': 'success'})
-                
-            except Exception as e:
-                logger.error(f"Shuffle failed: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 500
+        return web.json_response({
+            'results': final_results,
+            'worker_id': self.worker_id
+        })
+    
+    async def _reset(self, request: web.Request) -> web.Response:
+        """
+        Reset worker state for the next job.
+        
+        The coordinator may send a memory budget, the number of tasks the
+        job runs over one scan ('num_tasks', default 1; they share the
+        budget) and where to send heartbeats ({'url', 'interval', 'address'}).
+        """
+        options = await request.json() if request.can_read_body else {}
+        budget_mb = options.get('memory_budget_mb', self.memory_budget_mb)
+        num_tasks = options.get('num_tasks', 1)
+        
+        for store in self.stores:
+            await self._run_in(self._task_executor, store.clear)
+        task_budget_mb = budget_mb / num_tasks if budget_mb is not None else None
+        self.stores = [self._new_store(task_budget_mb) for _ in range(num_tasks)]
+        self.final_results = [[] for _ in range(num_tasks)]
         
-        @self.app.route('/execute_reduce', methods=['POST'])
-        def execute_reduce():
-            """Execute reduce task on intermediate data."""
+        heartbeat = options.get('heartbeat')
+        if heartbeat:
+            await self._stop_heartbeats()
+            self._heartbeat_task = asyncio.create_task(
+                self._send_heartbeats(heartbeat['url'], heartbeat['address'], heartbeat['interval'])
+            )
+        return web.json_response({'status': 'success'})
+    
+    async def _send_heartbeats(self, url: str, address: str, interval: float):
+        """Post a heartbeat report to the coordinator every interval seconds."""
+        logger.info(f"[Worker {self.worker_id}] Sending heartbeats to {url} every {interval}s")
+        timeout = aiohttp.ClientTimeout(total=max(interval, 1.0))
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    async with session.post(url, json=self.heartbeat_report(address)) as response:
+                        await response.read()
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.debug(f"[Worker {self.worker_id}] Heartbeat failed: {e}")
+                await asyncio.sleep(interval)
+    
+    async def _stop_heartbeats(self, app: Optional[web.Application] = None):
+        """Cancel the heartbeat loop, if one is running."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
             try:
-                reduce_start_time = time.time()
-                
-                data = request.json
-                reducer_class = pickle.loads(bytes.fromhex(data['reducer']))
-                
-                # Count total intermediate pairs
-                total_pairs = sum(len(values) for values in self.intermediate_data.values())
-                unique_keys = len(self.intermediate_data)
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+    
+    def heartbeat_report(self, address: str) -> Dict[str, Any]:
+        """
+        Describe this worker's current state for a heartbeat.
+        
+        Args:
+            address: Address the coordinator knows this worker by
+            
+        Returns:
+            Report with load average, resident memory in MB (None where it
+            cannot be measured), queue depth (task and shuffle requests not
+            finished yet) and the seconds each running map attempt has run
+        """
+        now = time.time()
+        return {
+            'address': address,
+            'worker_id': self.worker_id,
+            'load': _load_average(),
+            'memory_mb': _process_memory_mb(),
+            'queue_depth': self._tasks_in_flight + self._shuffles_in_flight,
+            'running': {attempt: now - started for attempt, started in self._running_attempts.items()}
+        }
+    
+    @staticmethod
+    def _budget_bytes(budget_mb: Optional[float]) -> Optional[int]:
+        """Convert a memory budget in MB (None = unlimited) to bytes."""
+        return None if budget_mb is None else int(budget_mb * 1024 * 1024)
+    
+    def _new_store(self, budget_mb: Optional[float]) -> IntermediateStore:
+        """Create an empty intermediate store for one task of a job."""
+        return IntermediateStore(
+            num_stripes=self.store_stripes,
+            columnar=self.columnar_store,
+            memory_budget_bytes=self._budget_bytes(budget_mb),
+            spill_dir=self.spill_dir
+        )
+    
+    async def _read_body(self, request: web.Request) -> bytes:
+        """
+        Read a request body chunk by chunk as it arrives.
+        
+        Args:
+            request: Incoming request
+            
+        Returns:
+            The complete body
+            
+        Raises:
+            web.HTTPRequestEntityTooLarge: If the body exceeds max_body_bytes
+        """
+        body = bytearray()
+        async for chunk in request.content.iter_chunked(1 << 16):
+            body.extend(chunk)
+            if len(body) > self.max_body_bytes:
+                raise web.HTTPRequestEntityTooLarge(
+                    max_size=self.max_body_bytes,
+                    actual_size=len(body)
+                )
+        return bytes(body)
+    
+    @staticmethod
+    def _load_json(body: bytes, compression: Optional[str]) -> Any:
+        """Decompress (if needed) and parse a JSON request body."""
+        return json.loads(decompress_payload(body, compression))
+    
+    @staticmethod
+    async def _run_in(executor: ThreadPoolExecutor, func, *args):
+        """Run a blocking function on one of the worker's thread pools."""
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    
+    def run_map_task(self, data: dict) -> dict:
+        """
+        Execute one map task: map, partition, combine and shuffle.
+        
+        A job of several tasks sends one mapper (and combiner) per task.
+        The input is read once and every mapper runs over it; each task's
+        output goes to its own intermediate store on the receivers.
+        
+        Args:
+            data: Map task payload sent by the coordinator
+            
+        Returns:
+            Task statistics for the coordinator
+        """
+        map_start_time = time.time()
+        
+        worker_addresses = data['worker_addresses']
+        codec = get_codec(data.get('shuffle_codec', JsonCodec.name))
+        
+        # Instantiate mappers, partitioners and optional combiners
+        mappers = [pickle.loads(bytes.fromhex(mapper_hex))() for mapper_hex in data['mappers']]
+        combiners = [
+            pickle.loads(bytes.fromhex(combiner_hex))() if combiner_hex else None
+            for combiner_hex in data['combiners']
+        ]
+        partitioners = [self._load_partitioner(partitioner_hex) for partitioner_hex in data['partitioners']]
+        for partitioner in partitioners:
+            if isinstance(partitioner, HotKeyPartitioner):
+                partitioner.start_at(data.get('map_task', 0))
+        
+        # Input is either shipped records or split descriptors to read locally
+        input_splits = data.get('input_splits')
+        if input_splits is not None:
+            input_data, batch = self._read_splits(input_splits, mappers, data.get('columns'))
+            logger.info(f"[Worker {self.worker_id}] MAP: Read {sum(s['num_rows'] for s in input_splits):,} records from {len(input_splits)} local split(s) in {time.time() - map_start_time:.2f}s")
+        else:
+            input_data, batch = data['input_data'], None
+        
+        num_records = len(next(iter(batch.values()), [])) if batch is not None else len(input_data)
+        tasks = f" for {len(mappers)} tasks" if len(mappers) > 1 else ""
+        logger.info(f"[Worker {self.worker_id}] MAP: Processing {num_records:,} records{tasks}...")
+        
+        # Execute map phase (intermediate data is kept: shuffles from
+        # other workers and earlier map tasks of this job land there too).
+        # Output is mapped, combined and streamed chunk by chunk, so uploads
+        # overlap with mapping and only a few chunks are held at a time.
+        num_partitions = len(worker_addresses)
+        chunk_size = self.shuffle_sender.chunk_pairs
+        total_intermediate = 0
+        combined_count = 0
+        
+        # A re-executed task may only need to resend some partitions
+        attempt = data.get('attempt')
+        wanted = set(data['partitions']) if data.get('partitions') is not None else None
+        
+        logger.info(f"[Worker {self.worker_id}] SHUFFLE: Streaming to {len(set(worker_addresses))} workers ({codec.name}, {chunk_size:,}-pair chunks)...")
+        # Our own partitions go straight to the local store; peers on this
+        # host get their chunks through shared memory
+        local_partitions = set(data.get('local_partitions') or [])
+        worker_hosts = data.get('worker_hosts') or []
+        same_host = [
+            i for i, peer_host in enumerate(worker_hosts)
+            if peer_host == self.host_id and i not in local_partitions
+        ]
+        
+        stream = self.shuffle_sender.open_stream(
+            worker_addresses,
+            codec,
+            compression=data.get('compression'),
+            compression_threshold=data.get('compression_threshold', DEFAULT_COMPRESSION_THRESHOLD),
+            local_partitions=local_partitions,
+            local_sink=lambda pairs, task: self.stores[task].add_pairs(pairs, attempt=attempt),
+            shared_memory_partitions=same_host,
+            attempt=attempt
+        )
+        
+        def emit(partition_id: int, pairs: List[tuple], task: int, combined: bool = False):
+            """Combine one chunk of a task's partition and stream it."""
+            nonlocal combined_count
+            if wanted is not None and partition_id not in wanted:
+                return
+            if combiners[task] is not None and not combined:
+                pairs = self._combine(combiners[task], pairs)
+            combined_count += len(pairs)
+            stream.add(partition_id, pairs, task)
+        
+        batch_tasks = [task for task, mapper in enumerate(mappers) if isinstance(mapper, BatchMapper)]
+        record_tasks = [task for task, mapper in enumerate(mappers) if not isinstance(mapper, BatchMapper)]
+        
+        def emit_columns(keys: np.ndarray, values: np.ndarray, task: int):
+            """Partition a batch mapper's output and combine and stream each part."""
+            partitions = partitioners[task].get_partitions(keys, num_partitions)
+            for i in range(num_partitions):
+                mask = partitions == i
+                if not mask.any():
+                    continue
+                combined = self._combine_columns(combiners[task], keys[mask], values[mask])
+                if combined is not None:
+                    emit(i, combined, task, combined=True)
+                else:
+                    emit(i, columns_to_pairs(keys[mask], values[mask]), task)
+        
+        # Tasks with small integer keys aggregate into arrays indexed by key
+        dense = {
+            task: DenseAccumulator(combiners[task].aggregate, mappers[task].key_domain)
+            for task in batch_tasks if self._uses_dense_keys(mappers[task], combiners[task])
+        }
+        for task, accumulator in dense.items():
+            logger.info(f"[Worker {self.worker_id}] MAP: Task {task} aggregates into {accumulator.size:,} dense key cells")
+        
+        try:
+            if batch_tasks:
+                # Columnar path: one map_batch call per mapper and one
+                # partitioning pass per chunk of rows
+                if batch is None:
+                    batch = records_to_columns(input_data, self._batch_columns(mappers))
+                for chunk in self._iter_batch_chunks(batch, chunk_size):
+                    for task in batch_tasks:
+                        keys, values = mappers[task].map_batch(chunk)
+                        total_intermediate += len(keys)
+                        
+                        if task in dense:
+                            # Keys outside the declared domain take the usual path
+                            outside = dense[task].add(keys, values)
+                            if not outside.any():
+                                continue
+                            keys, values = keys[outside], values[outside]
+                        emit_columns(keys, values, task)
                 
-                logger.info(f"[Worker {self.worker_id}] REDUCE: Processing {total_pairs:,} pairs across {unique_keys} unique keys")
+                # Ship one state per key that received values, whatever the
+                # number of records
+                for task, accumulator in dense.items():
+                    keys, states = accumulator.columns()
+                    partitions = partitioners[task].get_partitions(keys, num_partitions)
+                    for i in range(num_partitions):
+                        mask = partitions == i
+                        if mask.any():
+                            part_states = states[mask] if isinstance(states, np.ndarray) else [component[mask] for component in states]
+                            emit(i, columns_to_pair_list(keys[mask], part_states), task, combined=True)
+            
+            if record_tasks:
+                partitioned_data = {(task, i): [] for task in record_tasks for i in range(num_partitions)}
                 
-                # Instantiate reducer
-                reducer = reducer_class()
+                for key, value in input_data:
+                    for task in record_tasks:
+                        for emitted_key, emitted_value in mappers[task].map(key, value):
+                            partition = partitioners[task].get_partition(emitted_key, num_partitions)
+                            partition_data = partitioned_data[task, partition]
+                            partition_data.append((emitted_key, emitted_value))
+                            total_intermediate += 1
+                            
+                            if len(partition_data) >= chunk_size:
+                                emit(partition, partition_data, task)
+                                partitioned_data[task, partition] = []
                 
-                # Clear previous results
-                self.final_results.clear()
+                for (task, partition_id), partition_data in partitioned_data.items():
+                    if partition_data:
+                        emit(partition_id, partition_data, task)
+            
+            map_time = time.time() - map_start_time
+            logger.info(f"[Worker {self.worker_id}] MAP: Generated {total_intermediate:,} intermediate pairs ({combined_count:,} after combine) in {map_time:.2f}s")
+            
+            # Wait for the uploads still in flight
+            drain_start_time = time.time()
+            peer_stats = stream.close()
+        except Exception:
+            stream.abort()
+            raise
+        
+        shuffle_bytes = sum(stats['bytes'] for stats in peer_stats.values())
+        for target_worker, stats in peer_stats.items():
+            logger.info(f"[Worker {self.worker_id}] SHUFFLE: → {target_worker} ({stats['transport']}): {stats['pairs']:,} pairs in {stats['chunks']} chunk(s) ({stats['raw_bytes']:,} → {stats['bytes']:,} bytes) in {stats['seconds']:.2f}s")
+        
+        # Time the map task spent on the shuffle rather than overlapping it
+        shuffle_time = stream.blocked_time + time.time() - drain_start_time
+        total_time = time.time() - map_start_time
+        logger.info(f"[Worker {self.worker_id}] SHUFFLE: Completed, {stream.blocked_time:.2f}s blocked by backpressure, {time.time() - drain_start_time:.2f}s draining")
+        logger.info(f"[Worker {self.worker_id}] MAP+SHUFFLE: Total time {total_time:.2f}s")
+        
+        return {
+            'status': 'success',
+            'worker_id': self.worker_id,
+            'intermediate_count': total_intermediate,
+            'combined_count': combined_count,
+            'shuffle_bytes': shuffle_bytes,
+            'shuffle_time': shuffle_time,
+            'shuffle_peers': peer_stats,
+            'map_time': total_time
+        }
+    
+    def sample_keys(self, data: dict) -> Dict[str, list]:
+        """
+        Run every task's mapper over some input and sample the emitted keys.
+        
+        The coordinator picks range partition split points from the samples
+        and finds hot keys from the sketches. Nothing is shuffled or stored.
+        
+        Args:
+            data: Sampling payload: 'mappers', 'max_keys', optional
+                'top_keys' and either 'input_data' or 'input_splits' (plus
+                'columns')
                 
-                # Execute reduce phase
-                for key, values in self.intermediate_data.items():
+        Returns:
+            'keys': up to max_keys sampled keys per task, and 'sketches':
+            per task, the number of keys emitted ('total') and the top_keys
+            most frequent keys with their counts ('heavy', as [key, count])
+            Composite keys come as lists.
+        """
+        mappers = [pickle.loads(bytes.fromhex(mapper_hex))() for mapper_hex in data['mappers']]
+        input_splits = data.get('input_splits')
+        if input_splits is not None:
+            input_data, batch = self._read_splits(input_splits, mappers, data.get('columns'))
+        else:
+            input_data, batch = data['input_data'], None
+        if batch is None and any(isinstance(mapper, BatchMapper) for mapper in mappers):
+            batch = records_to_columns(input_data, self._batch_columns(mappers))
+        
+        rng = np.random.default_rng()
+        top_keys = data.get('top_keys', 0)
+        samples = []
+        sketches = []
+        for mapper in mappers:
+            if isinstance(mapper, BatchMapper):
+                keys = mapper.map_batch(batch)[0]
+            else:
+                keys = [emitted_key for key, value in input_data for emitted_key, _ in mapper.map(key, value)]
+            sketches.append({'total': len(keys), 'heavy': self._heavy_keys(keys, top_keys)})
+            
+            if len(keys) > data['max_keys']:
+                picked = rng.choice(len(keys), data['max_keys'], replace=False)
+                keys = keys[picked] if isinstance(keys, np.ndarray) else [keys[i] for i in picked]
+            samples.append(keys.tolist() if isinstance(keys, np.ndarray) else list(keys))
+        
+        logger.info(f"[Worker {self.worker_id}] SAMPLE: {sum(len(keys) for keys in samples):,} keys, top {top_keys} keys per task")
+        return {'keys': samples, 'sketches': sketches}
+    
+    def receive_shuffle(
+        self,
+        codec_name: str,
+        payload: bytes,
+        compression: Optional[str] = None,
+        attempt: Optional[str] = None,
+        task: int = 0
+    ):
+        """
+        Decode one shuffle upload and group its pairs by key.
+        
+        Args:
+            codec_name: Codec named in the X-Shuffle-Codec header
+            payload: Encoded (key, value) pairs
+            compression: Compression named in the X-Payload-Compression header
+            attempt: Map task attempt named in the X-Shuffle-Attempt header;
+                its pairs are held back until the attempt is committed
+            task: Task named in the X-Shuffle-Task header
+        """
+        codec = get_codec(codec_name)
+        payload = decompress_payload(payload, compression)
+        store = self.stores[task]
+        
+        # The store is safe for the concurrent uploads of several workers
+        if store.columnar:
+            store.add_columns(*codec.decode_columns(payload), attempt=attempt)
+        else:
+            store.add_pairs(codec.decode(payload), attempt=attempt)
+    
+    def run_reduce_task(self, data: dict) -> dict:
+        """
+        Reduce all intermediate data held by this worker.
+        
+        Every task of the job is reduced separately, from its own store
+        with its own reducer. With 'sort_by_key' the data is read in key
+        order, reducers get an iterator of values per key, and the output
+        stays in key order.
+        
+        Args:
+            data: Reduce task payload sent by the coordinator
+            
+        Returns:
+            Task statistics for the coordinator
+        """
+        reduce_start_time = time.time()
+        
+        reducer_classes = [pickle.loads(bytes.fromhex(reducer_hex)) for reducer_hex in data['reducers']]
+        sort_by_key = data.get('sort_by_key', False)
+        
+        # Keep only the output of committed map task attempts; the rest
+        # came from attempts that failed or were superseded
+        if 'committed_attempts' in data:
+            dropped = 0
+            for store in self.stores:
+                store.commit(data['committed_attempts'])
+                dropped += store.discard_pending()
+            if dropped:
+                logger.info(f"[Worker {self.worker_id}] REDUCE: Dropped {dropped:,} pairs of uncommitted map attempts")
+        
+        # Count total intermediate pairs
+        total_pairs = sum(store.num_pairs() for store in self.stores)
+        
+        num_spills = sum(store.num_spills for store in self.stores)
+        spilled_bytes = sum(store.spilled_bytes for store in self.stores)
+        if num_spills:
+            logger.info(f"[Worker {self.worker_id}] REDUCE: Processing {total_pairs:,} pairs, merging {num_spills} spill runs ({spilled_bytes / 1024 / 1024:.1f} MB on disk)")
+        else:
+            logger.info(f"[Worker {self.worker_id}] REDUCE: Processing {total_pairs:,} pairs")
+        
+        # Clear previous results
+        self.final_results = [[] for _ in reducer_classes]
+        
+        # Execute reduce phase, task by task
+        for reducer_class, store, final_results in zip(reducer_classes, self.stores, self.final_results):
+            reducer = reducer_class()
+            if isinstance(reducer, AggregateReducer):
+                # Values are partial states from the map-side combine. Keep the
+                # merged state so the coordinator can merge and finalize exactly.
+                # Built-in aggregates merge all keys in one NumPy pass.
+                merged = None
+                if reducer.aggregate.vectorized:
+                    merged = store.reduce_groups(reducer.aggregate.merge_groups, ordered=sort_by_key)
+                if merged is not None:
+                    final_results.extend(merged)
+                else:
+                    groups = store.sorted_items() if sort_by_key else store.items()
+                    for key, states in groups:
+                        final_results.append(reducer.merge_states(key, states))
+            else:
+                groups = store.sorted_items() if sort_by_key else store.items()
+                for key, values in groups:
                     for result_key, result_value in reducer.reduce(key, values):
-                        self.final_results.append((result_key, result_value))
-                
-                reduce_time = time.time() - reduce_start_time
-                logger.info(f"[Worker {self.worker_id}] REDUCE: Output {len(self.final_results)} results in {reduce_time:.2f}s")
-                
-                return jsonify({
-                    'status': 'success',
-                    'worker_id': self.worker_id,
-                    'input_pairs': total_pairs,
-                    'output_count': len(self.final_results),
-                    'reduce_time': reduce_time
-                })
-                
-            except Exception as e:
-                logger.error(f"Reduce execution failed: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 500
-        
-        @self.app.route('/get_results', methods=['GET'])
-        def get_results():
-            """Return final results to coordinator."""
-            return jsonify({
-                'results': self.final_results,
-                'worker_id': self.worker_id
-            })
-        
-        @self.app.route('/reset', methods=['POST'])
-        def reset():
-            """Reset worker state."""
-            self.intermediate_data.clear()
-            self.final_results.clear()
-            return jsonify({'status': 'success'})
+                        final_results.append((result_key, result_value))
+        
+        output_count = sum(len(final_results) for final_results in self.final_results)
+        reduce_time = time.time() - reduce_start_time
+        logger.info(f"[Worker {self.worker_id}] REDUCE: Output {output_count} results in {reduce_time:.2f}s")
+        
+        return {
+            'status': 'success',
+            'worker_id': self.worker_id,
+            'input_pairs': total_pairs,
+            'output_count': output_count,
+            'reduce_time': reduce_time,
+            'spills': num_spills,
+            'spilled_bytes': spilled_bytes
+        }
+    
+    def _read_splits(self, input_splits: List[dict], mappers: List[Mapper], columns: Optional[List[str]]):
+        """
+        Read input split descriptors from local Parquet files, once for all mappers.
+        
+        Batch mappers get Arrow columns converted straight to NumPy; other
+        mappers get (row_index, record_dict) tuples.
+        
+        Args:
+            input_splits: Descriptors from plan_parquet_splits()
+            mappers: The job's mapper instances, one per task
+            columns: Columns configured for the dataset (None = all)
+            
+        Returns:
+            Tuple of (input_data, batch); input_data is None without
+            record mappers and batch is None without batch mappers
+        """
+        has_batch = any(isinstance(mapper, BatchMapper) for mapper in mappers)
+        has_records = not all(isinstance(mapper, BatchMapper) for mapper in mappers)
+        batch_columns = self._batch_columns(mappers) if has_batch else None
+        
+        if not has_records:
+            read_columns = batch_columns or columns
+        elif columns is not None and batch_columns is not None:
+            read_columns = list(dict.fromkeys(columns + batch_columns))
+        else:
+            read_columns = columns
+        tables = [read_parquet_split(split, read_columns, self.data_dir) for split in input_splits]
+        
+        input_data, batch = None, None
+        if has_batch:
+            table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+            batch = arrow_to_columns(table, batch_columns)
+        if has_records:
+            input_data = []
+            for split, table in zip(input_splits, tables):
+                input_data.extend(table_to_records(table, start_index=split['first_row']))
+        return input_data, batch
+    
+    @staticmethod
+    def _batch_columns(mappers: List[Mapper]) -> Optional[List[str]]:
+        """Return the columns all batch mappers need together (None = all)."""
+        columns: List[str] = []
+        for mapper in mappers:
+            if not isinstance(mapper, BatchMapper):
+                continue
+            if mapper.columns is None:
+                return None
+            columns.extend(mapper.columns)
+        return list(dict.fromkeys(columns))
+    
+    @staticmethod
+    def _iter_batch_chunks(batch: Dict[str, Any], chunk_rows: int) -> Iterator[Dict[str, Any]]:
+        """Yield row slices (views) of a column batch, chunk_rows rows at a time."""
+        num_rows = len(next(iter(batch.values()), []))
+        for start in range(0, num_rows, chunk_rows):
+            yield {column: values[start:start + chunk_rows] for column, values in batch.items()}
+        if num_rows == 0:
+            yield batch
+    
+    @staticmethod
+    def _combine(combiner: Any, pairs: List[tuple]) -> List[tuple]:
+        """
+        Group one partition's pairs by key and run the combiner on each group.
+        
+        Args:
+            combiner: Combiner instance, or a Reducer that declares can_combine
+            pairs: (key, value) pairs emitted by the mapper
+            
+        Returns:
+            Combined (key, value) pairs
+        """
+        combine = combiner.combine if isinstance(combiner, Combiner) else combiner.reduce
+        
+        grouped: Dict[Any, List[Any]] = {}
+        for key, value in pairs:
+            if key not in grouped:
+                grouped[key] = []
+            grouped[key].append(value)
+        
+        return [pair for key, values in grouped.items() for pair in combine(key, values)]
+    
+    @staticmethod
+    def _heavy_keys(keys: Any, top_keys: int) -> List[list]:
+        """
+        Count keys and return the top_keys most frequent as [key, count].
+        
+        Args:
+            keys: Key column (2-D for composite keys) or list of keys
+            top_keys: Number of keys to return
+        """
+        if not top_keys or not len(keys):
+            return []
+        if isinstance(keys, np.ndarray) and keys.dtype.kind in 'iufb':
+            unique, counts = np.unique(keys, axis=0 if keys.ndim == 2 else None, return_counts=True)
+            top = np.argsort(counts, kind='stable')[::-1][:top_keys]
+            return [[unique[i].tolist(), int(counts[i])] for i in top]
+        if isinstance(keys, np.ndarray):
+            keys = [tuple(key) if keys.ndim == 2 else key for key in keys.tolist()]
+        return [[key, count] for key, count in Counter(keys).most_common(top_keys)]
+    
+    @staticmethod
+    def _load_partitioner(partitioner_hex: str) -> Partitioner:
+        """Unpickle a partitioner sent as a class or, with state (split points), as an instance."""
+        partitioner = pickle.loads(bytes.fromhex(partitioner_hex))
+        return partitioner() if isinstance(partitioner, type) else partitioner
+    
+    @staticmethod
+    def _uses_dense_keys(mapper: Mapper, combiner: Any) -> bool:
+        """Whether a task can aggregate into dense arrays over its declared key domain."""
+        return (
+            isinstance(mapper, BatchMapper) and mapper.key_domain is not None
+            and isinstance(combiner, AggregateReducer) and combiner.aggregate.vectorized
+        )
+    
+    @staticmethod
+    def _combine_columns(combiner: Any, keys: np.ndarray, values: np.ndarray) -> Optional[List[tuple]]:
+        """
+        Combine a batch mapper's key and value columns with NumPy kernels.
+        
+        Args:
+            combiner: Combiner of the task (or None)
+            keys: Key column of one partition, shape (n,) or (n, k)
+            values: Value column of one partition
+            
+        Returns:
+            Combined (key, state) pairs, or None if the combiner has no
+            vectorized aggregate or the keys cannot be sorted
+        """
+        if not isinstance(combiner, AggregateReducer) or not combiner.aggregate.vectorized:
+            return None
+        try:
+            order, starts = group_keys(keys)
+        except TypeError:
+            return None
+        sorted_keys = keys[order]
+        return columns_to_pair_list(sorted_keys[starts], combiner.aggregate.accumulate_groups(values[order], starts))
     
     def start(self):
-        """Start the worker Flask server."""
+        """Start the worker HTTP server (blocks until interrupted)."""
         logger.info(f"Starting worker {self.worker_id} on {self.host}:{self.port}")
-        self.app.run(host=self.host, port=self.port, debug=False)
+        try:
+            web.run_app(
+                self.app,
+                host=self.host,
+                port=self.port,
+                keepalive_timeout=75,
+                access_log=None,
+                print=None
+            )
+        finally:
+            self._task_executor.shutdown(wait=False)
+            self._shuffle_executor.shutdown(wait=False)
+            self.shuffle_sender.close()
+
+
+def _load_average() -> Optional[float]:
+    """One-minute load average of the host, if the platform reports one."""
+    if hasattr(os, 'getloadavg'):
+        return os.getloadavg()[0]
+    if psutil is not None:
+        return psutil.getloadavg()[0]
+    return None
+
+
+def _process_memory_mb() -> Optional[float]:
+    """Resident memory of this process in MB, if it can be measured."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
 
 
-def start_worker(worker_id: str, host: str, port: int):
+def start_worker(
+    worker_id: str,
+    host: str,
+    port: int,
+    data_dir: Optional[str] = None,
+    shuffle_threads: int = 4,
+    max_concurrent_shuffles: int = 16,
+    columnar_store: bool = False,
+    shuffle_fanout: int = 4,
+    shuffle_chunk_pairs: int = 50000,
+    memory_budget_mb: Optional[float] = None,
+    spill_dir: Optional[str] = None
+):
     """
     Helper function to start a worker node.
     
@@ -217,6 +936,26 @@ def start_worker(worker_id: str, host: str, port: int):
         worker_id: Unique worker identifier
         host: Host address
         port: Port number
+        data_dir: Directory with local copies of dataset files
+        shuffle_threads: Threads decoding shuffle uploads
+        max_concurrent_shuffles: Shuffle uploads read at the same time
+        columnar_store: Keep shuffled data as NumPy columns
+        shuffle_fanout: Shuffle uploads sent in parallel per map task
+        shuffle_chunk_pairs: Pairs per streamed shuffle chunk
+        memory_budget_mb: Intermediate data kept in memory before spilling
+        spill_dir: Directory for spill runs
     """
-    worker = Worker(worker_id, host, port)
+    worker = Worker(
+        worker_id,
+        host,
+        port,
+        data_dir=data_dir,
+        shuffle_threads=shuffle_threads,
+        max_concurrent_shuffles=max_concurrent_shuffles,
+        columnar_store=columnar_store,
+        shuffle_fanout=shuffle_fanout,
+        shuffle_chunk_pairs=shuffle_chunk_pairs,
+        memory_budget_mb=memory_budget_mb,
+        spill_dir=spill_dir
+    )
     worker.start()
@@ -10,11 +10,17 @@ Business value: Identify zones where passengers tip more generously,
 which can help taxi drivers optimize their pickup strategies.
 """
 
-from typing import Any, Iterator, Tuple, List
-from ..core.base import Mapper, Reducer
+from typing import Any, Dict, Tuple
 
+import numpy as np
 
-class TipPercentageMapper(Mapper):
+from ..core.base import BatchMapper
+from ..core.aggregates import AggregateReducer, MeanAggregate
+from ..utils.columnar import as_float
+from ..utils.parquet_loader import NUM_ZONE_IDS
+
+
+class TipPercentageMapper(BatchMapper):
     """
     Map: Extract pickup zone and tip percentage from each trip.
     
@@ -22,54 +28,57 @@ class TipPercentageMapper(Mapper):
     Output: (pickup_zone, tip_percentage)
     """
     
-    def map(self, key: Any, value: Any) -> Iterator[Tuple[Any, Any]]:
+    columns = ['PULocationID', 'fare_amount', 'tip_amount']
+    
+    key_domain = (NUM_ZONE_IDS,)
+    
+    def map_batch(self, batch: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
         """
         Extract tip percentage for each pickup zone.
         
         Args:
-            key: Trip identifier (row index)
-            value: Dictionary containing trip data with fields:
+            batch: Column arrays with trip data fields:
                 - PULocationID: Pickup location zone
                 - fare_amount: Base fare
                 - tip_amount: Tip given by passenger
                 
-        Yields:
-            (pickup_zone_id, tip_percentage)
+        Returns:
+            (pickup_zone_ids, tip_percentages) for trips with a positive fare
         """
-        try:
-            pickup_zone = value.get('PULocationID')
-            fare = float(value.get('fare_amount', 0))
-            tip = float(value.get('tip_amount', 0))
-            
-            # Only process valid trips with positive fare
-            if pickup_zone is not None and fare > 0:
-                tip_percentage = (tip / fare) * 100.0
-                yield (pickup_zone, tip_percentage)
-                
-        except (ValueError, TypeError, KeyError):
-            # Skip invalid records
-            pass
+        pickup_zone = as_float(batch['PULocationID'])
+        fare = as_float(batch['fare_amount'])
+        tip = as_float(batch['tip_amount'])
+        
+        # Only process valid trips with positive fare (NaN compares False)
+        valid = ~np.isnan(pickup_zone) & (fare > 0) & ~np.isnan(tip)
+        
+        tip_percentage = tip[valid] / fare[valid] * 100.0
+        return pickup_zone[valid].astype(np.int64), tip_percentage
 
 
-class TipPercentageReducer(Reducer):
+class TipPercentageReducer(AggregateReducer):
     """
     Reduce: Calculate average tip percentage for each pickup zone.
     
     Input: (pickup_zone, [tip_percentage1, tip_percentage2, ...])
     Output: (pickup_zone, average_tip_percentage)
+    
+    Tip percentages are aggregated as mergeable (sum, count) states, so
+    partial results from any number of workers average exactly.
     """
     
-    def reduce(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
+    aggregate = MeanAggregate()
+    
+    def finalize(self, key: Any, state: Any) -> Tuple[Any, Any]:
         """
         Compute average tip percentage for a zone.
         
         Args:
             key: Pickup zone ID
-            values: List of tip percentages for this zone
+            state: Merged (tip_percentage_sum, trip_count) for this zone
             
-        Yields:
+        Returns:
             (pickup_zone, average_tip_percentage)
         """
-        if values:
-            avg_tip_pct = sum(values) / len(values)
-            yield (key, round(avg_tip_pct, 2))
+        avg_tip_pct = self.aggregate.finalize(state)
+        return (key, round(avg_tip_pct, 2))
@@ -9,11 +9,17 @@ Business value: Identify the most profitable routes to help drivers maximize
 their earnings per unit of distance traveled.
 """
 
-from typing import Any, Iterator, Tuple, List
-from ..core.base import Mapper, Reducer
+from typing import Any, Dict, Tuple
 
+import numpy as np
 
-class RouteProfitabilityMapper(Mapper):
+from ..core.base import BatchMapper
+from ..core.aggregates import AggregateReducer, MeanAggregate
+from ..utils.columnar import as_float
+from ..utils.parquet_loader import NUM_ZONE_IDS
+
+
+class RouteProfitabilityMapper(BatchMapper):
     """
     Map: Extract route and calculate revenue per mile.
     
@@ -21,62 +27,73 @@ class RouteProfitabilityMapper(Mapper):
     Output: ((pickup_zone, dropoff_zone), revenue_per_mile)
     """
     
-    def map(self, key: Any, value: Any) -> Iterator[Tuple[Any, Any]]:
+    columns = ['PULocationID', 'DOLocationID', 'trip_distance', 'total_amount']
+    
+    # (pickup_zone, dropoff_zone) pairs
+    key_domain = (NUM_ZONE_IDS, NUM_ZONE_IDS)
+    
+    def map_batch(self, batch: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
         """
         Calculate revenue per mile for each route.
         
         Args:
-            key: Trip identifier (row index)
-            value: Dictionary containing trip data with fields:
+            batch: Column arrays with trip data fields:
                 - PULocationID: Pickup zone
                 - DOLocationID: Dropoff zone
                 - trip_distance: Distance in miles
                 - total_amount: Total fare including tips and tolls
                 
-        Yields:
-            ((pickup_zone, dropoff_zone), revenue_per_mile)
+        Returns:
+            (routes, revenue_per_mile) for trips with positive distance and
+            revenue, where routes is an (n, 2) array of (pickup, dropoff) zones
         """
-        try:
-            pickup_zone = value.get('PULocationID')
-            dropoff_zone = value.get('DOLocationID')
-            distance = float(value.get('trip_distance', 0))
-            revenue = float(value.get('total_amount', 0))
-            
-            # Only process trips with positive distance and revenue
-            if (pickup_zone is not None and 
-                dropoff_zone is not None and 
-                distance > 0 and 
-                revenue > 0):
-                
-                revenue_per_mile = revenue / distance
-                # Use string key for JSON serialization (instead of tuple)
-                route = f"{pickup_zone}->{dropoff_zone}"
-                yield (route, revenue_per_mile)
-                
-        except (ValueError, TypeError, KeyError):
-            # Skip invalid records
-            pass
+        pickup_zone = as_float(batch['PULocationID'])
+        dropoff_zone = as_float(batch['DOLocationID'])
+        distance = as_float(batch['trip_distance'])
+        revenue = as_float(batch['total_amount'])
+        
+        # Only process trips with positive distance and revenue
+        valid = (~np.isnan(pickup_zone) & 
+                 ~np.isnan(dropoff_zone) & 
+                 (distance > 0) & 
+                 (revenue > 0))
+        
+        revenue_per_mile = revenue[valid] / distance[valid]
+        routes = np.stack([pickup_zone[valid], dropoff_zone[valid]], axis=1).astype(np.int64)
+        
+        return routes, revenue_per_mile
 
 
-class RouteProfitabilityReducer(Reducer):
+class RouteProfitabilityReducer(AggregateReducer):
     """
     Reduce: Calculate average revenue per mile for each route.
     
-    Input: (route_string, [revenue_per_mile1, ...])
-    Output: (route_string, avg_revenue_per_mile)
+    Input: ((pickup_zone, dropoff_zone), [revenue_per_mile1, ...])
+    Output: ("pickup_zone->dropoff_zone", avg_revenue_per_mile)
+    
+    Revenue per mile is aggregated as mergeable (sum, count) states.
     """
     
-    def reduce(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
+    aggregate = MeanAggregate()
+    
+    def finalize(self, key: Any, state: Any) -> Tuple[Any, Any]:
         """
         Compute average revenue per mile for a route.
         
         Args:
-            key: Route string "pickup_zone->dropoff_zone"
-            values: List of revenue_per_mile values for this route
+            key: Route tuple (pickup_zone, dropoff_zone) or route string
+            state: Merged (revenue_per_mile_sum, trip_count) for this route
             
-        Yields:
+        Returns:
             (route_string, average_revenue_per_mile)
         """
-        if values:
-            avg_revenue_per_mile = sum(values) / len(values)
-            yield (key, round(avg_revenue_per_mile, 2))
+        avg_revenue_per_mile = self.aggregate.finalize(state)
+        return (format_route(key), round(avg_revenue_per_mile, 2))
+
+
+def format_route(route: Any) -> str:
+    """Format a (pickup_zone, dropoff_zone) route as "pickup->dropoff" for reports."""
+    if isinstance(route, (tuple, list)):
+        pickup_zone, dropoff_zone = route
+        return f"{pickup_zone}->{dropoff_zone}"
+    return route
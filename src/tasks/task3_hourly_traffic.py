@@ -9,12 +9,16 @@ Business value: Identify peak hours to optimize driver scheduling and
 understand demand patterns throughout the day.
 """
 
-from typing import Any, Iterator, Tuple, List
-from datetime import datetime
-from ..core.base import Mapper, Reducer
+from typing import Dict, Tuple
 
+import numpy as np
 
-class HourlyTrafficMapper(Mapper):
+from ..core.base import BatchMapper
+from ..core.aggregates import AggregateReducer, SumAggregate
+from ..utils.columnar import as_datetime64
+
+
+class HourlyTrafficMapper(BatchMapper):
     """
     Map: Extract hour of day from pickup time and count trips.
     
@@ -22,65 +26,39 @@ class HourlyTrafficMapper(Mapper):
     Output: (hour_of_day, 1)
     """
     
-    def map(self, key: Any, value: Any) -> Iterator[Tuple[Any, Any]]:
+    columns = ['tpep_pickup_datetime']
+    
+    key_domain = (24,)
+    
+    def map_batch(self, batch: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
         """
         Extract hour of day from each trip.
         
         Args:
-            key: Trip identifier (row index)
-            value: Dictionary containing trip data with fields:
-                - tpep_pickup_datetime: Pickup timestamp (string or datetime)
-                
-        Yields:
-            (hour_of_day, 1) for counting
+            batch: Column arrays with trip data fields:
+                - tpep_pickup_datetime: Pickup timestamp (string, datetime
+                  or datetime64)
+                  
+        Returns:
+            (hours_of_day, ones) for counting
         """
-        try:
-            pickup_time = value.get('tpep_pickup_datetime')
-            
-            if pickup_time is None:
-                return
-            
-            # Handle both string and datetime objects
-            if isinstance(pickup_time, str):
-                # Try common datetime formats
-                for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']:
-                    try:
-                        dt = datetime.strptime(pickup_time, fmt)
-                        break
-                    except ValueError:
-                        continue
-                else:
-                    # If no format matched, try ISO format
-                    dt = datetime.fromisoformat(pickup_time.replace('Z', '+00:00'))
-            else:
-                dt = pickup_time
-            
-            hour = dt.hour
-            yield (hour, 1)
-            
-        except (ValueError, TypeError, KeyError, AttributeError):
-            # Skip invalid records
-            pass
+        pickup_time = as_datetime64(batch['tpep_pickup_datetime'])
+        pickup_time = pickup_time[~np.isnat(pickup_time)]
+        
+        # Hours elapsed since midnight of the pickup day
+        hour = (pickup_time - pickup_time.astype('datetime64[D]')).astype('timedelta64[h]')
+        return hour.astype(np.int64), np.ones(len(hour), dtype=np.int64)
 
 
-class HourlyTrafficReducer(Reducer):
+class HourlyTrafficReducer(AggregateReducer):
     """
     Reduce: Sum trip counts for each hour.
     
     Input: (hour_of_day, [1, 1, 1, ...])
     Output: (hour_of_day, total_trip_count)
+    
+    Partial counts are plain sums, so they merge on the map side, on the
+    reducers and on the coordinator alike.
     """
     
-    def reduce(self, key: Any, values: List[Any]) -> Iterator[Tuple[Any, Any]]:
-        """
-        Count total trips for each hour.
-        
-        Args:
-            key: Hour of day (0-23)
-            values: List of 1's (one per trip)
-            
-        Yields:
-            (hour_of_day, total_trips)
-        """
-        total_trips = sum(values)
-        yield (key, total_trips)
+    aggregate = SumAggregate()
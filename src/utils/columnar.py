@@ -0,0 +1,186 @@
+"""
+Columnar helpers for batch (NumPy) map operations.
+
+Converts map-reduce input into dicts of NumPy arrays and converts emitted
+key/value columns back into (key, value) pairs.
+"""
+
+import warnings
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def records_to_columns(
+    records: Iterable[Tuple[Any, dict]],
+    columns: Optional[List[str]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Convert (row_index, record_dict) tuples into a dict of column arrays.
+    
+    Missing fields become None. Columns are returned as object arrays;
+    use as_float() / as_datetime64() to get typed arrays.
+    
+    Args:
+        records: Iterable of (row_index, record_dict) tuples (or 2-item lists)
+        columns: Columns to extract (None = fields of the first record)
+        
+    Returns:
+        Dict mapping column name to a NumPy array with one entry per record
+    """
+    values = [record for _, record in records]
+    
+    if columns is None:
+        columns = list(values[0].keys()) if values else []
+    
+    batch = {}
+    for column in columns:
+        array = np.empty(len(values), dtype=object)
+        array[:] = [record.get(column) for record in values]
+        batch[column] = array
+    
+    return batch
+
+
+def arrow_to_columns(batch, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Convert an Arrow RecordBatch or Table into a dict of column arrays.
+    
+    Integer columns with nulls become float arrays with NaN, timestamp
+    columns become datetime64 arrays with NaT. Requested columns that are
+    not present are filled with None.
+    
+    Args:
+        batch: pyarrow.RecordBatch or pyarrow.Table
+        columns: Columns to extract (None = all columns)
+        
+    Returns:
+        Dict mapping column name to a NumPy array
+    """
+    if columns is None:
+        columns = batch.column_names
+    
+    present = set(batch.column_names)
+    result = {}
+    for column in columns:
+        if column in present:
+            result[column] = batch.column(column).to_numpy(zero_copy_only=False)
+        else:
+            result[column] = np.full(batch.num_rows, None, dtype=object)
+    
+    return result
+
+
+def as_float(values: np.ndarray) -> np.ndarray:
+    """
+    Convert a column to float64, mapping None and unparsable values to NaN.
+    
+    Args:
+        values: Column array of any dtype
+        
+    Returns:
+        float64 array of the same length
+    """
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        return np.array([_to_float(v) for v in values], dtype=np.float64)
+
+
+def as_datetime64(values: np.ndarray) -> np.ndarray:
+    """
+    Convert a column to datetime64[s], mapping None and unparsable values to NaT.
+    
+    Accepts datetime64 arrays, datetime objects and ISO-like strings such
+    as '2024-01-15 08:30:00' or '2024-01-15T08:30:00Z'.
+    
+    Args:
+        values: Column array of any dtype
+        
+    Returns:
+        datetime64[s] array of the same length
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[s]')
+    
+    try:
+        with warnings.catch_warnings():
+            # Strings with a 'Z' suffix parse as UTC but NumPy warns about it
+            warnings.simplefilter('ignore', UserWarning)
+            return values.astype('datetime64[s]')
+    except (ValueError, TypeError):
+        return np.array([_to_datetime64(v) for v in values], dtype='datetime64[s]')
+
+
+def columns_to_pairs(keys: np.ndarray, values: np.ndarray) -> List[Tuple[Any, Any]]:
+    """
+    Convert emitted key and value columns into a list of (key, value) pairs.
+    
+    A 2-D key array is treated as composite keys and converted to tuples.
+    All elements are converted to native Python types.
+    
+    Args:
+        keys: Key column, shape (n,) or (n, k)
+        values: Value column, shape (n,)
+        
+    Returns:
+        List of (key, value) tuples
+    """
+    key_list = keys.tolist()
+    if keys.ndim == 2:
+        key_list = list(map(tuple, key_list))
+    
+    return list(zip(key_list, values.tolist()))
+
+
+def group_keys(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sort a key column so that equal keys become adjacent.
+    
+    Args:
+        keys: Key column, shape (n,) or (n, k) for composite keys
+        
+    Returns:
+        (order, starts): the permutation that sorts the keys, and the
+        index in sorted order where each group of equal keys starts
+        
+    Raises:
+        TypeError: If the keys cannot be ordered (mixed object keys)
+    """
+    if keys.ndim == 2:
+        order = np.lexsort(keys.T[::-1])
+        sorted_keys = keys[order]
+        boundaries = np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)
+    else:
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        boundaries = sorted_keys[1:] != sorted_keys[:-1]
+    
+    if not len(keys):
+        return order, np.empty(0, dtype=np.int64)
+    return order, np.concatenate([[0], np.flatnonzero(boundaries) + 1])
+
+
+def _to_float(value: Any) -> float:
+    """Convert a single value to float, returning NaN on failure."""
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def _to_datetime64(value: Any) -> np.datetime64:
+    """Convert a single value to datetime64[s], returning NaT on failure."""
+    if value is None:
+        return np.datetime64('NaT')
+    
+    try:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            value = value.replace(tzinfo=None)
+        return np.datetime64(value, 's')
+    except (ValueError, TypeError):
+        return np.datetime64('NaT')
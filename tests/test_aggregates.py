@@ -0,0 +1,159 @@
+"""
+Tests for mergeable aggregate states.
+"""
+
+import numpy as np
+import pytest
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.aggregates import (
+    AggregateReducer, DenseAccumulator, SumAggregate, CountAggregate,
+    MeanAggregate, MinAggregate, MaxAggregate, VarianceAggregate
+)
+
+
+VALUES = [4.0, 8.0, 15.0, 16.0, 23.0, 42.0, 7.5]
+
+
+class TestAggregates:
+    """Tests that partial states merge to the same result as one pass."""
+    
+    @pytest.mark.parametrize('aggregate, expected', [
+        (SumAggregate(), sum(VALUES)),
+        (CountAggregate(), len(VALUES)),
+        (MeanAggregate(), statistics.fmean(VALUES)),
+        (MinAggregate(), min(VALUES)),
+        (MaxAggregate(), max(VALUES)),
+        (VarianceAggregate(), statistics.pvariance(VALUES)),
+        (VarianceAggregate(ddof=1), statistics.variance(VALUES)),
+    ])
+    def test_unequal_partitions(self, aggregate, expected):
+        """Test merging states built from partitions of very different sizes."""
+        partitions = [VALUES[:1], VALUES[1:6], VALUES[6:]]
+        states = [aggregate.accumulate(part) for part in partitions]
+        
+        result = aggregate.finalize(aggregate.merge_all(states))
+        
+        assert result == pytest.approx(expected)
+    
+    @pytest.mark.parametrize('aggregate', [
+        SumAggregate(), CountAggregate(), MeanAggregate(), MinAggregate(),
+        MaxAggregate(), VarianceAggregate()
+    ])
+    def test_create_and_merge_matches_accumulate(self, aggregate):
+        """Test that folding single-value states equals accumulate()."""
+        states = [aggregate.create(value) for value in VALUES]
+        
+        folded = aggregate.finalize(aggregate.merge_all(states))
+        
+        assert folded == pytest.approx(aggregate.finalize(aggregate.accumulate(VALUES)))
+    
+    def test_mean_is_not_average_of_averages(self):
+        """Test that a 3-value and a 1-value partition weigh correctly."""
+        aggregate = MeanAggregate()
+        
+        state = aggregate.merge(aggregate.accumulate([10.0, 10.0, 10.0]), aggregate.accumulate([30.0]))
+        
+        assert aggregate.finalize(state) == 15.0
+    
+    def test_states_survive_json_lists(self):
+        """Test that states decoded as lists (JSON) still merge."""
+        aggregate = MeanAggregate()
+        
+        state = aggregate.merge_all([[30.0, 3], (30.0, 1)])
+        
+        assert aggregate.finalize(state) == 15.0
+
+
+class TestVectorizedAggregates:
+    """Tests that the NumPy kernels agree with the per-key aggregates."""
+    
+    GROUPS = [VALUES[:1], VALUES[1:6], VALUES[6:]]
+    
+    @pytest.mark.parametrize('aggregate', [
+        SumAggregate(), CountAggregate(), MeanAggregate(), MinAggregate(), MaxAggregate()
+    ])
+    def test_kernels_match_per_key(self, aggregate):
+        """Test accumulate_groups and merge_groups against accumulate and merge_all."""
+        values = np.array([value for group in self.GROUPS for value in group])
+        starts = np.array([0, 1, 6])
+        
+        states = aggregate.accumulate_groups(values, starts)
+        # Merge the three group states into two groups: [0] and [1, 2]
+        if isinstance(states, np.ndarray):
+            merged = aggregate.merge_groups(states, np.array([0, 1])).tolist()
+        else:
+            merged = list(zip(*(component.tolist() for component in aggregate.merge_groups(states, np.array([0, 1])))))
+        
+        expected = [
+            aggregate.accumulate(self.GROUPS[0]),
+            aggregate.merge_all([aggregate.accumulate(self.GROUPS[1]), aggregate.accumulate(self.GROUPS[2])])
+        ]
+        assert [aggregate.finalize(state) for state in merged] == pytest.approx([aggregate.finalize(state) for state in expected])
+    
+    def test_variance_has_no_kernels(self):
+        """Test that aggregates without kernels say so."""
+        assert not VarianceAggregate().vectorized
+        with pytest.raises(NotImplementedError):
+            VarianceAggregate().merge_groups(np.array(VALUES), np.array([0]))
+    
+    def test_declare_aggregate_by_name(self):
+        """Test that reducers can name a built-in aggregate."""
+        class MaxFare(AggregateReducer):
+            aggregate = 'max'
+        
+        assert isinstance(MaxFare.aggregate, MaxAggregate)
+        assert list(MaxFare().reduce('zone', VALUES)) == [('zone', 42.0)]
+        
+        with pytest.raises(ValueError, match="Unknown aggregate"):
+            class Median(AggregateReducer):
+                aggregate = 'median'
+
+
+class TestDenseAccumulator:
+    """Tests for aggregating bounded integer keys into arrays."""
+    
+    @pytest.mark.parametrize('aggregate', [
+        SumAggregate(), CountAggregate(), MeanAggregate(), MinAggregate(), MaxAggregate()
+    ])
+    def test_matches_per_key(self, aggregate):
+        """Test that cells hold the same states as accumulate() per key."""
+        keys = np.array([[1, 2], [0, 0], [1, 2], [2, 1], [1, 2]])
+        values = np.array([4.0, 8.0, 15.0, 16.0, 23.0])
+        accumulator = DenseAccumulator(aggregate, (3, 3))
+        accumulator.add(keys[:2], values[:2])
+        accumulator.add(keys[2:], values[2:])
+        
+        cell_keys, states = accumulator.columns()
+        if isinstance(states, np.ndarray):
+            states = states.tolist()
+        else:
+            states = list(zip(*(component.tolist() for component in states)))
+        
+        assert cell_keys.tolist() == [[0, 0], [1, 2], [2, 1]]
+        assert states == pytest.approx([
+            aggregate.accumulate([8.0]),
+            aggregate.accumulate([4.0, 15.0, 23.0]),
+            aggregate.accumulate([16.0])
+        ])
+    
+    def test_keys_outside_domain_are_returned(self):
+        """Test that out-of-domain keys are reported and left out."""
+        accumulator = DenseAccumulator(SumAggregate(), (24,))
+        
+        outside = accumulator.add(np.array([3, -1, 24, 3]), np.array([1, 1, 1, 1]))
+        
+        assert outside.tolist() == [False, True, True, False]
+        keys, sums = accumulator.columns()
+        assert keys.tolist() == [3]
+        assert sums.tolist() == [2]
+        assert isinstance(sums.tolist()[0], int)
+    
+    def test_requires_vectorized_aggregate(self):
+        """Test that aggregates without ufuncs cannot be held densely."""
+        with pytest.raises(ValueError):
+            DenseAccumulator(VarianceAggregate(), (24,))
@@ -0,0 +1,52 @@
+"""
+Tests for payload compression.
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.compression import (
+    available_compressions,
+    compress_payload,
+    decompress_payload,
+    get_compressor,
+    negotiate_compression
+)
+
+
+PAYLOAD = b'{"data": [[142, 18.5], [236, 12.25]]}' * 500
+
+
+class TestCompression:
+    """Tests for compressors, thresholds and negotiation."""
+    
+    @pytest.mark.parametrize('name', available_compressions())
+    def test_round_trip(self, name):
+        """Test that every available compressor restores the payload and shrinks it."""
+        body, applied, compress_time = compress_payload(PAYLOAD, name, threshold=0)
+        
+        assert applied == name
+        assert len(body) < len(PAYLOAD)
+        assert compress_time >= 0
+        assert decompress_payload(body, applied) == PAYLOAD
+    
+    def test_threshold_leaves_small_payloads_alone(self):
+        """Test that payloads below the threshold are not compressed."""
+        body, applied, _ = compress_payload(b'small', 'gzip', threshold=1024)
+        
+        assert (body, applied) == (b'small', None)
+        assert decompress_payload(body, None) == b'small'
+    
+    def test_negotiation(self):
+        """Test that the first commonly supported compression wins."""
+        assert negotiate_compression(['zstd', 'gzip'], [['gzip'], ['gzip', 'zstd']]) == 'gzip'
+        assert negotiate_compression(['none', 'gzip'], [['gzip']]) is None
+        assert negotiate_compression(['zstd'], [['gzip']]) is None
+    
+    def test_unknown_compression(self):
+        """Test that an unknown compression name is rejected."""
+        with pytest.raises(ValueError):
+            get_compressor('brotli')
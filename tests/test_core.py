@@ -2,13 +2,21 @@
 Tests for core map-reduce components.
 """
 
+import numpy as np
 import pytest
+import os
+import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.core.base import HashPartitioner
+from src.core.base import HashPartitioner, HotKeyPartitioner, RangePartitioner, Reducer, stable_hash, stable_hash_array
+from src.core.coordinator import Coordinator
+from src.tasks.task1_tip_analysis import TipPercentageReducer
+from src.utils.columnar import records_to_columns, columns_to_pairs, as_float
 
 
 class TestHashPartitioner:
@@ -51,3 +59,376 @@ class TestHashPartitioner:
         for num_workers in [2, 4, 8, 16]:
             partition = partitioner.get_partition(key, num_workers)
             assert 0 <= partition < num_workers
+    
+    def test_stable_across_processes(self):
+        """Test that string and tuple keys map the same way in every process."""
+        keys = ['zone_142', (230, 234), 17, 'Manhattan']
+        script = (
+            "import sys; sys.path.insert(0, '.');"
+            "from src.core.base import HashPartitioner;"
+            f"print([HashPartitioner().get_partition(k, 4) for k in {keys!r}])"
+        )
+        
+        outputs = set()
+        for seed in ['1', '2', '3']:
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            result = subprocess.run(
+                [sys.executable, '-c', script],
+                cwd=Path(__file__).parent.parent, env=env,
+                capture_output=True, text=True, check=True
+            )
+            outputs.add(result.stdout.strip())
+        
+        assert len(outputs) == 1
+    
+    def test_vectorized_matches_scalar(self):
+        """Test that get_partitions agrees with get_partition."""
+        partitioner = HashPartitioner()
+        
+        int_keys = np.array([0, 1, 23, 142, 265, -7], dtype=np.int64)
+        route_keys = np.array([[230, 234], [161, 234], [1, 1]], dtype=np.int64)
+        str_keys = np.array(['zone_1', 'zone_2'], dtype=object)
+        
+        for keys in (int_keys, route_keys, str_keys):
+            scalar_keys = [tuple(k) if keys.ndim == 2 else k for k in keys.tolist()]
+            expected = [partitioner.get_partition(k, 4) for k in scalar_keys]
+            assert partitioner.get_partitions(keys, 4).tolist() == expected
+    
+    def test_integral_floats_hash_like_ints(self):
+        """Test that 142.0 and 142 (equal keys) land in the same partition."""
+        assert stable_hash(142.0) == stable_hash(142)
+        assert stable_hash_array(np.array([142.0])).tolist() == [stable_hash(142)]
+    
+    def test_huge_integral_floats_match_scalar_hash(self):
+        """Test that integral floats beyond the int64 range do not overflow."""
+        keys = np.array([1e20, -1e20, 3.0])
+        assert stable_hash_array(keys).tolist() == [stable_hash(key) for key in keys.tolist()]
+
+
+class TestRangePartitioner:
+    """Tests for RangePartitioner."""
+    
+    def test_partitions_are_ordered_key_ranges(self):
+        """Test that consecutive partitions hold consecutive key ranges."""
+        partitioner = RangePartitioner.from_sample(list(range(100)), 4)
+        
+        partitions = [partitioner.get_partition(k, 4) for k in range(100)]
+        
+        assert partitioner.split_points == [25, 50, 75]
+        assert partitions == sorted(partitions)
+        assert [partitions.count(p) for p in range(4)] == [25, 25, 25, 25]
+    
+    def test_heavy_key_gets_one_split_point(self):
+        """Test that a key covering several quantiles does not repeat split points."""
+        partitioner = RangePartitioner.from_sample([1] * 90 + [2, 3, 4, 5, 6, 7, 8, 9, 10, 11], 4)
+        
+        assert partitioner.split_points == sorted(set(partitioner.split_points))
+        assert all(0 <= partitioner.get_partition(k, 4) < 4 for k in [0, 1, 11, 100])
+    
+    def test_fewer_partitions_than_split_points(self):
+        """Test that keys past the last partition are clamped into it."""
+        partitioner = RangePartitioner([10, 20, 30])
+        
+        assert partitioner.get_partition(35, 2) == 1
+        assert partitioner.get_partition(5, 2) == 0
+    
+    def test_vectorized_matches_scalar(self):
+        """Test that get_partitions agrees with get_partition, including on split points."""
+        int_keys = np.array([0, 24, 25, 26, 142, 265, -7], dtype=np.int64)
+        int_partitioner = RangePartitioner([25, 100, 200])
+        route_keys = np.array([[230, 234], [161, 234], [161, 10], [1, 1]], dtype=np.int64)
+        route_partitioner = RangePartitioner([(100, 5), (161, 234)])
+        
+        for partitioner, keys in ((int_partitioner, int_keys), (route_partitioner, route_keys)):
+            scalar_keys = [tuple(k) if keys.ndim == 2 else k for k in keys.tolist()]
+            expected = [partitioner.get_partition(k, 4) for k in scalar_keys]
+            assert partitioner.get_partitions(keys, 4).tolist() == expected
+
+
+class TestHotKeyPartitioner:
+    """Tests for HotKeyPartitioner."""
+    
+    def test_hot_key_takes_turns(self):
+        """Test that a hot key's pairs go round-robin to consecutive partitions."""
+        base = HashPartitioner()
+        partitioner = HotKeyPartitioner(base, {132: 3})
+        home = base.get_partition(132, 4)
+        
+        partitions = [partitioner.get_partition(132, 4) for _ in range(6)]
+        
+        assert partitions == [(home + i % 3) % 4 for i in range(6)]
+        assert partitioner.get_partition(7, 4) == base.get_partition(7, 4)
+    
+    def test_vectorized_matches_scalar(self):
+        """Test that get_partitions continues the same turns as get_partition."""
+        int_keys = np.array([132, 7, 132, 132, 161, 132], dtype=np.int64)
+        route_keys = np.array([[132, 230], [1, 1], [132, 230], [132, 230]], dtype=np.int64)
+        
+        for keys, hot_keys in ((int_keys, {132: 2, 161: 3}), (route_keys, {(132, 230): 3})):
+            scalar_keys = [tuple(k) if keys.ndim == 2 else k for k in keys.tolist()]
+            scalar = HotKeyPartitioner(HashPartitioner(), hot_keys)
+            expected = [scalar.get_partition(k, 4) for k in scalar_keys]
+            vectorized = HotKeyPartitioner(HashPartitioner(), hot_keys)
+            
+            assert vectorized.get_partitions(keys[:2], 4).tolist() + vectorized.get_partitions(keys[2:], 4).tolist() == expected
+
+
+class TestColumnar:
+    """Tests for columnar conversion helpers."""
+    
+    def test_records_to_columns_missing_fields(self):
+        """Test that missing fields become None."""
+        records = [(0, {'a': 1, 'b': 2.5}), (1, {'a': 3})]
+        
+        batch = records_to_columns(records, ['a', 'b'])
+        
+        assert batch['a'].tolist() == [1, 3]
+        assert batch['b'].tolist() == [2.5, None]
+        assert np.isnan(as_float(batch['b'])[1])
+    
+    def test_columns_to_pairs_composite_keys(self):
+        """Test that 2-D key arrays become tuple keys with native types."""
+        keys = np.array([[1, 2], [3, 4]], dtype=np.int64)
+        values = np.array([0.5, 1.5])
+        
+        pairs = columns_to_pairs(keys, values)
+        
+        assert pairs == [((1, 2), 0.5), ((3, 4), 1.5)]
+        assert type(pairs[0][0][0]) is int
+
+
+class TestCoordinatorSplits:
+    """Tests for cutting coordinator input into map tasks."""
+    
+    @pytest.fixture
+    def coordinator(self, monkeypatch):
+        """Coordinator for three workers without contacting them."""
+        monkeypatch.setattr(Coordinator, '_check_worker_health', lambda self: None)
+        return Coordinator([f"http://localhost:{5001 + i}" for i in range(3)])
+    
+    def test_one_split_per_worker_by_default(self, coordinator):
+        """Test that without a split size each worker gets one chunk."""
+        data = [(i, {}) for i in range(10)]
+        splits = coordinator._split_data(data)
+        
+        assert [len(split) for split in splits] == [4, 4, 2]
+        assert [pair for split in splits for pair in split] == data
+    
+    def test_fixed_split_size(self, coordinator):
+        """Test that a split size yields many small tasks."""
+        data = [(i, {}) for i in range(10)]
+        splits = coordinator._split_data(data, split_size=3)
+        
+        assert [len(split) for split in splits] == [3, 3, 3, 1]
+    
+    def test_empty_input(self, coordinator):
+        """Test that empty input still yields one (empty) task."""
+        assert coordinator._split_data([], split_size=3) == [[]]
+
+
+class TestCoordinatorHotKeys:
+    """Tests for finding, splitting and merging hot keys."""
+    
+    @pytest.fixture
+    def coordinator(self, monkeypatch):
+        """Coordinator for four workers that splits keys above half a fair share."""
+        monkeypatch.setattr(Coordinator, '_check_worker_health', lambda self: None)
+        return Coordinator([f"http://localhost:{5001 + i}" for i in range(4)], hot_key_threshold=0.5)
+    
+    def test_hot_keys_are_split_by_share(self, coordinator):
+        """Test that keys above the limit get enough reducers to fall under it."""
+        sketch = {'total': 1000, 'heavy': {132: 400, 161: 130, 237: 100}}
+        
+        # Limit: 0.5 * 1000 / 4 = 125 pairs per reducer
+        assert coordinator._find_hot_keys(sketch, TipPercentageReducer) == {132: 4, 161: 2}
+    
+    def test_unmergeable_reducer_is_not_split(self, coordinator):
+        """Test that keys stay whole when partial results could not be merged."""
+        class ListReducer(Reducer):
+            def reduce(self, key, values):
+                yield (key, list(values))
+        
+        assert coordinator._find_hot_keys({'total': 1000, 'heavy': {132: 900}}, ListReducer) == {}
+    
+    def test_split_key_states_are_merged(self, coordinator):
+        """Test that the partial states of a split key merge into one exact result."""
+        results = [(132, (10.0, 2)), (1, (5.0, 1)), (132, (20.0, 2))]
+        
+        merged = coordinator._merge_results(results, TipPercentageReducer, {132: 2})
+        
+        assert merged == [(132, 7.5), (1, 5.0)]
+
+
+class TestCoordinatorRecovery:
+    """Tests for map task retries and reassignment of dead workers' partitions."""
+    
+    @pytest.fixture
+    def coordinator(self, monkeypatch):
+        """Coordinator for three workers that never contacts them."""
+        monkeypatch.setattr(Coordinator, '_check_worker_health', lambda self: None)
+        monkeypatch.setattr(Coordinator, '_check_live_workers', lambda self: None)
+        monkeypatch.setattr('src.core.coordinator.requests.post', lambda *args, **kwargs: None)
+        return Coordinator([f"http://localhost:{5001 + i}" for i in range(3)], max_retries=2, retry_backoff=0.01)
+    
+    def test_failed_task_is_retried(self, coordinator, monkeypatch):
+        """Test that a failing attempt is run again until it succeeds."""
+        attempts = []
+        
+        def run_attempt(self, worker_addr, item, common_payload, stats):
+            attempts.append(item['task_id'])
+            if attempts.count(item['task_id']) == 1 and item['task_id'] == 1:
+                raise ConnectionError("worker went away")
+            return self._commit_attempt(item, f"1:{item['task_id']}.{len(attempts)}", self.partition_owners)
+        
+        monkeypatch.setattr(Coordinator, '_run_map_attempt', run_attempt)
+        items = [{'task_id': i, 'task': {}, 'partitions': None, 'failures': 0} for i in range(3)]
+        coordinator._run_map_tasks(items, {}, {})
+        
+        assert sorted(attempts) == [0, 1, 1, 2]
+    
+    def test_retries_are_bounded(self, coordinator, monkeypatch):
+        """Test that a task failing more than max_retries times fails the job."""
+        def run_attempt(self, worker_addr, item, common_payload, stats):
+            raise ValueError("bad mapper")
+        
+        monkeypatch.setattr(Coordinator, '_run_map_attempt', run_attempt)
+        with pytest.raises(RuntimeError, match="failed 3 times"):
+            coordinator._run_map_tasks([{'task_id': 0, 'task': {}, 'partitions': None, 'failures': 0}], {}, {})
+    
+    def test_dead_worker_partitions_are_rebuilt(self, coordinator):
+        """Test that a dead worker's partitions move and their producers rerun."""
+        addresses = list(coordinator.worker_addresses)
+        for task_id in range(2):
+            item = {'task_id': task_id, 'task': {'input_data': []}, 'partitions': None, 'failures': 0}
+            coordinator._commit_attempt(item, f"1:{task_id}.1", addresses)
+        
+        coordinator._mark_dead(addresses[1], ConnectionError("gone"))
+        
+        assert coordinator.live_workers == [addresses[0], addresses[2]]
+        assert coordinator.partition_owners == [addresses[0], addresses[0], addresses[2]]
+        recovery = coordinator._take_recovery()
+        assert [(item['task_id'], item['partitions']) for item in recovery] == [(0, [1]), (1, [1])]
+
+
+class TestHeartbeats:
+    """Tests for dropping workers whose heartbeats stop."""
+    
+    @pytest.fixture
+    def coordinator(self, monkeypatch):
+        """Coordinator for three workers with a short heartbeat timeout."""
+        monkeypatch.setattr(Coordinator, '_check_worker_health', lambda self: None)
+        coordinator = Coordinator(
+            [f"http://localhost:{5001 + i}" for i in range(3)],
+            heartbeat_address=('localhost', 0),
+            heartbeat_interval=0.05,
+            heartbeat_timeout=0.3
+        )
+        yield coordinator
+        coordinator.close()
+    
+    def test_silent_worker_is_dropped(self, coordinator):
+        """Test that a worker without heartbeats loses its partitions."""
+        addresses = list(coordinator.worker_addresses)
+        for addr in addresses:
+            coordinator.membership.expect(addr)
+        
+        deadline = time.time() + 5
+        while addresses[1] in coordinator.live_workers and time.time() < deadline:
+            for addr in (addresses[0], addresses[2]):
+                coordinator.membership.record(addr, {'address': addr})
+            time.sleep(0.02)
+        
+        assert coordinator.live_workers == [addresses[0], addresses[2]]
+        assert addresses[1] not in coordinator.partition_owners
+    
+    def test_request_to_dropped_worker_fails_fast(self, coordinator, monkeypatch):
+        """Test that a hanging request gives up once its worker is dropped."""
+        addresses = list(coordinator.worker_addresses)
+        monkeypatch.setattr('src.core.coordinator.requests.post', lambda *args, **kwargs: time.sleep(2))
+        threading.Timer(0.1, coordinator._mark_dead, args=(addresses[1], TimeoutError("silent"))).start()
+        
+        start = time.time()
+        with pytest.raises(ConnectionError, match="stopped sending heartbeats"):
+            coordinator._post([addresses[1]], f"{addresses[1]}/execute_map")
+        assert time.time() - start < 1.5
+
+
+class TestSpeculativeExecution:
+    """Tests for backup attempts of straggling map tasks."""
+    
+    @pytest.fixture
+    def coordinator(self, monkeypatch):
+        """Coordinator for three workers that starts backups at 3x the median task."""
+        monkeypatch.setattr(Coordinator, '_check_worker_health', lambda self: None)
+        monkeypatch.setattr(Coordinator, '_check_live_workers', lambda self: None)
+        monkeypatch.setattr('src.core.coordinator.requests.post', lambda *args, **kwargs: None)
+        return Coordinator(
+            [f"http://localhost:{5001 + i}" for i in range(3)],
+            max_retries=2,
+            retry_backoff=0.01,
+            speculative_multiple=3
+        )
+    
+    @staticmethod
+    def run_tasks(coordinator, monkeypatch, behave):
+        """
+        Run three map tasks; behave(task_id, attempt_number) returns the
+        attempt's duration in seconds or raises to fail it.
+        
+        Returns:
+            Outcomes as (task_id, attempt_number, committed) in finishing order
+        """
+        started = {}
+        outcomes = []
+        lock = threading.Lock()
+        
+        def run_attempt(self, worker_addr, item, common_payload, stats):
+            with lock:
+                number = started[item['task_id']] = started.get(item['task_id'], 0) + 1
+            time.sleep(behave(item['task_id'], number))
+            committed = self._commit_attempt(item, f"1:{item['task_id']}.{number}", self.partition_owners)
+            with lock:
+                outcomes.append((item['task_id'], number, committed))
+            return committed
+        
+        monkeypatch.setattr(Coordinator, '_run_map_attempt', run_attempt)
+        items = [{'task_id': i, 'task': {}, 'partitions': None, 'failures': 0} for i in range(3)]
+        coordinator._run_map_tasks(items, {}, {})
+        return outcomes, started
+    
+    def test_backup_wins_over_straggler(self, coordinator, monkeypatch):
+        """Test that a straggler gets a backup and only the first to finish commits."""
+        def behave(task_id, number):
+            return 1.5 if (task_id, number) == (2, 1) else 0.05
+        
+        outcomes, started = self.run_tasks(coordinator, monkeypatch, behave)
+        
+        assert started == {0: 1, 1: 1, 2: 2}
+        assert (2, 2, True) in outcomes
+        # The phase ends without waiting for the straggler
+        assert (2, 1, True) not in outcomes
+        assert sorted(coordinator._committed) == ['1:0.1', '1:1.1', '1:2.2']
+        
+        time.sleep(1.6)
+        assert (2, 1, False) in outcomes
+        assert sorted(coordinator._committed) == ['1:0.1', '1:1.1', '1:2.2']
+    
+    def test_failed_backup_does_not_retry(self, coordinator, monkeypatch):
+        """Test that a failing backup leaves the still running original alone."""
+        def behave(task_id, number):
+            if (task_id, number) == (2, 2):
+                raise ConnectionError("backup worker went away")
+            return 0.6 if task_id == 2 else 0.05
+        
+        outcomes, started = self.run_tasks(coordinator, monkeypatch, behave)
+        
+        assert started == {0: 1, 1: 1, 2: 2}
+        assert (2, 1, True) in outcomes
+    
+    def test_no_backups_when_disabled(self, coordinator, monkeypatch):
+        """Test that speculative_multiple=None never starts a backup."""
+        coordinator.speculative_multiple = None
+        
+        outcomes, started = self.run_tasks(coordinator, monkeypatch, lambda task_id, number: 0.5 if task_id == 2 else 0.01)
+        
+        assert started == {0: 1, 1: 1, 2: 1}
@@ -8,7 +8,13 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.utils.parquet_loader import create_sample_data
+from src.utils.parquet_loader import (
+    create_sample_data,
+    load_nyc_taxi_data,
+    plan_parquet_splits,
+    read_parquet_split,
+    table_to_records
+)
 
 
 class TestDataLoader:
@@ -65,3 +71,104 @@ class TestDataLoader:
             assert record['fare_amount'] > 0
             assert record['tip_amount'] >= 0
             assert record['total_amount'] > 0
+
+
+class TestParquetLoader:
+    """Tests for loading records from Parquet files."""
+    
+    @pytest.fixture
+    def parquet_file(self, tmp_path):
+        """Write a small taxi-like Parquet file with nulls and timestamps."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from datetime import datetime
+        
+        table = pa.table({
+            'tpep_pickup_datetime': pa.array(
+                [datetime(2024, 1, 1, 0, 57, 55), None, datetime(2024, 1, 2, 14, 5, 0)],
+                pa.timestamp('us')
+            ),
+            'PULocationID': pa.array([142, 87, 236], pa.int32()),
+            'passenger_count': pa.array([1.0, None, float('nan')]),
+            'store_and_fwd_flag': pa.array(['N', None, 'Y']),
+            'fare_amount': pa.array([10.0, 15.5, 7.25]),
+        })
+        path = tmp_path / 'taxi.parquet'
+        pq.write_table(table, path, row_group_size=2)
+        return str(path)
+    
+    def test_arrow_engine_record_format(self, parquet_file):
+        """Test that timestamps become strings and nulls become None."""
+        data = load_nyc_taxi_data(parquet_file)
+        
+        assert data[0] == (0, {
+            'tpep_pickup_datetime': '2024-01-01 00:57:55',
+            'PULocationID': 142,
+            'passenger_count': 1.0,
+            'store_and_fwd_flag': 'N',
+            'fare_amount': 10.0
+        })
+        assert data[1][1]['tpep_pickup_datetime'] is None
+        assert data[1][1]['store_and_fwd_flag'] is None
+        assert data[2][1]['passenger_count'] is None  # NaN
+    
+    def test_arrow_matches_pandas_engine(self, parquet_file):
+        """Test that both engines produce identical records."""
+        arrow_data = load_nyc_taxi_data(parquet_file, engine='arrow')
+        pandas_data = load_nyc_taxi_data(parquet_file, engine='pandas')
+        
+        assert arrow_data == pandas_data
+    
+    def test_max_records_and_columns(self, parquet_file):
+        """Test limiting rows across row groups and selecting columns."""
+        data = load_nyc_taxi_data(parquet_file, max_records=3, columns=['PULocationID'])
+        
+        assert data == [(0, {'PULocationID': 142}), (1, {'PULocationID': 87}), (2, {'PULocationID': 236})]
+        assert len(load_nyc_taxi_data(parquet_file, max_records=1)) == 1
+    
+    def test_unknown_engine(self, parquet_file):
+        """Test that an unknown engine is rejected."""
+        with pytest.raises(ValueError):
+            load_nyc_taxi_data(parquet_file, engine='spark')
+    
+    def test_plan_splits_cover_all_rows(self, parquet_file):
+        """Test that splits cut across row groups and cover each row once."""
+        splits = plan_parquet_splits([parquet_file, parquet_file], num_splits=3)
+        
+        assert [split['num_rows'] for split in splits] == [2, 2, 2]
+        assert [split['first_row'] for split in splits] == [0, 2, 4]
+        # Split 1 spans the end of file 1 and the start of file 2
+        assert len(splits[1]['pieces']) == 2
+        
+        rows = []
+        for split in splits:
+            rows.extend(table_to_records(read_parquet_split(split), split['first_row']))
+        assert rows == load_nyc_taxi_data(parquet_file) + [
+            (index + 3, record) for index, record in load_nyc_taxi_data(parquet_file)
+        ]
+    
+    def test_plan_splits_max_records(self, parquet_file):
+        """Test that max_records limits the planned rows."""
+        splits = plan_parquet_splits([parquet_file], rows_per_split=1, max_records=2)
+        
+        assert [split['num_rows'] for split in splits] == [1, 1]
+    
+    def test_read_split_from_data_dir(self, parquet_file, tmp_path):
+        """Test that missing paths fall back to the local data directory."""
+        split = plan_parquet_splits([parquet_file], num_splits=1)[0]
+        for piece in split['pieces']:
+            piece['path'] = '/nonexistent/taxi.parquet'
+        
+        table = read_parquet_split(split, columns=['PULocationID', 'missing'], data_dir=str(tmp_path))
+        assert table.column_names == ['PULocationID']
+        assert table.num_rows == 3
+        
+        with pytest.raises(FileNotFoundError):
+            read_parquet_split(split)
+    
+    def test_plan_splits_per_row_group(self, parquet_file):
+        """Test that without a size every row group becomes a split."""
+        splits = plan_parquet_splits([parquet_file])
+        
+        assert [split['num_rows'] for split in splits] == [2, 1]
+        assert [split['pieces'][0]['row_group'] for split in splits] == [0, 1]
@@ -0,0 +1,195 @@
+"""
+Tests for the worker's intermediate store.
+"""
+
+import numpy as np
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.aggregates import MeanAggregate
+from src.core.intermediate import IntermediateStore, pairs_to_columns
+
+
+def grouped(store):
+    """Return the store's groups as a dict with sorted value lists."""
+    return {key: sorted(values) for key, values in store.items()}
+
+
+class TestIntermediateStore:
+    """Tests for IntermediateStore in row and columnar mode."""
+    
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_concurrent_appends(self, columnar):
+        """Test that appends from many threads are all kept."""
+        store = IntermediateStore(num_stripes=4, columnar=columnar)
+        
+        def send(sender):
+            for _ in range(20):
+                store.add_pairs([(key, sender) for key in range(10)])
+        
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert store.num_pairs() == 8 * 20 * 10
+        groups = grouped(store)
+        assert sorted(groups) == list(range(10))
+        assert groups[3] == sorted(list(range(8)) * 20)
+    
+    def test_columnar_matches_rows(self):
+        """Test that both modes group tuple keys and tuple states identically."""
+        pairs = [((1, 2), (10.5, 3)), ((4, 5), (1.0, 1)), ((1, 2), (0.5, 2))]
+        
+        rows = IntermediateStore()
+        columns = IntermediateStore(columnar=True)
+        for store in (rows, columns):
+            store.add_pairs(pairs[:2])
+            store.add_pairs(pairs[2:])
+        
+        assert grouped(columns) == grouped(rows) == {
+            (1, 2): [(0.5, 2), (10.5, 3)],
+            (4, 5): [(1.0, 1)]
+        }
+        # Tuple components keep their own dtype
+        assert isinstance(grouped(columns)[(4, 5)][0][1], int)
+    
+    def test_add_columns_and_clear(self):
+        """Test appending columns directly and clearing the store."""
+        store = IntermediateStore(columnar=True)
+        store.add_columns(np.array([3, 1, 3]), np.array([1, 2, 3]))
+        store.add_columns(*pairs_to_columns([]))
+        
+        assert grouped(store) == {1: [2], 3: [1, 3]}
+        
+        store.clear()
+        assert store.num_pairs() == 0
+        assert list(store.items()) == []
+    
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_reduce_groups(self, columnar):
+        """Test that a vectorized kernel sees each key's values as one group."""
+        store = IntermediateStore(columnar=columnar)
+        assert store.reduce_groups(MeanAggregate().merge_groups) == []
+        
+        store.add_pairs([((1, 2), (10.5, 3)), ((4, 5), (1.0, 1))])
+        store.add_pairs([((1, 2), (0.5, 2))])
+        
+        merged = dict(store.reduce_groups(MeanAggregate().merge_groups))
+        
+        assert merged == {(1, 2): (11.0, 5), (4, 5): (1.0, 1)}
+        assert isinstance(merged[(4, 5)][1], int)
+    
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_sorted_items_stream_values(self, columnar):
+        """Test that sorted_items() yields keys in order with value iterators."""
+        store = IntermediateStore(columnar=columnar)
+        store.add_pairs([((2, 1), 1.0), ((1, 5), 2.0)])
+        store.add_pairs([((2, 1), 3.0)] * 10000)
+        
+        items = list(store.sorted_items())
+        
+        assert [key for key, _ in items] == [(1, 5), (2, 1)]
+        assert not isinstance(items[1][1], list)
+        assert sum(items[1][1]) == 30001.0
+    
+    def test_reduce_groups_needs_memory_data(self, tmp_path):
+        """Test that spilled data is left to the streaming merge of items()."""
+        store = IntermediateStore(memory_budget_bytes=1, spill_dir=str(tmp_path))
+        store.add_pairs([(1, 2.0)])
+        
+        assert store.reduce_groups(MeanAggregate().merge_groups) is None
+
+
+class TestSpilling:
+    """Tests for spilling the store to sorted runs on disk."""
+    
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_spilled_runs_are_merged(self, columnar, tmp_path):
+        """Test that a tiny budget spills and reading merges runs with memory."""
+        store = IntermediateStore(columnar=columnar, memory_budget_bytes=1, spill_dir=str(tmp_path))
+        
+        for batch in range(5):
+            store.add_pairs([(key, batch) for key in range(batch, 20, 3)])
+        store.memory_budget_bytes = None
+        store.add_pairs([(7, 99), (100, 0)])
+        
+        assert store.num_spills == 5
+        assert store.spilled_bytes > 0
+        assert store.num_pairs() == sum(len(range(b, 20, 3)) for b in range(5)) + 2
+        
+        items = list(store.items())
+        # Keys come out once each, in key order
+        assert [key for key, _ in items] == sorted({key for key, _ in items})
+        groups = grouped(store)
+        assert groups[7] == [1, 4, 99]
+        assert groups[100] == [0]
+        assert {key: sorted(values) for key, values in store.sorted_items()} == groups
+    
+    def test_clear_removes_runs(self, tmp_path):
+        """Test that clearing deletes the spill directory."""
+        store = IntermediateStore(memory_budget_bytes=1, spill_dir=str(tmp_path))
+        store.add_pairs([((1, 'a'), 1.5)])
+        assert list(tmp_path.iterdir())
+        
+        store.clear()
+        assert list(tmp_path.iterdir()) == []
+        assert store.num_pairs() == 0
+        assert list(store.items()) == []
+
+
+class TestAttempts:
+    """Tests for holding back map task output until its attempt commits."""
+    
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_uncommitted_attempts_are_dropped(self, columnar):
+        """Test that only the output of committed attempts reaches the store."""
+        store = IntermediateStore(columnar=columnar)
+        store.add_pairs([(1, 10), (2, 20)], attempt='1:0.1')
+        store.add_pairs([(1, 11)], attempt='1:0.2')
+        store.add_pairs([(3, 30)])
+        
+        assert grouped(store) == {3: [30]}
+        
+        store.commit(['1:0.2'])
+        store.add_pairs([(2, 21)], attempt='1:0.2')
+        
+        assert store.discard_pending() == 2
+        assert grouped(store) == {1: [11], 2: [21], 3: [30]}
+    
+    @pytest.mark.parametrize('columnar', [False, True])
+    def test_held_back_data_is_spilled_per_attempt(self, columnar, tmp_path):
+        """Test that held-back data counts toward the budget and spills by attempt."""
+        store = IntermediateStore(columnar=columnar, memory_budget_bytes=1, spill_dir=str(tmp_path))
+        store.add_pairs([(1, 10), (2, 20)], attempt='1:0.1')
+        store.add_pairs([(1, 11)], attempt='1:0.2')
+        
+        # Spilled, but not part of the store until committed
+        run_dir = next(tmp_path.iterdir())
+        assert len(list(run_dir.iterdir())) == 2
+        assert store.num_spills == 0
+        assert grouped(store) == {}
+        
+        store.commit(['1:0.2'])
+        assert store.num_spills == 1
+        assert store.discard_pending() == 2
+        assert len(list(run_dir.iterdir())) == 1
+        assert grouped(store) == {1: [11]}
+    
+    def test_commit_and_discard_release_budget(self):
+        """Test that held-back data stops counting once it is committed or dropped."""
+        store = IntermediateStore(memory_budget_bytes=10 ** 6)
+        store.add_pairs([(1, 10)], attempt='1:0.1')
+        store.add_pairs([(2, 20)], attempt='1:1.1')
+        held = store._memory_bytes
+        assert held > 0
+        
+        store.commit(['1:0.1'])
+        assert store._memory_bytes == held
+        store.discard_pending()
+        assert store._memory_bytes == held // 2
@@ -0,0 +1,105 @@
+"""
+Tests for the job server.
+"""
+
+import json
+import pytest
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.job_server import JobServer
+from src.tasks.task1_tip_analysis import TipPercentageMapper, TipPercentageReducer
+from src.tasks.task3_hourly_traffic import HourlyTrafficMapper, HourlyTrafficReducer
+
+
+class FakeCoordinator:
+    """Records jobs and answers each task with its position in the job."""
+    
+    worker_addresses = ['http://w1']
+    
+    def __init__(self):
+        self.jobs = []
+    
+    def run_jobs(self, input_data, tasks, partitioner_class=None, input_splits=None, columns=None, split_size=None):
+        self.jobs.append({'input_data': input_data, 'tasks': tasks, 'split_size': split_size})
+        return [[(f'key{i}', i)] for i in range(len(tasks))]
+
+
+def request_json(url, payload=None):
+    """GET (or POST a payload) and return the decoded JSON response."""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+@pytest.fixture
+def server():
+    """Job server on a free port with two tasks and a lazily loaded dataset."""
+    loads = []
+    
+    def load_dataset(config):
+        loads.append(config['path'])
+        return [('record',)] * config.get('max_records', 3), None
+    
+    job_server = JobServer(
+        FakeCoordinator(),
+        tasks={1: (TipPercentageMapper, TipPercentageReducer), 3: (HourlyTrafficMapper, HourlyTrafficReducer)},
+        load_dataset=load_dataset,
+        datasets={'default': {'path': 'taxi.parquet'}},
+        default_split_size=100,
+        host='localhost'
+    )
+    job_server.loads = loads
+    job_server.start()
+    yield job_server
+    job_server.stop()
+
+
+class TestJobServer:
+    """Tests for submitting jobs over HTTP."""
+    
+    def test_runs_submitted_tasks(self, server):
+        """Test that POST /jobs returns results keyed by task id."""
+        reply = request_json(f"http://localhost:{server.port}/jobs", {'tasks': [3, 1]})
+        
+        assert reply['status'] == 'success'
+        assert reply['results'] == {'3': [['key0', 0]], '1': [['key1', 1]]}
+        job = server.coordinator.jobs[0]
+        assert job['tasks'] == [(HourlyTrafficMapper, HourlyTrafficReducer), (TipPercentageMapper, TipPercentageReducer)]
+        assert job['split_size'] == 100
+    
+    def test_dataset_stays_loaded_between_jobs(self, server):
+        """Test that a dataset is loaded once and reused by later jobs."""
+        url = f"http://localhost:{server.port}/jobs"
+        request_json(url, {'tasks': [1]})
+        request_json(url, {'tasks': [3], 'split_size': 10})
+        
+        assert server.loads == ['taxi.parquet']
+        assert server.coordinator.jobs[0]['input_data'] is server.coordinator.jobs[1]['input_data']
+        assert server.coordinator.jobs[1]['split_size'] == 10
+        assert request_json(f"http://localhost:{server.port}/health")['jobs_run'] == 2
+    
+    def test_unknown_task_is_rejected(self, server):
+        """Test that unknown tasks and datasets answer 400 without running."""
+        url = f"http://localhost:{server.port}/jobs"
+        with pytest.raises(urllib.error.HTTPError, match="400"):
+            request_json(url, {'tasks': [2]})
+        with pytest.raises(urllib.error.HTTPError, match="400"):
+            request_json(url, {'tasks': [1], 'dataset': 'missing'})
+        
+        assert server.coordinator.jobs == []
+    
+    def test_register_dataset(self, server):
+        """Test that POST /datasets loads a new dataset for later jobs."""
+        reply = request_json(f"http://localhost:{server.port}/datasets", {'name': 'jan', 'path': 'jan.parquet', 'max_records': 5})
+        request_json(f"http://localhost:{server.port}/jobs", {'tasks': [1], 'dataset': 'jan'})
+        
+        assert reply['dataset'] == {'path': 'jan.parquet', 'mode': 'ship', 'loaded': True, 'records': 5}
+        assert server.loads == ['jan.parquet']
+        assert len(server.coordinator.jobs[0]['input_data']) == 5
+        assert request_json(f"http://localhost:{server.port}/datasets")['default']['loaded'] is False
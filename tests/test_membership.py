@@ -0,0 +1,88 @@
+"""
+Tests for heartbeat-based cluster membership.
+"""
+
+import json
+import pytest
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.membership import ClusterMembership, HeartbeatServer
+
+
+def post_json(url, payload):
+    """POST a JSON payload and return the response status."""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.status
+
+
+class TestClusterMembership:
+    """Tests for the membership table."""
+    
+    def test_record_and_report(self):
+        """Test that the latest report of a worker is kept."""
+        membership = ClusterMembership(timeout=10)
+        membership.record('w1', {'address': 'w1', 'queue_depth': 1})
+        membership.record('w1', {'address': 'w1', 'queue_depth': 3})
+        
+        assert membership.report('w1')['queue_depth'] == 3
+        assert membership.report('w2') == {}
+        assert membership.snapshot()['w1']['age'] < 1
+    
+    def test_silent_workers_expire(self):
+        """Test that workers without recent heartbeats are reported expired."""
+        membership = ClusterMembership(timeout=0.05)
+        membership.expect('w1')
+        membership.record('w2', {'address': 'w2'})
+        time.sleep(0.1)
+        membership.record('w2', {'address': 'w2'})
+        
+        assert membership.expired() == ['w1']
+        assert not membership.is_alive('w1')
+        assert membership.is_alive('w2')
+        
+        membership.forget('w1')
+        assert membership.expired() == []
+        assert membership.age('w1') is None
+    
+    def test_untracked_workers_count_as_alive(self):
+        """Test that the table never declares unknown workers dead."""
+        assert ClusterMembership(timeout=0).is_alive('w1')
+
+
+class TestHeartbeatServer:
+    """Tests for the coordinator's heartbeat endpoint."""
+    
+    def test_records_posted_heartbeats(self):
+        """Test that POST /heartbeat updates the membership table."""
+        membership = ClusterMembership()
+        server = HeartbeatServer(membership, host='localhost')
+        server.start()
+        try:
+            url = f"http://localhost:{server.port}/heartbeat"
+            status = post_json(url, {'address': 'http://w1', 'load': 0.5})
+        finally:
+            server.stop()
+        
+        assert status == 200
+        assert membership.report('http://w1')['load'] == 0.5
+    
+    def test_rejects_reports_without_address(self):
+        """Test that a heartbeat must name the worker."""
+        server = HeartbeatServer(ClusterMembership(), host='localhost')
+        server.start()
+        try:
+            with pytest.raises(urllib.error.HTTPError, match="400"):
+                post_json(f"http://localhost:{server.port}/heartbeat", {'load': 0.5})
+        finally:
+            server.stop()
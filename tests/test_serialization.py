@@ -0,0 +1,62 @@
+"""
+Tests for shuffle codecs.
+"""
+
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.serialization import available_codecs, get_codec, negotiate_codec
+
+
+class TestShuffleCodecs:
+    """Tests for encoding and decoding intermediate pairs."""
+    
+    @pytest.mark.parametrize('name', available_codecs())
+    def test_round_trip_scalar_keys(self, name):
+        """Test that int keys and float values survive a round trip."""
+        codec = get_codec(name)
+        pairs = [(142, 20.0), (87, 0.0), (142, 15.5)]
+        
+        assert codec.decode(codec.encode(pairs)) == pairs
+    
+    @pytest.mark.parametrize('name', available_codecs())
+    def test_round_trip_tuple_keys(self, name):
+        """Test that tuple keys come back as tuples."""
+        codec = get_codec(name)
+        pairs = [((230, 234), 5.0), ((161, 234), 50.0)]
+        
+        decoded = codec.decode(codec.encode(pairs))
+        
+        assert decoded == pairs
+        assert isinstance(decoded[0][0], tuple)
+    
+    @pytest.mark.parametrize('name', available_codecs())
+    def test_empty_partition(self, name):
+        """Test encoding a partition with no pairs."""
+        codec = get_codec(name)
+        
+        assert codec.decode(codec.encode([])) == []
+    
+    def test_unknown_codec(self):
+        """Test that unknown codec names are rejected."""
+        with pytest.raises(ValueError):
+            get_codec('xml')
+
+
+class TestCodecNegotiation:
+    """Tests for negotiate_codec."""
+    
+    def test_first_common_preference(self):
+        """Test that the first codec supported by everyone wins."""
+        supported = [['json', 'pickle', 'arrow'], ['json', 'arrow']]
+        
+        assert negotiate_codec(['pickle', 'arrow', 'json'], supported) == 'arrow'
+    
+    def test_fallback_to_json(self):
+        """Test that JSON is used when no preferred codec is common."""
+        supported = [['json', 'pickle'], ['json', 'arrow']]
+        
+        assert negotiate_codec(['pickle', 'arrow'], supported) == 'json'
@@ -0,0 +1,159 @@
+"""
+Tests for the shuffle sender.
+"""
+
+import pytest
+import requests
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.serialization import get_codec
+from src.core.shuffle import SHARED_MEMORY_HEADER, TASK_HEADER, ShuffleSender, read_shared_payload
+
+
+@pytest.fixture
+def peers():
+    """Start two HTTP peers that record shuffle uploads; the second one fails."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            if self.headers[SHARED_MEMORY_HEADER]:
+                body = read_shared_payload(self.headers[SHARED_MEMORY_HEADER])
+            received.append((self.server.server_port, self.headers['X-Shuffle-Codec'], body, self.headers[TASK_HEADER]))
+            self.send_response(200 if self.server.healthy else 500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    servers = []
+    for healthy in (True, False):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.healthy = healthy
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        servers.append(server)
+
+    yield [f"http://127.0.0.1:{server.server_port}" for server in servers], received
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class TestShuffleSender:
+    """Tests for ShuffleSender."""
+
+    def test_sends_partitions_and_reports_per_peer_stats(self, peers):
+        """Test that each non-empty partition reaches its peer with per-peer stats."""
+        addresses, received = peers
+        codec = get_codec('pickle')
+        sender = ShuffleSender('w1', max_parallel=2)
+
+        for _ in range(3):
+            stream = sender.open_stream(addresses, codec)
+            stream.add(0, [('a', 1), ('b', 2)])
+            stats = stream.close()
+        sender.close()
+
+        assert list(stats) == [addresses[0]]
+        assert stats[addresses[0]]['pairs'] == 2
+        assert stats[addresses[0]]['bytes'] == len(received[0][2])
+        assert len(received) == 3
+        assert codec.decode(received[0][2]) == [('a', 1), ('b', 2)]
+        assert received[0][1] == 'pickle'
+
+    def test_failed_upload_raises(self, peers):
+        """Test that an error from any peer fails the whole stream."""
+        addresses, received = peers
+        sender = ShuffleSender('w1')
+
+        stream = sender.open_stream(addresses, get_codec('json'))
+        stream.add(0, [('a', 1)])
+        stream.add(1, [('b', 2)])
+        with pytest.raises(requests.HTTPError):
+            stream.close()
+        sender.close()
+
+        # The healthy peer still got its partition
+        assert len(received) == 2
+
+    def test_stream_uploads_fixed_size_chunks_in_order(self, peers):
+        """Test that a stream cuts a partition into chunks and keeps their order."""
+        addresses, received = peers
+        codec = get_codec('pickle')
+        sender = ShuffleSender('w1', chunk_pairs=2, max_in_flight=1)
+
+        stream = sender.open_stream(addresses, codec)
+        for i in range(5):
+            stream.add(0, [(i, i)])
+        stats = stream.close()
+        sender.close()
+
+        assert stats[addresses[0]]['chunks'] == 3
+        assert stats[addresses[0]]['pairs'] == 5
+        assert [codec.decode(body) for _, _, body, _ in received] == [
+            [(0, 0), (1, 1)],
+            [(2, 2), (3, 3)],
+            [(4, 4)]
+        ]
+
+    def test_local_partition_and_shared_memory_peer(self, peers):
+        """Test that the own partition bypasses HTTP and same-host peers use shared memory."""
+        addresses, received = peers
+        codec = get_codec('pickle')
+        sender = ShuffleSender('w1')
+        local = []
+
+        stream = sender.open_stream(
+            addresses,
+            codec,
+            compression='gzip',
+            compression_threshold=0,
+            local_partitions=[1],
+            local_sink=lambda pairs, task: local.extend(pairs),
+            shared_memory_partitions=[0]
+        )
+        stream.add(0, [('a', 1)])
+        stream.add(1, [('b', 2)])
+        stats = stream.close()
+        sender.close()
+
+        assert local == [('b', 2)]
+        assert stats[addresses[1]]['transport'] == 'local'
+        assert stats[addresses[0]]['transport'] == 'shm'
+        assert stats[addresses[0]]['bytes'] == 0
+        # Shared memory chunks are not compressed
+        assert [codec.decode(body) for _, _, body, _ in received] == [[('a', 1)]]
+
+    def test_chunks_of_several_tasks_stay_apart(self, peers):
+        """Test that each chunk holds the pairs of one task and names it."""
+        addresses, received = peers
+        codec = get_codec('pickle')
+        sender = ShuffleSender('w1')
+        local = []
+
+        stream = sender.open_stream(
+            addresses,
+            codec,
+            local_partitions=[1],
+            local_sink=lambda pairs, task: local.append((task, pairs))
+        )
+        stream.add(0, [('a', 1)])
+        stream.add(0, [('a', 2)], task=2)
+        stream.add(1, [('b', 3)], task=1)
+        stream.close()
+        sender.close()
+
+        chunks = [(task, codec.decode(body)) for _, _, body, task in received if task]
+        assert chunks == [('2', [('a', 2)])]
+        assert [codec.decode(body) for _, _, body, task in received if task is None] == [[('a', 1)]]
+        assert local == [(1, [('b', 3)])]
@@ -2,6 +2,7 @@
 Tests for Task 1: Tip Analysis
 """
 
+import numpy as np
 import pytest
 import sys
 from pathlib import Path
@@ -71,6 +72,21 @@ class TestTipPercentageMapper:
         result = list(mapper.map(0, record))
         
         assert len(result) == 0  # Should skip
+    
+    def test_map_batch(self):
+        """Test mapping a columnar batch in one call."""
+        mapper = TipPercentageMapper()
+        
+        batch = {
+            'PULocationID': np.array([142, 87, None, 236], dtype=object),
+            'fare_amount': np.array([10.0, 0.0, 12.0, 20.0]),
+            'tip_amount': np.array([2.0, 1.0, 3.0, 5.0])
+        }
+        
+        keys, values = mapper.map_batch(batch)
+        
+        assert keys.tolist() == [142, 236]
+        assert values.tolist() == [20.0, 25.0]
 
 
 class TestTipPercentageReducer:
@@ -104,3 +120,27 @@ class TestTipPercentageReducer:
         result = list(reducer.reduce(142, []))
         
         assert len(result) == 0  # Should produce no output
+    
+    def test_unequal_partials_merge_exactly(self):
+        """Test that partial states weigh by trip count, not by worker."""
+        reducer = TipPercentageReducer()
+        
+        # 3 trips at 10% on one worker, 1 trip at 30% on another
+        partials = [state for _, state in reducer.combine(142, [10.0, 10.0, 10.0])]
+        partials += [state for _, state in reducer.combine(142, [30.0])]
+        
+        key, state = reducer.merge_states(142, partials)
+        
+        assert reducer.finalize(key, state) == (142, 15.0)
+    
+    def test_combine_matches_direct_reduce(self):
+        """Test that combine + merge + finalize equals a one-step reduce."""
+        reducer = TipPercentageReducer()
+        
+        values = [20.0, 15.0, 25.0, 18.0]
+        partials = [state for _, state in reducer.combine(142, values[:3])]
+        partials += [state for _, state in reducer.combine(142, values[3:])]
+        
+        merged = reducer.finalize(*reducer.merge_states(142, partials))
+        
+        assert [merged] == list(reducer.reduce(142, values))
@@ -2,6 +2,7 @@
 Tests for Task 2: Route Profitability
 """
 
+import numpy as np
 import pytest
 import sys
 from pathlib import Path
@@ -28,7 +29,7 @@ class TestRouteProfitabilityMapper:
         result = list(mapper.map(0, record))
         
         assert len(result) == 1
-        assert result[0][0] == "230->234"  # Route string
+        assert result[0][0] == (230, 234)  # Native route tuple
         assert result[0][1] == 5.0  # $25 / 5 miles = $5/mile
     
     def test_high_revenue_per_mile(self):
@@ -75,6 +76,22 @@ class TestRouteProfitabilityMapper:
         result = list(mapper.map(0, record))
         
         assert len(result) == 0
+    
+    def test_map_batch(self):
+        """Test mapping a columnar batch in one call."""
+        mapper = RouteProfitabilityMapper()
+        
+        batch = {
+            'PULocationID': np.array([230, 161, 142, 230]),
+            'DOLocationID': np.array([234, 234, 87, 234]),
+            'trip_distance': np.array([5.0, 2.0, 0.0, 10.0]),
+            'total_amount': np.array([25.0, 100.0, 10.0, 40.0])
+        }
+        
+        keys, values = mapper.map_batch(batch)
+        
+        assert keys.tolist() == [[230, 234], [161, 234], [230, 234]]
+        assert values.tolist() == [5.0, 50.0, 4.0]
 
 
 class TestRouteProfitabilityReducer:
@@ -93,6 +110,14 @@ class TestRouteProfitabilityReducer:
         assert result[0][0] == route
         assert result[0][1] == 5.0  # (5+6+4+5)/4
     
+    def test_route_tuple_formatted(self):
+        """Test that tuple route keys are reported as "pickup->dropoff"."""
+        reducer = RouteProfitabilityReducer()
+        
+        result = list(reducer.reduce((230, 234), [5.0, 7.0]))
+        
+        assert result == [("230->234", 6.0)]
+    
     def test_route_string_preserved(self):
         """Test that route string is preserved correctly."""
         reducer = RouteProfitabilityReducer()
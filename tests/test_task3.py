@@ -2,6 +2,7 @@
 Tests for Task 3: Hourly Traffic
 """
 
+import numpy as np
 import pytest
 import sys
 from pathlib import Path
@@ -74,6 +75,30 @@ class TestHourlyTrafficMapper:
         result = list(mapper.map(0, record))
         
         assert len(result) == 0
+    
+    def test_map_batch_datetime64(self):
+        """Test mapping a batch of datetime64 values (as read from Arrow)."""
+        mapper = HourlyTrafficMapper()
+        
+        batch = {
+            'tpep_pickup_datetime': np.array(
+                ['2024-01-15T08:30:00', 'NaT', '2024-01-16T23:59:59'],
+                dtype='datetime64[us]'
+            )
+        }
+        
+        keys, values = mapper.map_batch(batch)
+        
+        assert keys.tolist() == [8, 23]
+        assert values.tolist() == [1, 1]
+    
+    def test_iso_string_with_timezone(self):
+        """Test ISO timestamps with a trailing Z."""
+        mapper = HourlyTrafficMapper()
+        
+        result = list(mapper.map(0, {'tpep_pickup_datetime': '2024-01-15T06:10:00Z'}))
+        
+        assert result == [(6, 1)]
 
 
 class TestHourlyTrafficReducer:
@@ -110,3 +135,13 @@ class TestHourlyTrafficReducer:
         result = list(reducer.reduce(3, [1]))
         
         assert result[0][1] == 1
+    
+    def test_reducer_as_combiner(self):
+        """Test that partial counts from the combine step sum correctly."""
+        reducer = HourlyTrafficReducer()
+        
+        assert HourlyTrafficReducer.can_combine
+        partials = [v for _, v in reducer.reduce(8, [1, 1, 1])]
+        partials += [v for _, v in reducer.reduce(8, [1, 1])]
+        
+        assert list(reducer.reduce(8, partials)) == [(8, 5)]
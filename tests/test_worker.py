@@ -0,0 +1,240 @@
+"""
+Tests for the worker HTTP endpoints.
+"""
+
+import asyncio
+import pickle
+import sys
+from pathlib import Path
+
+from aiohttp import test_utils
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.base import HashPartitioner, Reducer
+from src.core.membership import ClusterMembership, HeartbeatServer
+from src.core.worker import Worker
+from src.core.serialization import get_codec
+from src.tasks.task1_tip_analysis import TipPercentageMapper, TipPercentageReducer
+from src.tasks.task3_hourly_traffic import HourlyTrafficMapper, HourlyTrafficReducer
+
+
+class CountingReducer(Reducer):
+    """Counts a key's values and reports whether they came as a list."""
+    
+    def reduce(self, key, values):
+        yield (key, (isinstance(values, list), sum(1 for _ in values)))
+
+
+def run_with_client(worker, scenario):
+    """Run an async scenario against the worker's app on a test server."""
+    async def run():
+        async with test_utils.TestClient(test_utils.TestServer(worker.app)) as client:
+            return await scenario(client)
+    
+    return asyncio.run(run())
+
+
+class TestWorkerEndpoints:
+    """Tests for the aiohttp worker endpoints."""
+    
+    def test_health_lists_codecs(self):
+        """Test that the health check reports the supported codecs."""
+        async def scenario(client):
+            response = await client.get('/health')
+            return await response.json()
+        
+        health = run_with_client(Worker('w1', 'localhost', 0), scenario)
+        
+        assert health['status'] == 'healthy'
+        assert 'json' in health['codecs']
+    
+    def test_oversized_body_is_rejected(self):
+        """Test that a body over max_body_bytes gets 413 rather than a 500."""
+        worker = Worker('w1', 'localhost', 0)
+        worker.max_body_bytes = 100
+        
+        async def scenario(client):
+            response = await client.post('/execute_map', data=b'x' * 1000)
+            return response.status
+        
+        assert run_with_client(worker, scenario) == 413
+    
+    def test_concurrent_shuffles_then_reduce(self):
+        """Test that many concurrent shuffle uploads are all grouped and reduced."""
+        codec = get_codec('pickle')
+        
+        async def scenario(client):
+            uploads = [
+                client.post(
+                    '/shuffle',
+                    data=codec.encode([(hour, 1) for hour in range(24)]),
+                    headers={'X-Shuffle-Codec': codec.name}
+                )
+                for _ in range(50)
+            ]
+            for response in await asyncio.gather(*uploads):
+                assert response.status == 200
+            
+            response = await client.post(
+                '/execute_reduce',
+                json={'reducers': [pickle.dumps(HourlyTrafficReducer).hex()]}
+            )
+            assert (await response.json())['input_pairs'] == 24 * 50
+            
+            response = await client.get('/get_results', params={'codec': codec.name})
+            return codec.decode(await response.read())
+        
+        worker = Worker('w1', 'localhost', 0, max_concurrent_shuffles=4)
+        results = run_with_client(worker, scenario)
+        
+        assert sorted(results) == [(hour, 50) for hour in range(24)]
+    
+    def test_sort_by_key_streams_values_in_key_order(self):
+        """Test that sort-based reduce hands out iterators and keeps key order."""
+        codec = get_codec('pickle')
+        
+        async def scenario(client):
+            for keys in ([5, 3, 9], [9, 1, 5, 9]):
+                await client.post(
+                    '/shuffle',
+                    data=codec.encode([(key, 1.0) for key in keys]),
+                    headers={'X-Shuffle-Codec': codec.name}
+                )
+            await client.post('/execute_reduce', json={
+                'reducers': [pickle.dumps(CountingReducer).hex()],
+                'sort_by_key': True
+            })
+            response = await client.get('/get_results', params={'codec': codec.name})
+            return codec.decode(await response.read())
+        
+        for columnar_store in (False, True):
+            results = run_with_client(Worker('w1', 'localhost', 0, columnar_store=columnar_store), scenario)
+            
+            assert results == [(1, (False, 1)), (3, (False, 1)), (5, (False, 2)), (9, (False, 3))]
+    
+    def test_bad_shuffle_codec(self):
+        """Test that an unknown codec is reported as an error."""
+        async def scenario(client):
+            response = await client.post('/shuffle', data=b'x', headers={'X-Shuffle-Codec': 'nope'})
+            return response.status
+        
+        assert run_with_client(Worker('w1', 'localhost', 0), scenario) == 500
+    
+    def test_reset_sets_memory_budget(self):
+        """Test that a budget sent on reset makes the reduce merge spilled runs."""
+        codec = get_codec('pickle')
+        
+        async def scenario(client):
+            response = await client.post('/reset', json={'memory_budget_mb': 0})
+            assert response.status == 200
+            for _ in range(3):
+                await client.post(
+                    '/shuffle',
+                    data=codec.encode([(hour, 1) for hour in range(24)]),
+                    headers={'X-Shuffle-Codec': codec.name}
+                )
+            response = await client.post(
+                '/execute_reduce',
+                json={'reducers': [pickle.dumps(HourlyTrafficReducer).hex()]}
+            )
+            stats = await response.json()
+            response = await client.get('/get_results', params={'codec': codec.name})
+            return stats, codec.decode(await response.read())
+        
+        stats, results = run_with_client(Worker('w1', 'localhost', 0), scenario)
+        
+        assert stats['spills'] == 3
+        assert sorted(results) == [(hour, 3) for hour in range(24)]
+    
+    def test_several_tasks_share_one_map_task(self):
+        """Test that each task of a multi-task job is mapped and reduced on its own."""
+        codec = get_codec('pickle')
+        records = [
+            (0, {'tpep_pickup_datetime': '2024-01-01 08:15:00', 'PULocationID': 1, 'fare_amount': 10.0, 'tip_amount': 2.0}),
+            (1, {'tpep_pickup_datetime': '2024-01-01 08:45:00', 'PULocationID': 1, 'fare_amount': 10.0, 'tip_amount': 1.0}),
+            (2, {'tpep_pickup_datetime': '2024-01-01 17:00:00', 'PULocationID': 2, 'fare_amount': 20.0, 'tip_amount': 5.0})
+        ]
+        tasks = [(HourlyTrafficMapper, HourlyTrafficReducer), (TipPercentageMapper, TipPercentageReducer)]
+        
+        async def scenario(client):
+            await client.post('/reset', json={'num_tasks': 2})
+            response = await client.post('/execute_map', json={
+                'mappers': [pickle.dumps(mapper).hex() for mapper, _ in tasks],
+                'combiners': [pickle.dumps(reducer).hex() for _, reducer in tasks],
+                'partitioners': [pickle.dumps(HashPartitioner).hex()] * 2,
+                'worker_addresses': ['http://localhost:1'],
+                'local_partitions': [0],
+                'shuffle_codec': codec.name,
+                'input_data': records
+            })
+            assert response.status == 200
+            await client.post('/execute_reduce', json={'reducers': [pickle.dumps(reducer).hex() for _, reducer in tasks]})
+            
+            results = []
+            for task in range(2):
+                response = await client.get('/get_results', params={'codec': codec.name, 'task': task})
+                results.append(sorted(codec.decode(await response.read())))
+            return results
+        
+        hourly, tips = run_with_client(Worker('w1', 'localhost', 0), scenario)
+        
+        assert hourly == [(8, 2), (17, 1)]
+        assert tips == [(1, (30.0, 2)), (2, (25.0, 1))]
+    
+    def test_sample_keys_maps_without_shuffling(self):
+        """Test that /sample_keys returns each task's keys (at most max_keys) and key counts."""
+        records = [
+            (i, {'tpep_pickup_datetime': f'2024-01-01 {i % 24:02d}:15:00', 'PULocationID': i % 3, 'fare_amount': 10.0, 'tip_amount': 1.0})
+            for i in range(48)
+        ]
+        tasks = [(HourlyTrafficMapper, HourlyTrafficReducer), (TipPercentageMapper, TipPercentageReducer)]
+        
+        async def scenario(client):
+            response = await client.post('/sample_keys', json={
+                'mappers': [pickle.dumps(mapper).hex() for mapper, _ in tasks],
+                'max_keys': 10,
+                'top_keys': 2,
+                'input_data': records
+            })
+            assert response.status == 200
+            return await response.json()
+        
+        sample = run_with_client(Worker('w1', 'localhost', 0), scenario)
+        hourly, tips = sample['keys']
+        
+        assert len(hourly) == 10 and set(hourly) <= set(range(24))
+        assert len(tips) == 10 and set(tips) <= {0, 1, 2}
+        assert sample['sketches'][0]['total'] == 48
+        assert [count for _, count in sample['sketches'][0]['heavy']] == [2, 2]
+        assert [count for _, count in sample['sketches'][1]['heavy']] == [16, 16]
+    
+    def test_reset_starts_heartbeats(self):
+        """Test that a worker told where to send heartbeats reports to it."""
+        membership = ClusterMembership()
+        server = HeartbeatServer(membership, host='localhost')
+        server.start()
+        
+        async def scenario(client):
+            response = await client.post('/reset', json={
+                'heartbeat': {
+                    'url': f"http://localhost:{server.port}/heartbeat",
+                    'address': 'http://w1',
+                    'interval': 0.05
+                }
+            })
+            assert response.status == 200
+            for _ in range(100):
+                if membership.report('http://w1'):
+                    break
+                await asyncio.sleep(0.02)
+        
+        try:
+            run_with_client(Worker('w1', 'localhost', 0), scenario)
+        finally:
+            server.stop()
+        
+        report = membership.report('http://w1')
+        assert report['worker_id'] == 'w1'
+        assert report['queue_depth'] == 0
+        assert report['running'] == {}